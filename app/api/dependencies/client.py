@@ -0,0 +1,30 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from fastapi import Depends
+from fastapi.requests import Request
+
+from app.core.config import get_app_settings
+from app.core.settings.app import AppSettings
+
+
+def get_client_id(request: Request, settings: AppSettings = Depends(get_app_settings)) -> str:
+    client_id = request.headers.get(settings.client_id_header)
+    if client_id:
+        return client_id
+
+    if request.client is not None:
+        return request.client.host
+
+    return ""
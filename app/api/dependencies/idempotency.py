@@ -0,0 +1,23 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from fastapi.requests import Request
+
+from typing import Union
+
+from app.services.idempotency_index import IdempotencyIndex, SqliteIdempotencyIndex
+
+
+def get_idempotency_index(request: Request) -> Union[IdempotencyIndex, SqliteIdempotencyIndex]:
+    return request.app.state.idempotency_index
@@ -23,4 +23,5 @@ async def http_error_handler(_: Request, exc: HTTPException) -> JSONResponse:
     return JSONResponse(
         content=WrapperResponse(success=False, message=exc.detail).model_dump(),
         status_code=exc.status_code,
+        headers=getattr(exc, "headers", None),
     )
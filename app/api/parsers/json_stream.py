@@ -0,0 +1,171 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import codecs
+import json
+
+from enum import Enum
+from typing import Any, AsyncIterator, List, Optional
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\r\n"
+
+# A single sms request is far below this, a longer element is rejected instead of buffered
+MAX_ITEM_SIZE = 64 * 1024
+
+
+class JsonStreamError(ValueError):
+    pass
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_item_size: int = MAX_ITEM_SIZE) -> AsyncIterator[Any]:
+    """
+    Yields the values of a newline delimited JSON stream as soon as each line is complete.
+    """
+    buffer = b""
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+
+        if len(buffer) > max_item_size:
+            raise JsonStreamError(f"Line longer than {max_item_size} bytes")
+
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], max_item_size: int = MAX_ITEM_SIZE) -> AsyncIterator[Any]:
+    """
+    Yields the elements of a top level JSON array without reading the whole body into memory.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = _ArrayParser(max_item_size)
+
+    async for chunk in chunks:
+        for value in parser.feed(_decode(text_decoder, chunk, final=False)):
+            yield value
+
+    for value in parser.feed(_decode(text_decoder, b"", final=True), final=True):
+        yield value
+
+
+class _Expect(Enum):
+    array = "array"
+    first = "first"
+    value = "value"
+    separator = "separator"
+    end = "end"
+
+
+class _ArrayParser:
+    """
+    Incremental parser of a top level JSON array.
+
+    Text is fed in pieces, each call returns the elements completed so far. Separators are
+    checked as they arrive, so a malformed body fails at the first bad character.
+    """
+
+    def __init__(self, max_item_size: int):
+        self._max_item_size = max_item_size
+        self._buffer = ""
+        self._expect = _Expect.array
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        buffer = self._buffer + text
+        position = 0
+        values = []
+
+        while True:
+            position = _skip(buffer, position, _whitespace)
+            if position == len(buffer):
+                break
+
+            if self._expect in (_Expect.value, _Expect.first) and buffer[position] not in ",]":
+                end = self._decode_value(buffer, position, final, values)
+            else:
+                end = self._consume_punctuation(buffer[position], position)
+
+            if end is None:
+                break
+
+            position = end
+
+        self._buffer = buffer[position:]
+        if len(self._buffer) > self._max_item_size:
+            raise JsonStreamError(f"Array element longer than {self._max_item_size} characters")
+
+        if final and self._expect is not _Expect.end:
+            raise JsonStreamError("Unterminated JSON array")
+
+        return values
+
+    def _consume_punctuation(self, character: str, position: int) -> int:
+        if self._expect is _Expect.array and character == "[":
+            self._expect = _Expect.first
+        elif self._expect is _Expect.separator and character == ",":
+            self._expect = _Expect.value
+        elif self._expect in (_Expect.first, _Expect.separator) and character == "]":
+            self._expect = _Expect.end
+        elif self._expect is _Expect.end:
+            raise JsonStreamError("Unexpected data after the end of the array")
+        elif self._expect is _Expect.array:
+            raise JsonStreamError("Expected a JSON array")
+        else:
+            raise JsonStreamError(f"Unexpected {character!r} in JSON array")
+
+        return position + 1
+
+    def _decode_value(self, buffer: str, position: int, final: bool, values: List[Any]) -> Optional[int]:
+        try:
+            value, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as err:
+            if final:
+                raise JsonStreamError(str(err)) from err
+
+            return None
+
+        # A number at the very end of the buffer may continue in the next chunk
+        if end == len(buffer) and not final:
+            return None
+
+        values.append(value)
+        self._expect = _Expect.separator
+
+        return end
+
+
+def _decode(text_decoder: codecs.IncrementalDecoder, chunk: bytes, final: bool) -> str:
+    try:
+        return text_decoder.decode(chunk, final=final)
+    except UnicodeDecodeError as err:
+        raise JsonStreamError(str(err)) from err
+
+
+def _loads(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as err:
+        raise JsonStreamError(str(err)) from err
+
+
+def _skip(buffer: str, position: int, characters: str) -> int:
+    while position < len(buffer) and buffer[position] in characters:
+        position += 1
+
+    return position
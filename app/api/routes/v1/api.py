@@ -14,8 +14,10 @@
 
 from fastapi import APIRouter
 
-from app.api.routes.v1 import sms
+from app.api.routes.v1 import inbox, otp, sms
 
 router = APIRouter(prefix="/v1")
 
 router.include_router(sms.router, tags=["sms"])
+router.include_router(inbox.router, tags=["inbox"])
+router.include_router(otp.router, tags=["otp"])
@@ -0,0 +1,47 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies.inbox import get_inbox_poller
+from app.worker.inbox_poller import InboxPoller
+
+router = APIRouter()
+
+KEEPALIVE_INTERVAL = 15.0
+
+
+@router.get("/inbox/stream", status_code=status.HTTP_200_OK, name="inbox:stream")
+async def stream_inbox(
+        request: Request,
+        inbox: InboxPoller = Depends(get_inbox_poller),
+) -> StreamingResponse:
+    return StreamingResponse(_events(request, inbox), media_type="text/event-stream")
+
+
+async def _events(request: Request, inbox: InboxPoller) -> AsyncIterator[str]:
+    with inbox.subscribe() as queue:
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            yield f"id: {message.index}\nevent: sms\ndata: {message.model_dump_json()}\n\n"
@@ -0,0 +1,137 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+import time
+
+from typing import Union
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from loguru import logger
+
+from app.api.dependencies.client import get_client_id
+from app.api.dependencies.otp import get_otp_store
+from app.api.dependencies.rate_limiter import get_rate_limiter
+from app.api.dependencies.worker import get_worker
+from app.api.validators.phone_number_validator import normalize_phone
+from app.core import metrics
+from app.core.config import get_app_settings
+from app.core.settings.app import AppSettings
+from app.models.domain.sms import SMS, SmsPriority
+from app.models.schemas.otp import OtpIssueRequest, OtpIssueResponse, OtpVerifyRequest, OtpVerifyResponse
+from app.models.schemas.wrapper import WrapperResponse
+from app.resources import strings
+from app.services.otp_store import OtpCheck, OtpStore, SqliteOtpStore
+from app.services.rate_limiter import RateLimiter, SqliteRateLimiter
+from app.worker.worker import Worker
+
+router = APIRouter()
+
+OTP_ENQUEUED = metrics.SMS_ENQUEUED.labels("otp")
+
+CHECK_ERRORS = {
+    OtpCheck.invalid: strings.OTP_CODE_INVALID_ERROR,
+    OtpCheck.expired: strings.OTP_CODE_EXPIRED_ERROR,
+    OtpCheck.exhausted: strings.OTP_ATTEMPTS_EXHAUSTED_ERROR,
+}
+
+
+@router.post("/otp/issue", status_code=status.HTTP_200_OK, name="otp:issue")
+async def issue_otp(
+        request: OtpIssueRequest,
+        worker: Worker = Depends(get_worker),
+        otp_store: Union[OtpStore, SqliteOtpStore] = Depends(get_otp_store),
+        rate_limiter: Union[RateLimiter, SqliteRateLimiter] = Depends(get_rate_limiter),
+        client_id: str = Depends(get_client_id),
+        settings: AppSettings = Depends(get_app_settings),
+) -> WrapperResponse:
+    phone = normalize_phone(request.phone)
+    if phone is None:
+        logger.error(strings.PHONE_NUMBER_INVALID_ERROR)
+        metrics.SMS_REJECTED.labels("otp", "invalid_phone").inc()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.PHONE_NUMBER_INVALID_ERROR)
+
+    if not worker.available():
+        logger.error(strings.SERVICE_UNAVAILABLE)
+        metrics.SMS_REJECTED.labels("otp", "unavailable").inc()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=strings.SERVICE_UNAVAILABLE)
+
+    retry_after = worker.admission_delay(client_id)
+    if retry_after:
+        logger.warning(f"{strings.QUEUE_FULL_ERROR} for client {client_id}")
+        metrics.SMS_REJECTED.labels("otp", "queue_full").inc()
+        raise _retry_later(strings.QUEUE_FULL_ERROR, retry_after)
+
+    code, retry_after = await otp_store.issue(phone)
+    if code is None:
+        logger.warning(strings.OTP_COOLDOWN_ERROR)
+        metrics.SMS_REJECTED.labels("otp", "cooldown").inc()
+        raise _retry_later(strings.OTP_COOLDOWN_ERROR, retry_after)
+
+    # Counted after the cooldown, so that a refused code does not use up the recipient's limit
+    retry_after = (await rate_limiter.acquire(client_id, [phone]))[0] if rate_limiter.enabled else 0.0
+    if retry_after:
+        await otp_store.revoke(phone)
+        logger.warning(f"{strings.RATE_LIMITED_ERROR} for client {client_id}")
+        metrics.SMS_REJECTED.labels("otp", "rate_limited").inc()
+        raise _retry_later(strings.RATE_LIMITED_ERROR, retry_after)
+
+    # Codes skip the queued sends, and one that arrives after it expired is of no use
+    task = SMS(
+        phone=phone,
+        message=settings.otp_message.format(code=code),
+        priority=SmsPriority.urgent,
+        client=client_id,
+        expires_at=time.time() + settings.otp_ttl,
+    )
+
+    if not await worker.add_task(task):
+        await otp_store.revoke(phone)
+        logger.error(strings.VERIFICATION_SEND_SMS_ERROR)
+        metrics.SMS_REJECTED.labels("otp", "stopped").inc()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.VERIFICATION_SEND_SMS_ERROR)
+
+    OTP_ENQUEUED.inc()
+
+    return WrapperResponse(
+        payload=OtpIssueResponse(id=task.id, expires_in=math.ceil(settings.otp_ttl)).model_dump(),
+    )
+
+
+@router.post("/otp/verify", status_code=status.HTTP_200_OK, name="otp:verify")
+async def verify_otp(
+        request: OtpVerifyRequest,
+        otp_store: Union[OtpStore, SqliteOtpStore] = Depends(get_otp_store),
+) -> WrapperResponse:
+    phone = normalize_phone(request.phone)
+    if phone is None:
+        logger.error(strings.PHONE_NUMBER_INVALID_ERROR)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.PHONE_NUMBER_INVALID_ERROR)
+
+    check = await otp_store.verify(phone, request.code)
+    metrics.OTP_VERIFICATIONS.labels(check.value).inc()
+
+    if check is not OtpCheck.verified:
+        logger.warning(f"{CHECK_ERRORS[check]} for {phone}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=CHECK_ERRORS[check])
+
+    return WrapperResponse(payload=OtpVerifyResponse(verified=True).model_dump())
+
+
+def _retry_later(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
@@ -12,42 +12,410 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from datetime import datetime, timezone
+import math
+
+from typing import Any, AsyncIterator, Optional, Tuple, Union
+
 from loguru import logger
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from pydantic import ValidationError
 
+from app.api.dependencies.client import get_client_id
+from app.api.dependencies.idempotency import get_idempotency_index
+from app.api.dependencies.rate_limiter import get_rate_limiter
 from app.api.dependencies.worker import get_worker
+from app.api.parsers.json_stream import JsonStreamError, iter_json_array, iter_ndjson
+from app.core import metrics
+from app.core.config import get_app_settings
+from app.core.settings.app import AppSettings
 from app.models.domain.sms import SMS
-from app.models.schemas.sms import SmsRequest, SmsCountResponse
+from app.models.schemas.sms import SmsRequest, SmsSendResponse, SmsCountResponse, SmsBatchItemResult, \
+    SmsBatchResponse, SmsDeadLettersResponse, SmsReplayRequest, SmsReplayResponse, SmsStatusResponse, \
+    SmsStatusRequest, SmsStatusBatchResponse
 from app.models.schemas.wrapper import WrapperResponse
-from app.api.validators.phone_number_validator import check_phone_is_valid
+from app.api.validators.phone_number_validator import normalize_phone, validate_many
 from app.resources import strings
+from app.services.idempotency_index import IdempotencyIndex, IdempotencyRecord, SqliteIdempotencyIndex
+from app.services.rate_limiter import RateLimiter, SqliteRateLimiter
+from app.services.sms_transliteration import TransliterationMode, shorten
+from app.worker.status_store import StatusEntry
 from app.worker.worker import Worker
 
 router = APIRouter()
 
+BATCH_CHUNK_SIZE = 500
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+SEND_ENQUEUED = metrics.SMS_ENQUEUED.labels("send")
+BATCH_ENQUEUED = metrics.SMS_ENQUEUED.labels("send_batch")
+
 
 @router.post("/send", status_code=status.HTTP_200_OK, name="sms:send")
 async def send_sms(
         request: SmsRequest,
+        idempotency_key: Optional[str] = Header(default=None),
         worker: Worker = Depends(get_worker),
+        idempotency_index: Union[IdempotencyIndex, SqliteIdempotencyIndex] = Depends(get_idempotency_index),
+        rate_limiter: Union[RateLimiter, SqliteRateLimiter] = Depends(get_rate_limiter),
+        client_id: str = Depends(get_client_id),
+        settings: AppSettings = Depends(get_app_settings),
 ) -> WrapperResponse:
-    if not check_phone_is_valid(request.phone):
+    phone = normalize_phone(request.phone)
+    if phone is None:
         logger.error(strings.PHONE_NUMBER_INVALID_ERROR)
+        metrics.SMS_REJECTED.labels("send", "invalid_phone").inc()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.PHONE_NUMBER_INVALID_ERROR)
 
-    # if not sms_service.is_hilink():
-    #     logger.error(strings.SERVICE_UNAVAILABLE)
-    #     raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=strings.SERVICE_UNAVAILABLE)
+    if not worker.available():
+        logger.error(strings.SERVICE_UNAVAILABLE)
+        metrics.SMS_REJECTED.labels("send", "unavailable").inc()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=strings.SERVICE_UNAVAILABLE)
+
+    task, segments_saved = _build_task(phone, request, client_id, settings.sms_transliteration)
+    if task.segments > settings.sms_max_segments:
+        logger.error(strings.MESSAGE_TOO_LONG_ERROR)
+        metrics.SMS_REJECTED.labels("send", "too_long").inc()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.MESSAGE_TOO_LONG_ERROR)
+
+    if _expires_unsent(task):
+        logger.error(strings.SMS_EXPIRED_ERROR)
+        metrics.SMS_REJECTED.labels("send", "expired").inc()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.SMS_EXPIRED_ERROR)
 
-    if not await worker.add_task(SMS(phone=request.phone, message=request.message)):
+    # Keys are scoped to the client, so two clients cannot collide on the same key or message
+    fingerprint = idempotency_index.digest(phone, request.message)
+    if idempotency_key:
+        key = idempotency_index.digest("key", client_id, idempotency_key)
+        key_ttl = settings.idempotency_key_ttl
+    else:
+        key = idempotency_index.digest("content", client_id, phone, request.message)
+        key_ttl = settings.idempotency_content_ttl
+
+    original = await idempotency_index.claim(key, IdempotencyRecord(task.id, fingerprint), key_ttl)
+    if original is not None:
+        return _duplicate(original, fingerprint, task, segments_saved)
+
+    retry_after = worker.admission_delay(client_id)
+    if retry_after:
+        await idempotency_index.release(key)
+        logger.warning(f"{strings.QUEUE_FULL_ERROR} for client {client_id}")
+        metrics.SMS_REJECTED.labels("send", "queue_full").inc()
+        raise _retry_later(strings.QUEUE_FULL_ERROR, retry_after)
+
+    retry_after = await _rate_limit(rate_limiter, client_id, [task])
+    if retry_after:
+        await idempotency_index.release(key)
+        metrics.SMS_REJECTED.labels("send", "rate_limited").inc()
+        raise _retry_later(strings.RATE_LIMITED_ERROR, retry_after[0])
+
+    if not await worker.add_task(task):
+        await idempotency_index.release(key)
         logger.error(strings.VERIFICATION_SEND_SMS_ERROR)
+        metrics.SMS_REJECTED.labels("send", "stopped").inc()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=strings.VERIFICATION_SEND_SMS_ERROR)
 
-    return WrapperResponse()
+    SEND_ENQUEUED.inc()
+
+    return WrapperResponse(
+        payload=SmsSendResponse(id=task.id, segments=task.segments, segments_saved=segments_saved).model_dump(),
+    )
+
+
+@router.post("/send_batch", status_code=status.HTTP_200_OK, name="sms:send_batch")
+async def send_sms_batch(
+        request: Request,
+        http_response: Response,
+        worker: Worker = Depends(get_worker),
+        rate_limiter: Union[RateLimiter, SqliteRateLimiter] = Depends(get_rate_limiter),
+        client_id: str = Depends(get_client_id),
+        settings: AppSettings = Depends(get_app_settings),
+) -> WrapperResponse:
+    if not worker.available():
+        logger.error(strings.SERVICE_UNAVAILABLE)
+        metrics.SMS_REJECTED.labels("send_batch", "unavailable").inc()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=strings.SERVICE_UNAVAILABLE)
+
+    retry_after = worker.admission_delay(client_id)
+    if retry_after:
+        logger.warning(f"{strings.QUEUE_FULL_ERROR} for client {client_id}")
+        metrics.SMS_REJECTED.labels("send_batch", "queue_full").inc()
+        raise _retry_later(strings.QUEUE_FULL_ERROR, retry_after)
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_CONTENT_TYPES:
+        items = iter_ndjson(request.stream())
+    else:
+        items = iter_json_array(request.stream())
+
+    response = SmsBatchResponse()
+    retry_after, message = await _add_batch(items, response, worker, rate_limiter, client_id, settings)
+
+    if retry_after:
+        http_response.headers["Retry-After"] = str(math.ceil(retry_after))
+
+    response.accepted = sum(1 for result in response.results if result.success)
+    response.rejected = len(response.results) - response.accepted
+    BATCH_ENQUEUED.inc(response.accepted)
+    response.segments_saved = sum(result.segments_saved for result in response.results if result.success)
+
+    return WrapperResponse(success=not message, payload=response.model_dump(), message=message)
+
+
+async def _add_batch(
+        items: AsyncIterator[Any],
+        response: SmsBatchResponse,
+        worker: Worker,
+        rate_limiter: Union[RateLimiter, SqliteRateLimiter],
+        client_id: str,
+        settings: AppSettings,
+) -> Tuple[float, str]:
+    """
+    Validates the streamed items and enqueues them in chunks, recording a result for each item.
+
+    Items read before the body turns out to be malformed are still enqueued.
+
+    Returns:
+        Tuple[float, str]: The longest Retry-After of the items rejected because the queue was full or a rate limit
+        was reached, zero if none was, and the error message for a malformed body, empty if the body was read completely.
+    """
+    chunk: list[tuple[SmsBatchItemResult, SmsRequest]] = []
+    retry_after = 0.0
+    message = ""
+
+    try:
+        async for item in items:
+            result = SmsBatchItemResult(index=len(response.results))
+            response.results.append(result)
+
+            try:
+                chunk.append((result, SmsRequest.model_validate(item)))
+            except ValidationError:
+                _reject([result], strings.SMS_REQUEST_INVALID_ERROR, "invalid_item")
+
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                retry_after = max(retry_after, await _add_batch_chunk(worker, rate_limiter, chunk, client_id, settings))
+                chunk = []
+    except JsonStreamError as err:
+        logger.error(f"{strings.BATCH_BODY_INVALID_ERROR}: {err}")
+        metrics.SMS_REJECTED.labels("send_batch", "invalid_body").inc()
+        message = strings.BATCH_BODY_INVALID_ERROR
+
+    if chunk:
+        retry_after = max(retry_after, await _add_batch_chunk(worker, rate_limiter, chunk, client_id, settings))
+
+    return retry_after, message
+
+
+async def _add_batch_chunk(
+        worker: Worker,
+        rate_limiter: Union[RateLimiter, SqliteRateLimiter],
+        chunk: list[tuple[SmsBatchItemResult, SmsRequest]],
+        client_id: str,
+        settings: AppSettings,
+) -> float:
+    phones = validate_many(sms_request.phone for _, sms_request in chunk)
+
+    accepted: list[SmsBatchItemResult] = []
+    tasks: list[SMS] = []
+    for (result, sms_request), phone in zip(chunk, phones):
+        if phone is None:
+            _reject([result], strings.PHONE_NUMBER_INVALID_ERROR, "invalid_phone")
+            continue
+
+        task, result.segments_saved = _build_task(phone, sms_request, client_id, settings.sms_transliteration)
+        if task.segments > settings.sms_max_segments:
+            _reject([result], strings.MESSAGE_TOO_LONG_ERROR, "too_long")
+            continue
+
+        if _expires_unsent(task):
+            _reject([result], strings.SMS_EXPIRED_ERROR, "expired")
+            continue
+
+        result.id = task.id
+        accepted.append(result)
+        tasks.append(task)
+
+    if not tasks:
+        return 0.0
+
+    retry_after = worker.admission_delay(client_id, len(tasks))
+    if retry_after:
+        logger.warning(f"{strings.QUEUE_FULL_ERROR} for client {client_id}")
+        _reject(accepted, strings.QUEUE_FULL_ERROR, "queue_full")
+        return retry_after
+
+    limited = await _rate_limit(rate_limiter, client_id, tasks)
+    if limited:
+        _reject([result for result, delay in zip(accepted, limited) if delay], strings.RATE_LIMITED_ERROR, "rate_limited")
+        tasks = [task for task, delay in zip(tasks, limited) if not delay]
+        retry_after = max(limited)
+
+    if tasks and not await worker.add_tasks(tasks):
+        logger.error(strings.VERIFICATION_SEND_SMS_ERROR)
+        _reject([result for result in accepted if result.success], strings.VERIFICATION_SEND_SMS_ERROR, "stopped")
+
+    return retry_after
+
+
+async def _rate_limit(
+        rate_limiter: Union[RateLimiter, SqliteRateLimiter],
+        client_id: str,
+        tasks: list[SMS],
+) -> list[float]:
+    """
+    Counts the tasks against the per-recipient and per-client limits.
+
+    Returns:
+        list[float]: The seconds each task has to wait for, zero for the counted ones, or an empty list if all of
+        them were counted.
+    """
+    if not rate_limiter.enabled:
+        return []
+
+    limited = await rate_limiter.acquire(client_id, [task.phone for task in tasks])
+    if not any(limited):
+        return []
+
+    logger.warning(f"{strings.RATE_LIMITED_ERROR} for client {client_id}")
+
+    return limited
+
+
+def _duplicate(original: IdempotencyRecord, fingerprint: bytes, task: SMS, segments_saved: int) -> WrapperResponse:
+    if original.fingerprint != fingerprint:
+        logger.error(strings.IDEMPOTENCY_KEY_REUSED_ERROR)
+        metrics.SMS_REJECTED.labels("send", "key_reused").inc()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=strings.IDEMPOTENCY_KEY_REUSED_ERROR)
+
+    logger.info(f"Duplicate request to {task.phone} suppressed")
+    metrics.SMS_REJECTED.labels("send", "duplicate").inc()
+
+    return WrapperResponse(
+        payload=SmsSendResponse(id=original.task_id, segments=task.segments, segments_saved=segments_saved).model_dump(),
+    )
+
+
+def _reject(results: list[SmsBatchItemResult], message: str, reason: str) -> None:
+    for result in results:
+        result.id = ""
+        result.success = False
+        result.message = message
+
+    metrics.SMS_REJECTED.labels("send_batch", reason).inc(len(results))
+
+
+def _retry_later(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+def _build_task(
+        phone: str,
+        request: SmsRequest,
+        client_id: str,
+        default_mode: TransliterationMode,
+) -> Tuple[SMS, int]:
+    task = SMS(
+        phone=phone,
+        message=request.message,
+        priority=request.priority,
+        client=client_id,
+        # Times without a timezone are in the local time of the gateway
+        send_at=request.send_at.timestamp() if request.send_at is not None else None,
+        expires_at=request.expires_at.timestamp() if request.expires_at is not None else None,
+    )
+
+    mode = request.transliteration or default_mode
+    if mode == TransliterationMode.off:
+        return task, 0
+
+    message, segments_saved = shorten(task.message, mode, task.segments)
+    if segments_saved:
+        task.message = message
+        task.segments -= segments_saved
+
+    return task, segments_saved
+
+
+def _expires_unsent(task: SMS) -> bool:
+    if task.expires_at is None:
+        return False
+
+    return task.expired() or (task.send_at is not None and task.expires_at <= task.send_at)
 
 
 @router.get("/task_count", status_code=status.HTTP_200_OK, name="sms:task_count")
 def get_task_count(worker: Worker = Depends(get_worker)) -> WrapperResponse:
     return WrapperResponse(
-        payload=SmsCountResponse(count=worker.task_count()).model_dump(),
+        payload=SmsCountResponse(count=worker.task_count(), lanes=worker.lane_counts()).model_dump(),
+    )
+
+
+@router.get("/sms/{sms_id}", status_code=status.HTTP_200_OK, name="sms:status")
+async def get_sms_status(sms_id: str, worker: Worker = Depends(get_worker)) -> WrapperResponse:
+    entry = await worker.status(sms_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=strings.SMS_NOT_FOUND_ERROR)
+
+    return WrapperResponse(payload=_status_response(sms_id, entry).model_dump())
+
+
+@router.post("/sms/status", status_code=status.HTTP_200_OK, name="sms:status_batch")
+async def get_sms_statuses(request: SmsStatusRequest, worker: Worker = Depends(get_worker)) -> WrapperResponse:
+    response = SmsStatusBatchResponse()
+
+    entries = await worker.statuses(request.ids)
+    for sms_id in request.ids:
+        entry = entries.get(sms_id)
+        if entry is None:
+            response.missing.append(sms_id)
+        else:
+            response.statuses.append(_status_response(sms_id, entry))
+
+    return WrapperResponse(payload=response.model_dump())
+
+
+def _status_response(sms_id: str, entry: StatusEntry) -> SmsStatusResponse:
+    return SmsStatusResponse(
+        id=sms_id,
+        status=entry.status,
+        attempts=entry.attempts,
+        updated_at=datetime.fromtimestamp(entry.updated_at, tz=timezone.utc),
+    )
+
+
+@router.get("/dead_letters", status_code=status.HTTP_200_OK, name="sms:dead_letters")
+async def get_dead_letters(
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=1, le=1000),
+        worker: Worker = Depends(get_worker),
+) -> WrapperResponse:
+    return WrapperResponse(
+        payload=SmsDeadLettersResponse(
+            count=await worker.dead_letter_count(),
+            tasks=await worker.dead_letters(offset=offset, limit=limit),
+        ).model_dump(),
+    )
+
+
+@router.post("/dead_letters/replay", status_code=status.HTTP_200_OK, name="sms:dead_letters_replay")
+async def replay_dead_letters(
+        request: SmsReplayRequest,
+        worker: Worker = Depends(get_worker),
+        client_id: str = Depends(get_client_id),
+) -> WrapperResponse:
+    retry_after = worker.admission_delay(client_id, await worker.dead_letter_count(request.ids))
+    if retry_after:
+        logger.warning(f"{strings.QUEUE_FULL_ERROR} for client {client_id}")
+        metrics.SMS_REJECTED.labels("replay", "queue_full").inc()
+        raise _retry_later(strings.QUEUE_FULL_ERROR, retry_after)
+
+    count = await worker.replay_dead_letters(request.ids)
+
+    return WrapperResponse(
+        payload=SmsReplayResponse(count=count).model_dump(),
     )
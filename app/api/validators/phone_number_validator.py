@@ -12,23 +12,52 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
 from loguru import logger
-from phonenumbers import NumberParseException, parse, is_possible_number, is_valid_number
+from phonenumbers import NumberParseException, PhoneNumberFormat, format_number, parse, is_possible_number, \
+    is_valid_number
 
+PHONE_CACHE_SIZE = 65536
 
-def check_phone_is_valid(phone_number: str) -> bool:
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def normalize_phone(phone_number: str) -> Optional[str]:
+    """
+    Validates a phone number and returns it in E.164 format, or None if it is invalid.
+
+    Results are cached by the raw input, so repeat recipients skip the parser entirely.
+    """
     try:
         phone = parse(phone_number, None)
     except NumberParseException:
         logger.warning(f"Phone number {phone_number} parser error")
-        return False
+        return None
 
     if not is_possible_number(phone):
         logger.warning(f"Phone number {phone_number} is impossible number")
-        return False
+        return None
 
     if not is_valid_number(phone):
         logger.warning(f"Phone number {phone_number} is invalid number")
-        return False
+        return None
+
+    return format_number(phone, PhoneNumberFormat.E164)
 
-    return True
+
+def validate_many(phone_numbers: Iterable[str]) -> List[Optional[str]]:
+    """
+    Normalizes a batch of phone numbers, validating each distinct number only once.
+    """
+    normalized = {}
+
+    return [
+        normalized[phone_number] if phone_number in normalized
+        else normalized.setdefault(phone_number, normalize_phone(phone_number))
+        for phone_number in phone_numbers
+    ]
+
+
+def check_phone_is_valid(phone_number: str) -> bool:
+    return normalize_phone(phone_number) is not None
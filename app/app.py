@@ -17,6 +17,7 @@ from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.errors.http_error import http_error_handler
+from app.api.routes.metrics import router as metrics_router
 from app.api.routes.v1.api import router as api_router
 from app.core.config import get_app_settings
 from app.core.events import create_start_app_handler, create_stop_app_handler
@@ -50,6 +51,7 @@ class Application:
         application.add_exception_handler(404, http_error_handler)
 
         application.include_router(api_router, prefix=self._settings.api_prefix)
+        application.include_router(metrics_router)
 
         self._application = application
 
@@ -17,12 +17,46 @@ from fastapi import FastAPI
 from loguru import logger
 
 from app.core.settings.app import AppSettings
+from app.services.idempotency_index import IdempotencyIndex, SqliteIdempotencyIndex
+from app.services.otp_store import OtpStore, SqliteOtpStore
+from app.services.rate_limiter import RateLimit, RateLimiter, SqliteRateLimiter
 from app.worker.events import worker_start, worker_stop
 
 
 def create_start_app_handler(app: FastAPI, settings: AppSettings) -> Callable:
     @logger.catch
     async def start_app() -> None:
+        phone_limit = RateLimit(settings.rate_limit_phone, settings.rate_limit_phone_window)
+        client_limit = RateLimit(settings.rate_limit_client, settings.rate_limit_client_window)
+
+        if settings.queue_shared:
+            # Retries may reach any of the processes sharing the queue, so they share the keys as well
+            app.state.idempotency_index = SqliteIdempotencyIndex(settings.queue_path)
+            # A code may be verified by another process than the one that issued it
+            app.state.otp_store = SqliteOtpStore(
+                settings.queue_path,
+                ttl=settings.otp_ttl,
+                max_attempts=settings.otp_max_attempts,
+                cooldown=settings.otp_cooldown,
+                code_length=settings.otp_code_length,
+            )
+            app.state.rate_limiter = SqliteRateLimiter(settings.queue_path, phone_limit, client_limit)
+        else:
+            app.state.idempotency_index = IdempotencyIndex(max_keys=settings.idempotency_max_keys)
+            app.state.otp_store = OtpStore(
+                max_size=settings.otp_max_codes,
+                ttl=settings.otp_ttl,
+                max_attempts=settings.otp_max_attempts,
+                cooldown=settings.otp_cooldown,
+                code_length=settings.otp_code_length,
+            )
+            app.state.rate_limiter = RateLimiter(
+                phone_limit,
+                client_limit,
+                sketch_width=settings.rate_limit_sketch_width,
+                max_clients=settings.rate_limit_max_clients,
+            )
+
         await worker_start(app, settings)
 
     return start_app
@@ -33,4 +67,13 @@ def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
         await worker_stop(app)
 
+        if isinstance(app.state.idempotency_index, SqliteIdempotencyIndex):
+            app.state.idempotency_index.close()
+
+        if isinstance(app.state.otp_store, SqliteOtpStore):
+            app.state.otp_store.close()
+
+        if isinstance(app.state.rate_limiter, SqliteRateLimiter):
+            app.state.rate_limiter.close()
+
     return stop_app
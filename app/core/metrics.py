@@ -0,0 +1,273 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# Children are plain attributes updated without locks: the event loop never
+# interleaves two updates, so recording a sample costs a couple of additions.
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self._buckets, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+            child = self._children[values] = self._new_child()
+
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+
+        return metric
+
+    def set_collector(self, name: str, collector: Callable[[], None]) -> None:
+        """
+        Registers a callback that refreshes gauges right before they are rendered.
+
+        Parameters:
+            name (str): The collector name, registering the same name again replaces the callback.
+            collector (Callable[[], None]): The callback.
+
+        Returns:
+            None.
+        """
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        for collector in self._collectors.values():
+            collector()
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SMS_ENQUEUED = REGISTRY.register(Counter(
+    "sms_enqueued_total",
+    "Messages accepted into the send queue.",
+    ["route"],
+))
+SMS_REJECTED = REGISTRY.register(Counter(
+    "sms_rejected_total",
+    "Messages rejected by the API.",
+    ["route", "reason"],
+))
+SMS_RESULTS = REGISTRY.register(Counter(
+    "sms_results_total",
+    "Send attempts by outcome.",
+    ["result"],
+))
+SMS_DELIVERY = REGISTRY.register(Counter(
+    "sms_delivery_total",
+    "Sent messages confirmed by the modem sent box and delivery reports, by outcome.",
+    ["result"],
+))
+OTP_VERIFICATIONS = REGISTRY.register(Counter(
+    "otp_verifications_total",
+    "Verification code checks by outcome.",
+    ["result"],
+))
+SMS_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "sms_queue_depth",
+    "Messages waiting in the send queue by priority.",
+    ["priority"],
+))
+SMS_TASKS = REGISTRY.register(Gauge(
+    "sms_tasks",
+    "Messages held by the worker by state.",
+    ["state"],
+))
+SMS_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "sms_queue_wait_seconds",
+    "Time a message waits in the send queue before it is dispatched to a modem.",
+    buckets=QUEUE_WAIT_BUCKETS,
+))
+WORKER_IDLE = REGISTRY.register(Counter(
+    "sms_worker_idle_seconds_total",
+    "Time the dispatcher and modem lanes spend waiting for work.",
+    ["worker"],
+))
+HILINK_REQUESTS = REGISTRY.register(Counter(
+    "hilink_requests_total",
+    "HiLink API calls by endpoint and result.",
+    ["endpoint", "result"],
+))
+HILINK_LATENCY = REGISTRY.register(Histogram(
+    "hilink_request_duration_seconds",
+    "HiLink API call latency by endpoint.",
+    ["endpoint"],
+))
@@ -15,12 +15,13 @@
 import logging
 import sys
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 from loguru import logger
-from pydantic import HttpUrl
+from pydantic import HttpUrl, field_validator, model_validator
 
 from app.core.logging import InterceptHandler
 from app.core.settings.base import BaseAppSettings
+from app.services.sms_transliteration import TransliterationMode
 
 
 class AppSettings(BaseAppSettings):
@@ -32,15 +33,104 @@ class AppSettings(BaseAppSettings):
     title: str = "Ride Online Sms"
     version: str = "v0.0.0"
 
-    hilink: HttpUrl
+    hilink: Union[List[HttpUrl], HttpUrl]
+    hilink_timeout: float = 5.0
+    hilink_max_connections: int = 4
+    hilink_max_keepalive_connections: int = 2
+    hilink_keepalive_expiry: float = 30.0
+    hilink_lane_depth: int = 1
+    hilink_failure_threshold: int = 3
+    hilink_recovery_interval: float = 30.0
+    hilink_health_interval: float = 10.0
+    hilink_segments_per_minute: int = 0
+
+    send_status_min_delay: float = 0.5
+    send_status_max_delay: float = 5.0
+    send_status_timeout: float = 60.0
+
+    sms_group_size: int = 1
+    sms_max_segments: int = 10
+    sms_priority_weights: Dict[str, int] = {"high": 4, "normal": 2, "low": 1}
+    sms_transliteration: TransliterationMode = TransliterationMode.off
+
+    inbox_poll_interval: float = 10.0
+    inbox_page_size: int = 50
+    inbox_delete_processed: bool = False
+    inbox_subscriber_buffer: int = 1000
+
+    delivery_sync_interval: float = 60.0
+    delivery_match_window: float = 300.0
+    delivery_retention: float = 86400.0
+    delivery_max_tracked: int = 100_000
+
+    retry_max_attempts: int = 5
+    retry_base_delay: float = 15.0
+    retry_max_delay: float = 900.0
+    dead_letter_max_size: int = 10000
+
+    status_max_size: int = 1_000_000
+    status_ttl: float = 86400.0
+
+    idempotency_max_keys: int = 1_000_000
+    idempotency_key_ttl: float = 86400.0
+    idempotency_content_ttl: float = 300.0
+
+    rate_limit_phone: int = 0
+    rate_limit_phone_window: float = 3600.0
+    rate_limit_client: int = 0
+    rate_limit_client_window: float = 60.0
+    rate_limit_sketch_width: int = 1 << 16
+    rate_limit_max_clients: int = 100_000
+
+    otp_code_length: int = 6
+    otp_ttl: float = 300.0
+    otp_max_attempts: int = 5
+    otp_cooldown: float = 60.0
+    otp_max_codes: int = 1_000_000
+    otp_message: str = "Your verification code: {code}"
+
+    queue_path: Optional[str] = None
+    queue_commit_interval: float = 0.005
+    queue_shared: bool = False
+    queue_poll_interval: float = 0.1
+    queue_stats_interval: float = 1.0
+    queue_max_depth: int = 0
+    queue_max_depth_per_client: int = 0
+    queue_drain_window: float = 60.0
+    queue_retry_after_max: float = 300.0
+
+    client_id_header: str = "X-Client-Id"
 
     api_prefix: str = "/api"
+    workers: int = 1
 
     allowed_hosts: List[str] = ["*"]
 
     logging_level: int = logging.INFO
     loggers: Tuple[str, str] = ("uvicorn.asgi", "uvicorn.access")
 
+    @field_validator("hilink", mode="before")
+    @classmethod
+    def split_hilink(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return [host.strip() for host in value.split(",") if host.strip()]
+
+        if not isinstance(value, list):
+            return [value]
+
+        return value
+
+    @model_validator(mode="after")
+    def check_shared_queue(self) -> "AppSettings":
+        if self.queue_shared and not self.queue_path:
+            raise ValueError("QUEUE_SHARED requires QUEUE_PATH")
+
+        if self.workers > 1 and not self.queue_shared:
+            # Independent queues in every process would all send through the same modems
+            raise ValueError("WORKERS > 1 requires QUEUE_SHARED and QUEUE_PATH")
+
+        return self
+
     @property
     def fastapi_kwargs(self) -> Dict[str, Any]:
         return {
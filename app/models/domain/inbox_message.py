@@ -0,0 +1,37 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from app.models.common import BaseAppModel
+
+# HiLink keeps delivery reports in the inbox, told apart from messages by their SmsType
+SMS_TYPE_DELIVERED = 7
+SMS_TYPE_NOT_DELIVERED = 8
+
+# Smstat of the messages in the sent box
+SMSTAT_SENT = 3
+SMSTAT_SEND_FAILED = 4
+
+
+class InboxMessage(BaseAppModel):
+    index: int
+    phone: str
+    content: str
+    date: str
+    modem: str = ""
+    status: int = 0
+    sms_type: int = 1
+
+    @property
+    def is_delivery_report(self) -> bool:
+        return self.sms_type in (SMS_TYPE_DELIVERED, SMS_TYPE_NOT_DELIVERED)
@@ -0,0 +1,51 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Dict, List, Optional
+
+from app.models.common import BaseAppModel
+
+
+class SendStatus(BaseAppModel):
+    phone: str = ""
+    success_phones: List[str] = []
+    fail_phones: List[str] = []
+    total_count: int = 0
+    current_index: int = 0
+
+    @property
+    def finished(self) -> bool:
+        # An idle modem reports TotalCount 0, which says nothing about the job we are waiting for
+        return 0 < self.total_count <= self.current_index
+
+    def is_failed(self, phone: str) -> bool:
+        return phone in self.fail_phones
+
+    def is_sent(self, phone: str) -> bool:
+        if phone in self.success_phones:
+            return True
+
+        return self.finished and not self.is_failed(phone) and self.phone in ("", phone)
+
+    def results(self, phones: List[str]) -> Dict[str, Optional[bool]]:
+        results = {}
+        for phone in phones:
+            if self.is_failed(phone):
+                results[phone] = False
+            elif phone in self.success_phones or self.finished:
+                results[phone] = True
+            else:
+                results[phone] = None
+
+        return results
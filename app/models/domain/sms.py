@@ -12,9 +12,54 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import time
+
+from enum import Enum
+from typing import Optional
+from uuid import uuid4
+from pydantic import Field, PrivateAttr, model_validator
+
 from app.models.common import BaseAppModel
+from app.services.sms_encoding import count_segments
+
+
+class SmsPriority(str, Enum):
+    urgent = "urgent"
+    high = "high"
+    normal = "normal"
+    low = "low"
+
+
+class SmsStatus(str, Enum):
+    scheduled = "scheduled"
+    queued = "queued"
+    sending = "sending"
+    sent = "sent"
+    delivered = "delivered"
+    failed = "failed"
+    dead = "dead"
+    expired = "expired"
 
 
 class SMS(BaseAppModel):
+    id: str = Field(default_factory=lambda: uuid4().hex)
     phone: str
     message: str
+    priority: SmsPriority = SmsPriority.normal
+    attempts: int = 0
+    segments: int = 0
+    client: str = ""
+    send_at: Optional[float] = None
+    expires_at: Optional[float] = None
+
+    _queued_at: float = PrivateAttr(default_factory=time.monotonic)
+
+    @model_validator(mode="after")
+    def count_message_segments(self) -> "SMS":
+        if not self.segments:
+            self.segments = count_segments(self.message)
+
+        return self
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and self.expires_at <= (time.time() if now is None else now)
@@ -12,13 +12,75 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import Field
+
 from app.models.common import BaseAppModel
+from app.models.domain.sms import SMS, SmsPriority, SmsStatus
+from app.services.sms_transliteration import TransliterationMode
 
 
 class SmsRequest(BaseAppModel):
     phone: str
     message: str
+    priority: SmsPriority = SmsPriority.normal
+    transliteration: Optional[TransliterationMode] = None
+    send_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+
+class SmsSendResponse(BaseAppModel):
+    id: str
+    segments: int
+    segments_saved: int = 0
 
 
 class SmsCountResponse(BaseAppModel):
     count: int
+    lanes: Dict[SmsPriority, int] = {}
+
+
+class SmsBatchItemResult(BaseAppModel):
+    index: int
+    id: str = ""
+    success: bool = True
+    message: str = ""
+    segments_saved: int = 0
+
+
+class SmsBatchResponse(BaseAppModel):
+    accepted: int = 0
+    rejected: int = 0
+    segments_saved: int = 0
+    results: List[SmsBatchItemResult] = []
+
+
+class SmsDeadLettersResponse(BaseAppModel):
+    count: int
+    tasks: List[SMS] = []
+
+
+class SmsReplayRequest(BaseAppModel):
+    ids: Optional[List[str]] = None
+
+
+class SmsReplayResponse(BaseAppModel):
+    count: int
+
+
+class SmsStatusResponse(BaseAppModel):
+    id: str
+    status: SmsStatus
+    attempts: int = 0
+    updated_at: datetime
+
+
+class SmsStatusRequest(BaseAppModel):
+    ids: List[str] = Field(max_length=1000)
+
+
+class SmsStatusBatchResponse(BaseAppModel):
+    statuses: List[SmsStatusResponse] = []
+    missing: List[str] = []
@@ -13,5 +13,17 @@
 #  limitations under the License.
 
 PHONE_NUMBER_INVALID_ERROR = "Invalid phone number"
-SERVICE_UNAVAILABLE = "Phone validation service temporary unavailable"
+SERVICE_UNAVAILABLE = "Sms modem temporary unavailable"
 VERIFICATION_SEND_SMS_ERROR = "Error sending sms to phone"
+SMS_REQUEST_INVALID_ERROR = "Invalid sms request"
+BATCH_BODY_INVALID_ERROR = "Invalid batch body"
+MESSAGE_TOO_LONG_ERROR = "Message is too long"
+SMS_NOT_FOUND_ERROR = "Sms not found"
+QUEUE_FULL_ERROR = "Sms queue is full"
+SMS_EXPIRED_ERROR = "Sms expires before it can be sent"
+RATE_LIMITED_ERROR = "Too many sms for the recipient or from the client"
+OTP_COOLDOWN_ERROR = "Verification code was sent recently"
+OTP_CODE_INVALID_ERROR = "Invalid verification code"
+OTP_CODE_EXPIRED_ERROR = "Verification code expired"
+OTP_ATTEMPTS_EXHAUSTED_ERROR = "Too many invalid verification codes"
+IDEMPOTENCY_KEY_REUSED_ERROR = "Idempotency key was already used for a different sms"
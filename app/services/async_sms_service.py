@@ -0,0 +1,289 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import httpx
+
+from typing import Dict, List, Optional, Tuple
+from httpx import AsyncClient, Limits, Response
+from pydantic import HttpUrl
+from loguru import logger
+
+from app.models.domain.inbox_message import InboxMessage
+from app.models.domain.send_status import SendStatus
+from app.services.base_sms_service import BaseSmsService
+from app.services.hilink_codec import HilinkDecodeError, SmsListDecoder
+from app.services.hilink_session import SESSION_ERRORS, HilinkSession
+from app.services.hilink_transport import MeasuredAsyncTransport
+
+
+class AsyncSmsService(BaseSmsService):
+    def __init__(self, device_host: HttpUrl, limits: Optional[Limits] = None, timeout: float = 5.0):
+        self._client = AsyncClient(
+            base_url=device_host.__str__(),
+            headers=self._build_headers(),
+            transport=MeasuredAsyncTransport(limits=limits or Limits()),
+            timeout=timeout,
+        )
+        self._session = HilinkSession(self._client)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    async def is_hilink(self) -> bool:
+        try:
+            response = await self._request("GET", "/api/device/information")
+        except httpx.TransportError as err:
+            logger.error(err)
+            return False
+
+        if response.status_code != 200:
+            return False
+
+        return True
+
+    async def send_sms(self, phone: str, content: str) -> bool:
+        """
+        Sends an SMS to the specified phone number with the given content.
+
+        Parameters:
+            phone (str): The phone number to send the SMS to.
+            content (str): The content of the SMS.
+
+        Returns:
+            bool: True if the SMS was sent successfully, False otherwise.
+        """
+        return await self.send_sms_group([phone], content)
+
+    async def send_sms_group(self, phones: List[str], content: str) -> bool:
+        """
+        Sends one SMS with the given content to several phone numbers in a single request.
+
+        Parameters:
+            phones (List[str]): The phone numbers to send the SMS to.
+            content (str): The content of the SMS.
+
+        Returns:
+            bool: True if the modem accepted the SMS, False otherwise.
+        """
+        payload = self._build_sms_send_payload(phones, content)
+
+        try:
+            response = await self._request("POST", "/api/sms/send-sms", payload)
+        except httpx.TransportError as err:
+            logger.error(err)
+            return False
+
+        if response.status_code != 200:
+            return False
+
+        return self._parse_send_sms_response(response.text)
+
+    async def delete_sms(self, index: int) -> None:
+        """
+        Deletes the SMS message at the specified index.
+
+        Parameters:
+            index (int): The index of the SMS message to delete.
+
+        Returns:
+            None.
+        """
+        payload = self._build_sms_delete_payload(index)
+
+        try:
+            await self._request("POST", "/api/sms/delete-sms", payload)
+        except httpx.TransportError as err:
+            logger.error(err)
+
+    async def delete_sms_many(self, indexes: List[int]) -> bool:
+        """
+        Deletes several SMS messages in a single request.
+
+        Parameters:
+            indexes (List[int]): The indexes of the SMS messages to delete.
+
+        Returns:
+            bool: True if the modem accepted the request, False otherwise.
+        """
+        payload = self._build_sms_delete_payload(*indexes)
+
+        try:
+            response = await self._request("POST", "/api/sms/delete-sms", payload)
+        except httpx.TransportError as err:
+            logger.error(err)
+            return False
+
+        if response.status_code != 200:
+            return False
+
+        return self._parse_send_sms_response(response.text)
+
+    async def list_sms(self, page_index: int, read_count: int, box_type: int = 1) -> Optional[List[InboxMessage]]:
+        """
+        Retrieves one page of a message box, newest messages first.
+
+        Parameters:
+            page_index (int): The page to retrieve, starting from 1.
+            read_count (int): The number of messages per page.
+            box_type (int): The message box, 1 for the inbox and 2 for the sent box.
+
+        Returns:
+            Optional[List[InboxMessage]]: The messages of the page, or None if the modem could not be reached.
+        """
+        payload = self._build_sms_list_payload(page_index, read_count, box_type)
+
+        try:
+            generation = await self._session.prepare()
+            messages, error_code = await self._stream_sms_list(payload)
+            if error_code in SESSION_ERRORS:
+                await self._session.refresh(generation)
+                messages, _ = await self._stream_sms_list(payload)
+
+            return messages
+        except httpx.TransportError as err:
+            logger.error(err)
+            return None
+        except HilinkDecodeError as err:
+            logger.error(err)
+            return None
+
+    async def get_sms(self) -> List[str]:
+        """
+        Retrieves the list of SMS messages.
+
+        Returns:
+            List[str]: A list of SMS messages.
+        """
+        payload = self._build_sms_list_payload()
+
+        try:
+            response = await self._request("POST", "/api/sms/sms-list", payload)
+        except httpx.TransportError as err:
+            logger.error(err)
+            return []
+
+        return self._parse_sms_list_response(response.text)
+
+    async def get_send_status(self) -> Optional[SendStatus]:
+        """
+        Retrieves the progress of the current send job.
+
+        Returns:
+            Optional[SendStatus]: The send status, or None if the modem could not be reached.
+        """
+        try:
+            response = await self._request("GET", "/api/sms/send-status")
+        except httpx.TransportError as err:
+            logger.error(err)
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        return self._parse_send_status(response.text)
+
+    async def wait_send_sms(self, phone_number: str) -> bool:
+        """
+        Waits for the send status of the SMS to the specified phone number.
+
+        Parameters:
+            phone_number (str): The phone number to check the send status for.
+
+        Returns:
+            bool: True if the send status is successful, False otherwise.
+        """
+        send_status = await self.get_send_status()
+        if send_status is None:
+            return False
+
+        return send_status.is_sent(phone_number)
+
+    async def wait_send_sms_group(self, phones: List[str]) -> Dict[str, Optional[bool]]:
+        """
+        Checks the send status of a multi-recipient SMS for each of its phone numbers.
+
+        Parameters:
+            phones (List[str]): The phone numbers the SMS was sent to.
+
+        Returns:
+            Dict[str, Optional[bool]]: True for sent, False for failed and None for pending recipients.
+        """
+        send_status = await self.get_send_status()
+        if send_status is None:
+            return {phone: None for phone in phones}
+
+        return send_status.results(phones)
+
+    async def send_sms_and_wait(self, phone: str, content: str) -> bool:
+        """
+        Sends an SMS to the specified phone number with the given content and waits for the send status.
+
+        Parameters:
+            phone (str): The phone number to send the SMS to.
+            content (str): The content of the SMS.
+
+        Returns:
+            bool: True if the SMS was sent successfully and the send status is successful, False otherwise.
+        """
+        await self.send_sms(phone, content)
+        return await self.wait_send_sms(phone)
+
+    async def _request(self, method: str, url: str, payload: Optional[str] = None) -> Response:
+        """
+        Makes a HiLink API call within the modem session, renewing the session once if the modem rejects it.
+
+        Parameters:
+            method (str): The HTTP method.
+            url (str): The path of the API endpoint.
+            payload (Optional[str]): The request body.
+
+        Returns:
+            Response: The response of the modem.
+        """
+        generation = await self._session.prepare()
+
+        response = await self._client.request(method, url, content=payload, headers=self._session.headers())
+        self._session.update(response)
+
+        if self._session.rejected(response):
+            await self._session.refresh(generation)
+
+            response = await self._client.request(method, url, content=payload, headers=self._session.headers())
+            self._session.update(response)
+
+        return response
+
+    async def _stream_sms_list(self, payload: str) -> Tuple[Optional[List[InboxMessage]], Optional[int]]:
+        """
+        Decodes a sms-list response as it arrives.
+
+        Parameters:
+            payload (str): The sms-list request body.
+
+        Returns:
+            Tuple[Optional[List[InboxMessage]], Optional[int]]: The messages, or None with the HiLink error code.
+        """
+        decoder = SmsListDecoder(modem=str(self._client.base_url))
+
+        headers = self._session.headers()
+
+        async with self._client.stream("POST", "/api/sms/sms-list", content=payload, headers=headers) as response:
+            self._session.update(response)
+            if response.status_code != 200:
+                return None, None
+
+            async for chunk in response.aiter_bytes():
+                decoder.feed(chunk)
+
+        return decoder.close(), decoder.error_code
@@ -0,0 +1,166 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import List, Optional
+from loguru import logger
+
+from app.models.domain.inbox_message import InboxMessage
+from app.models.domain.send_status import SendStatus
+from app.services import hilink_codec
+from app.services.hilink_codec import HilinkDecodeError
+from app.services.sms_encoding import analyze
+
+
+class BaseSmsService:
+    """
+    Payload builders and response parsers shared by the sync and async HiLink clients.
+    """
+
+    @staticmethod
+    def _build_headers() -> dict[str, str]:
+        return {"Content-Type": "application/xml"}
+
+    @staticmethod
+    def _build_sms_send_payload(phones: List[str], content: str) -> str:
+        """
+        Builds the payload for sending an SMS.
+
+        Parameters:
+            phones (List[str]): The phone numbers to send the SMS to.
+            content (str): The content of the SMS.
+
+        Returns:
+            str: The payload for sending the SMS.
+        """
+        return hilink_codec.encode_send_sms(phones, content, length=analyze(content).units)
+
+    @staticmethod
+    def _build_sms_delete_payload(*indexes: int) -> str:
+        """
+        Builds the payload for deleting SMS messages.
+
+        Parameters:
+            indexes (int): The indexes of the SMS messages to delete.
+
+        Returns:
+            str: The payload for deleting the SMS messages.
+        """
+        return hilink_codec.encode_delete_sms(indexes)
+
+    @staticmethod
+    def _build_sms_list_payload(page_index: int = 1, read_count: int = 20, box_type: int = 1) -> str:
+        """
+        Builds the payload for retrieving the list of SMS messages.
+
+        Parameters:
+            page_index (int): The page to retrieve, starting from 1.
+            read_count (int): The number of messages per page.
+            box_type (int): The message box, 1 for the inbox and 2 for the sent box.
+
+        Returns:
+            str: The payload for retrieving the SMS messages.
+        """
+        return hilink_codec.encode_sms_list(page_index, read_count, box_type)
+
+    @staticmethod
+    def _parse_send_sms_response(text: str) -> bool:
+        """
+        Checks whether the modem accepted a send-sms request.
+
+        Parameters:
+            text (str): The response body of the send-sms request.
+
+        Returns:
+            bool: True if the modem answered OK, False otherwise.
+        """
+        return hilink_codec.decode_ok(text)
+
+    @classmethod
+    def _parse_sms_list_response(cls, text: str) -> List[str]:
+        """
+        Extracts the SMS messages from a sms-list response.
+
+        Parameters:
+            text (str): The response body of the sms-list request.
+
+        Returns:
+            List[str]: A list of SMS messages.
+        """
+        return cls._get_content(cls._parse_sms_list_messages(text) or [])
+
+    @staticmethod
+    def _parse_sms_list_messages(text: str, modem: str = "") -> Optional[List[InboxMessage]]:
+        """
+        Parses a sms-list response into structured messages.
+
+        Parameters:
+            text (str): The response body of the sms-list request.
+            modem (str): The host of the modem the messages were read from.
+
+        Returns:
+            Optional[List[InboxMessage]]: The messages of the page, or None if the modem returned an error.
+        """
+        try:
+            return hilink_codec.decode_sms_list(text, modem=modem)
+        except HilinkDecodeError as err:
+            logger.error(err)
+            return None
+
+    @staticmethod
+    def _parse_send_status(text: str) -> Optional[SendStatus]:
+        """
+        Parses a send-status response.
+
+        Parameters:
+            text (str): The response body of the send-status request.
+
+        Returns:
+            Optional[SendStatus]: The progress of the current send job, or None if the modem returned an error.
+        """
+        try:
+            return hilink_codec.decode_send_status(text)
+        except HilinkDecodeError as err:
+            logger.error(err)
+            return None
+
+    @classmethod
+    def _parse_send_status_response(cls, text: str, phone_number: str) -> bool:
+        """
+        Checks a send-status response for the completion of the SMS to the specified phone number.
+
+        Parameters:
+            text (str): The response body of the send-status request.
+            phone_number (str): The phone number to check the send status for.
+
+        Returns:
+            bool: True if the send status is successful, False otherwise.
+        """
+        send_status = cls._parse_send_status(text)
+        if send_status is None:
+            return False
+
+        return send_status.is_sent(phone_number)
+
+    @staticmethod
+    def _get_content(data: List[InboxMessage]) -> List[str]:
+        """
+        Formats the SMS messages for display.
+
+        Parameters:
+            data (List[InboxMessage]): The list of SMS messages.
+
+        Returns:
+            List[str]: The list of SMS message contents.
+        """
+        return [f"Message from {message.phone} received {message.date}: {message.content}" for message in data]
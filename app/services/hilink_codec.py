@@ -0,0 +1,229 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import re
+import time
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from xml.etree.ElementTree import Element, ParseError, XMLPullParser, fromstring
+from xml.sax.saxutils import escape
+
+from app.models.domain.inbox_message import InboxMessage
+from app.models.domain.send_status import SendStatus
+
+_SEND_SMS_TEMPLATE = (
+    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+    "<request><Index>-1</Index><Phones>%s</Phones><Sca></Sca><Content>%s</Content>"
+    "<Length>%d</Length><Reserved>1</Reserved><Date>%s</Date></request>"
+)
+_PHONE_TEMPLATE = "<Phone>%s</Phone>"
+_DELETE_SMS_TEMPLATE = "<?xml version=\"1.0\" encoding=\"UTF-8\"?><request>%s</request>"
+_INDEX_TEMPLATE = "<Index>%d</Index>"
+_SMS_LIST_TEMPLATE = (
+    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+    "<request><PageIndex>%d</PageIndex><ReadCount>%d</ReadCount><BoxType>%d</BoxType>"
+    "<SortType>0</SortType><Ascending>0</Ascending><UnreadPreferred>0</UnreadPreferred></request>"
+)
+
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_OK_PATTERN = re.compile(r"<response>\s*OK\s*</response>")
+_ERROR_CODE_PATTERN = re.compile(r"<error>\s*<code>\s*(\d+)\s*</code>")
+_PHONES_SEPARATOR = re.compile(r"[;,]")
+
+_now_second = -1
+_now_text = ""
+
+
+class HilinkDecodeError(ValueError):
+    pass
+
+
+def encode_send_sms(phones: Iterable[str], content: str, length: int, date: Optional[datetime] = None) -> str:
+    _phones = "".join([_PHONE_TEMPLATE % _escape(phone) for phone in phones])
+    _date = date.strftime(_DATE_FORMAT) if date is not None else _now()
+
+    return _SEND_SMS_TEMPLATE % (_phones, _escape(content), length, _date)
+
+
+def encode_delete_sms(indexes: Iterable[int]) -> str:
+    return _DELETE_SMS_TEMPLATE % "".join(_INDEX_TEMPLATE % index for index in indexes)
+
+
+def encode_sms_list(page_index: int, read_count: int, box_type: int) -> str:
+    return _SMS_LIST_TEMPLATE % (page_index, read_count, box_type)
+
+
+def decode_ok(text: str) -> bool:
+    return _OK_PATTERN.search(text) is not None
+
+
+def decode_error_code(text: str) -> Optional[int]:
+    """
+    Returns the code of a HiLink error response, None for any other response.
+    """
+    match = _ERROR_CODE_PATTERN.search(text)
+    if match is None:
+        return None
+
+    return int(match.group(1))
+
+
+def decode_session(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Decodes a SesTokInfo response into the session cookie and the verification token.
+    """
+    root = _fromstring(text)
+    if root.tag != "response":
+        return None
+
+    return root.findtext("SesInfo") or "", root.findtext("TokInfo") or ""
+
+
+def decode_send_status(text: str) -> Optional[SendStatus]:
+    """
+    Decodes a send-status response, returns None for HiLink error responses.
+    """
+    root = _fromstring(text)
+    if root.tag != "response":
+        return None
+
+    return SendStatus(
+        phone=root.findtext("Phone") or "",
+        success_phones=split_phones(root.findtext("SucPhone")),
+        fail_phones=split_phones(root.findtext("FailPhone")),
+        total_count=_int(root.findtext("TotalCount"), "TotalCount"),
+        current_index=_int(root.findtext("CurIndex"), "CurIndex"),
+    )
+
+
+def decode_sms_list(text: str, modem: str = "") -> Optional[List[InboxMessage]]:
+    decoder = SmsListDecoder(modem=modem)
+    decoder.feed(text)
+
+    return decoder.close()
+
+
+class SmsListDecoder:
+    """
+    Incremental sms-list decoder.
+
+    Chunks of the response body can be fed as they arrive. Each Message element is turned
+    into an InboxMessage as soon as it is complete and then dropped from the tree, so
+    memory use does not grow with the page size.
+    """
+
+    def __init__(self, modem: str = ""):
+        self._modem = modem
+        self._parser = XMLPullParser(events=("end",))
+        self._root: Optional[str] = None
+        self._error_code: Optional[int] = None
+        self._messages: List[InboxMessage] = []
+
+    @property
+    def error_code(self) -> Optional[int]:
+        """
+        The code of a HiLink error response, available once the response has been fed.
+        """
+        return self._error_code
+
+    def feed(self, data: str | bytes) -> None:
+        try:
+            self._parser.feed(data)
+        except ParseError as err:
+            raise HilinkDecodeError(str(err)) from err
+
+        self._drain()
+
+    def close(self) -> Optional[List[InboxMessage]]:
+        """
+        Finishes decoding and returns the messages, or None for a HiLink error response.
+        """
+        try:
+            self._parser.close()
+        except ParseError as err:
+            raise HilinkDecodeError(str(err)) from err
+
+        self._drain()
+
+        if self._root != "response":
+            return None
+
+        return self._messages
+
+    def _drain(self) -> None:
+        for _, element in self._parser.read_events():
+            if element.tag == "Message":
+                self._messages.append(self._decode_message(element))
+                element.clear()
+            elif element.tag == "code":
+                self._error_code = _int(element.text, "code")
+
+            # The root element is the last one to end
+            self._root = element.tag
+
+    def _decode_message(self, element: Element) -> InboxMessage:
+        fields = {child.tag: child.text for child in element}
+
+        # The fields are already of the right type, skip model validation
+        return InboxMessage.model_construct(
+            index=_int(fields.get("Index"), "Index"),
+            phone=fields.get("Phone") or "",
+            content=fields.get("Content") or "",
+            date=fields.get("Date") or "",
+            modem=self._modem,
+            status=_int(fields.get("Smstat"), "Smstat"),
+            sms_type=_int(fields.get("SmsType") or "1", "SmsType"),
+        )
+
+
+def split_phones(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+
+    return [phone for phone in _PHONES_SEPARATOR.split(value) if phone]
+
+
+def _now() -> str:
+    # Formatting the date dominates encoding time, it only changes once a second
+    global _now_second, _now_text
+
+    second = int(time.time())
+    if second != _now_second:
+        _now_text = time.strftime(_DATE_FORMAT, time.localtime(second))
+        _now_second = second
+
+    return _now_text
+
+
+def _int(value: Optional[str], field: str) -> int:
+    try:
+        return int(value or 0)
+    except ValueError as err:
+        raise HilinkDecodeError(f"Invalid {field}: {value!r}") from err
+
+
+def _escape(value: str) -> str:
+    if "&" in value or "<" in value or ">" in value:
+        return escape(value)
+
+    return value
+
+
+def _fromstring(text: str) -> Element:
+    try:
+        return fromstring(text)
+    except ParseError as err:
+        raise HilinkDecodeError(str(err)) from err
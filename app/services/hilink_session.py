@@ -0,0 +1,112 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from typing import Dict, Optional
+from httpx import AsyncClient, Response
+from loguru import logger
+
+from app.services import hilink_codec
+from app.services.hilink_codec import HilinkDecodeError
+
+TOKEN_HEADER = "__RequestVerificationToken"
+
+# Wrong session and wrong session token
+SESSION_ERRORS = frozenset({125002, 125003})
+
+
+class HilinkSession:
+    """
+    Session cookie and verification token of one HiLink modem.
+
+    The session is fetched from SesTokInfo once and then kept up to date from the responses:
+    the client's cookie jar follows Set-Cookie and firmwares that rotate the token after a write
+    announce the next one in a response header. Callers that find the session rejected renew it
+    through a single SesTokInfo request, however many of them are waiting.
+    """
+
+    def __init__(self, client: AsyncClient):
+        self._client = client
+        self._token: Optional[str] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def prepare(self) -> int:
+        """
+        Fetches the session before the first call.
+
+        Returns:
+            int: The generation of the session, to be passed to refresh() if the modem rejects it.
+        """
+        if self._generation == 0:
+            await self.refresh(0)
+
+        return self._generation
+
+    async def refresh(self, generation: int) -> None:
+        """
+        Renews the session unless it was renewed since the caller read the given generation.
+
+        Parameters:
+            generation (int): The generation returned by prepare().
+
+        Returns:
+            None.
+        """
+        async with self._lock:
+            if generation != self._generation:
+                return
+
+            response = await self._client.get("/api/webserver/SesTokInfo")
+            self._generation += 1
+
+            session = None
+            if response.status_code == 200:
+                try:
+                    session = hilink_codec.decode_session(response.text)
+                except HilinkDecodeError as err:
+                    logger.error(err)
+
+            if session is None:
+                # Firmwares without SesTokInfo accept calls without a session
+                self._token = None
+                return
+
+            cookie, self._token = session
+            name, _, value = cookie.partition("=")
+            if value:
+                self._client.cookies.set(name, value)
+
+    def headers(self) -> Dict[str, str]:
+        if self._token is None:
+            return {}
+
+        return {TOKEN_HEADER: self._token}
+
+    def update(self, response: Response) -> None:
+        """
+        Takes the rotated token from the response headers.
+        """
+        token = response.headers.get(TOKEN_HEADER)
+        if token:
+            # Some firmwares announce several tokens at once, any of them is accepted
+            self._token = token.split("#", 1)[0]
+
+    @staticmethod
+    def rejected(response: Response) -> bool:
+        """
+        Checks whether the modem rejected the call because of an expired session or token.
+        """
+        return response.status_code == 200 and hilink_codec.decode_error_code(response.text) in SESSION_ERRORS
@@ -0,0 +1,69 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+import httpx
+
+from app.core import metrics
+
+
+def _endpoint(request: httpx.Request) -> str:
+    return request.url.path.rsplit("/", 1)[-1]
+
+
+class MeasuredAsyncTransport(httpx.AsyncHTTPTransport):
+    """
+    Records latency and outcome of every HiLink API call.
+
+    For streamed responses the latency covers the time to the response headers.
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = _endpoint(request)
+        started = time.perf_counter()
+
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.TransportError:
+            metrics.HILINK_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+            metrics.HILINK_REQUESTS.labels(endpoint, "transport_error").inc()
+            raise
+
+        metrics.HILINK_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        metrics.HILINK_REQUESTS.labels(endpoint, "ok" if response.status_code == 200 else "http_error").inc()
+
+        return response
+
+
+class MeasuredTransport(httpx.HTTPTransport):
+    """
+    Records latency and outcome of every HiLink API call made by the blocking client.
+    """
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = _endpoint(request)
+        started = time.perf_counter()
+
+        try:
+            response = super().handle_request(request)
+        except httpx.TransportError:
+            metrics.HILINK_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+            metrics.HILINK_REQUESTS.labels(endpoint, "transport_error").inc()
+            raise
+
+        metrics.HILINK_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        metrics.HILINK_REQUESTS.labels(endpoint, "ok" if response.status_code == 200 else "http_error").inc()
+
+        return response
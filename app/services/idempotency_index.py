@@ -0,0 +1,138 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+from hashlib import blake2b
+from typing import NamedTuple, Optional
+
+from app.services.ttl_cache import TtlCache
+
+
+class IdempotencyRecord(NamedTuple):
+    task_id: str
+    # Digest of the request the key was first used with, a retry must match it
+    fingerprint: bytes
+
+
+class IdempotencyIndex:
+    """
+    Remembers accepted requests by key for a limited time.
+
+    Keys are stored as 16 byte digests, at most max_keys of them.
+    """
+
+    def __init__(self, max_keys: int):
+        self._entries: TtlCache[bytes, IdempotencyRecord] = TtlCache(max_keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def digest(*parts: str) -> bytes:
+        return blake2b("\x00".join(parts).encode(), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[IdempotencyRecord]:
+        return self._entries.get(key)
+
+    def put(self, key: bytes, record: IdempotencyRecord, ttl: float) -> None:
+        self._entries.set(key, record, ttl)
+
+    def discard(self, key: bytes) -> None:
+        self._entries.discard(key)
+
+    async def claim(self, key: bytes, record: IdempotencyRecord, ttl: float) -> Optional[IdempotencyRecord]:
+        """
+        Stores record under key unless the key is already taken.
+
+        Parameters:
+            key (bytes): The key digest.
+            record (IdempotencyRecord): The record to store.
+            ttl (float): Seconds the key stays taken.
+
+        Returns:
+            Optional[IdempotencyRecord]: The record stored earlier under key, or None if record was stored.
+        """
+        existing = self.get(key)
+        if existing is None:
+            self.put(key, record, ttl)
+
+        return existing
+
+    async def release(self, key: bytes) -> None:
+        self.discard(key)
+
+
+class SqliteIdempotencyIndex:
+    """
+    Idempotency index kept in a SQLite database, shared by all processes using the same file.
+
+    Claims commit immediately, so a retry arriving at another process sees the key at once.
+    Expired keys are deleted every cleanup_interval claims.
+    """
+
+    def __init__(self, path: str, cleanup_interval: int = 1000):
+        self._cleanup_interval = cleanup_interval
+        self._claims = 0
+
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Losing the latest keys on power failure is acceptable, waiting for fsync on every request is not
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency ("
+            "key BLOB PRIMARY KEY, task_id TEXT NOT NULL, fingerprint BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    digest = staticmethod(IdempotencyIndex.digest)
+
+    async def claim(self, key: bytes, record: IdempotencyRecord, ttl: float) -> Optional[IdempotencyRecord]:
+        return await asyncio.to_thread(self._claim, key, record, ttl)
+
+    async def release(self, key: bytes) -> None:
+        await asyncio.to_thread(self._execute, "DELETE FROM idempotency WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _claim(self, key: bytes, record: IdempotencyRecord, ttl: float) -> Optional[IdempotencyRecord]:
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+
+            row = self._connection.execute(
+                "SELECT task_id, fingerprint FROM idempotency WHERE key = ? AND expires_at > ?", (key, now),
+            ).fetchone()
+            if row is not None:
+                return IdempotencyRecord(*row)
+
+            self._connection.execute(
+                "INSERT OR REPLACE INTO idempotency (key, task_id, fingerprint, expires_at) VALUES (?, ?, ?, ?)",
+                (key, record.task_id, record.fingerprint, now + ttl),
+            )
+
+            self._claims += 1
+            if self._claims % self._cleanup_interval == 0:
+                self._connection.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+
+        return None
+
+    def _execute(self, query: str, parameters: tuple) -> None:
+        with self._lock:
+            self._connection.execute(query, parameters)
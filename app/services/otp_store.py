@@ -0,0 +1,225 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import hashlib
+import hmac
+import secrets
+import sqlite3
+import threading
+import time
+
+from enum import Enum
+from typing import Optional, Tuple
+
+from app.services.ttl_cache import TtlCache
+
+SALT_SIZE = 16
+
+
+class OtpCheck(str, Enum):
+    verified = "verified"
+    invalid = "invalid"
+    expired = "expired"
+    exhausted = "exhausted"
+
+
+class _Code:
+    __slots__ = ("salt", "digest", "issued_at", "expires_at", "attempts")
+
+    def __init__(self, salt: bytes, digest: bytes, issued_at: float, expires_at: float, attempts: int):
+        self.salt = salt
+        self.digest = digest
+        self.issued_at = issued_at
+        self.expires_at = expires_at
+        self.attempts = attempts
+
+
+class OtpStore:
+    """
+    One-time codes by phone, kept as salted hashes.
+
+    A code is valid for ttl seconds and max_attempts checks, a phone gets a new code at most once
+    per cooldown seconds. Every issue drops the expired codes from the front of the store, so
+    no periodic scan is needed and the store never exceeds max_size phones.
+    """
+
+    def __init__(self, max_size: int, ttl: float, max_attempts: int, cooldown: float, code_length: int):
+        self._ttl = ttl
+        self._max_attempts = max_attempts
+        self._cooldown = cooldown
+        self._code_length = code_length
+
+        # Codes all live for the same time, so the oldest entry is always the first to expire
+        self._codes: TtlCache[str, _Code] = TtlCache(max_size)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    async def issue(self, phone: str) -> Tuple[Optional[str], float]:
+        """
+        Issues a new code for phone, replacing the previous one.
+
+        Parameters:
+            phone (str): The normalized phone number.
+
+        Returns:
+            Tuple[Optional[str], float]: The code, or None with the seconds until phone may get a new code.
+        """
+        now = time.time()
+
+        previous = self._codes.get(phone)
+        if previous is not None and now - previous.issued_at < self._cooldown:
+            return None, self._cooldown - (now - previous.issued_at)
+
+        code, salt, digest = _generate(self._code_length)
+        self._codes.set(phone, _Code(salt, digest, now, now + self._ttl, self._max_attempts), self._lifetime)
+
+        return code, 0.0
+
+    async def verify(self, phone: str, code: str) -> OtpCheck:
+        """
+        Checks code against the code issued for phone, a verified code cannot be used again.
+
+        Parameters:
+            phone (str): The normalized phone number.
+            code (str): The code entered by the user.
+
+        Returns:
+            OtpCheck: The outcome of the check.
+        """
+        entry = self._codes.get(phone)
+        if entry is None or not entry.digest or entry.expires_at <= time.time():
+            return OtpCheck.expired
+
+        if hmac.compare_digest(entry.digest, _hash(code, entry.salt)):
+            # The entry stays until its lifetime ends to keep the cooldown
+            entry.digest = b""
+            return OtpCheck.verified
+
+        entry.attempts -= 1
+        if entry.attempts <= 0:
+            entry.digest = b""
+            return OtpCheck.exhausted
+
+        return OtpCheck.invalid
+
+    async def revoke(self, phone: str) -> None:
+        self._codes.discard(phone)
+
+    @property
+    def _lifetime(self) -> float:
+        return max(self._ttl, self._cooldown)
+
+
+class SqliteOtpStore:
+    """
+    One-time codes kept in a SQLite database, shared by all processes using the same file.
+
+    A code issued by one process can be verified by another. Expired codes are deleted every
+    cleanup_interval issues.
+    """
+
+    def __init__(self, path: str, ttl: float, max_attempts: int, cooldown: float, code_length: int,
+                 cleanup_interval: int = 1000):
+        self._ttl = ttl
+        self._max_attempts = max_attempts
+        self._cooldown = cooldown
+        self._code_length = code_length
+        self._cleanup_interval = cleanup_interval
+        self._issued = 0
+
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS otp ("
+            "phone TEXT PRIMARY KEY, salt BLOB NOT NULL, digest BLOB NOT NULL, issued_at REAL NOT NULL, "
+            "expires_at REAL NOT NULL, attempts INTEGER NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    async def issue(self, phone: str) -> Tuple[Optional[str], float]:
+        return await asyncio.to_thread(self._issue, phone)
+
+    async def verify(self, phone: str, code: str) -> OtpCheck:
+        return await asyncio.to_thread(self._verify, phone, code)
+
+    async def revoke(self, phone: str) -> None:
+        await asyncio.to_thread(self._execute, "DELETE FROM otp WHERE phone = ?", (phone,))
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _issue(self, phone: str) -> Tuple[Optional[str], float]:
+        now = time.time()
+        code, salt, digest = _generate(self._code_length)
+
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+
+            row = self._connection.execute("SELECT issued_at FROM otp WHERE phone = ?", (phone,)).fetchone()
+            if row is not None and now - row[0] < self._cooldown:
+                return None, self._cooldown - (now - row[0])
+
+            self._connection.execute(
+                "INSERT OR REPLACE INTO otp (phone, salt, digest, issued_at, expires_at, attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (phone, salt, digest, now, now + self._ttl, self._max_attempts),
+            )
+
+            self._issued += 1
+            if self._issued % self._cleanup_interval == 0:
+                self._connection.execute("DELETE FROM otp WHERE issued_at <= ?", (now - max(self._ttl, self._cooldown),))
+
+        return code, 0.0
+
+    def _verify(self, phone: str, code: str) -> OtpCheck:
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+
+            row = self._connection.execute(
+                "SELECT salt, digest, expires_at, attempts FROM otp WHERE phone = ?", (phone,),
+            ).fetchone()
+            if row is None or not row[1] or row[2] <= time.time():
+                return OtpCheck.expired
+
+            salt, digest, _, attempts = row
+            if hmac.compare_digest(digest, _hash(code, salt)):
+                self._connection.execute("UPDATE otp SET digest = X'' WHERE phone = ?", (phone,))
+                return OtpCheck.verified
+
+            attempts -= 1
+            if attempts <= 0:
+                self._connection.execute("UPDATE otp SET digest = X'', attempts = 0 WHERE phone = ?", (phone,))
+                return OtpCheck.exhausted
+
+            self._connection.execute("UPDATE otp SET attempts = ? WHERE phone = ?", (attempts, phone))
+
+        return OtpCheck.invalid
+
+    def _execute(self, query: str, parameters: tuple) -> None:
+        with self._lock:
+            self._connection.execute(query, parameters)
+
+
+def _generate(length: int) -> Tuple[str, bytes, bytes]:
+    code = str(secrets.randbelow(10 ** length)).zfill(length)
+    salt = secrets.token_bytes(SALT_SIZE)
+
+    return code, salt, _hash(code, salt)
+
+
+def _hash(code: str, salt: bytes) -> bytes:
+    return hashlib.blake2b(code.encode(), salt=salt, digest_size=32).digest()
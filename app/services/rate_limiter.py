@@ -0,0 +1,288 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+from array import array
+from typing import List, Optional, Tuple
+
+from app.services.ttl_cache import TtlCache
+
+SKETCH_DEPTH = 4
+
+
+class RateLimit:
+    """
+    Sliding window limit of limit events per window seconds.
+
+    The window is estimated from the counts of the current and the previous fixed window, the
+    previous count weighted by the share of it still inside the sliding window. A limit of zero
+    disables it.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def index(self, now: float) -> int:
+        return int(now // self.window)
+
+    def retry_after(self, previous: float, current: float, now: float) -> float:
+        """
+        Returns zero if one more event fits, otherwise the seconds until it does.
+        """
+        elapsed = now - self.index(now) * self.window
+        if previous * (1 - elapsed / self.window) + current + 1 <= self.limit:
+            return 0.0
+
+        if current + 1 <= self.limit:
+            # The previous window slides out far enough within the current one
+            return max(self.window * (1 - (self.limit - 1 - current) / previous) - elapsed, 0.0)
+
+        # The current window has to become the previous one and slide out
+        return self.window - elapsed + self.window * (1 - (self.limit - 1) / current)
+
+
+class _Counts:
+    __slots__ = ("index", "previous", "current")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.previous = 0
+        self.current = 0
+
+    def roll(self, index: int) -> None:
+        if index == self.index:
+            return
+
+        self.previous = self.current if index == self.index + 1 else 0
+        self.current = 0
+        self.index = index
+
+
+class _Sketch:
+    """
+    Count-min sketch of the events of one fixed window.
+
+    Counts never fall below the true count, collisions can only make a phone look busier.
+    """
+
+    def __init__(self, width: int):
+        self._width = width
+        self._rows = [array("I", bytes(4 * width)) for _ in range(SKETCH_DEPTH)]
+
+    def estimate(self, slots: Tuple[int, ...]) -> int:
+        return min(row[slot] for row, slot in zip(self._rows, slots))
+
+    def add(self, slots: Tuple[int, ...]) -> None:
+        for row, slot in zip(self._rows, slots):
+            row[slot] += 1
+
+
+class RateLimiter:
+    """
+    Limits the messages per recipient phone and per API client.
+
+    Clients are counted exactly, up to max_clients of them. Phones are counted approximately
+    in two count-min sketches of fixed size, the current and the previous window, so memory
+    does not grow with the number of distinct phones. Each check costs O(1).
+    """
+
+    def __init__(self, phone_limit: RateLimit, client_limit: RateLimit, sketch_width: int, max_clients: int):
+        self._phone_limit = phone_limit
+        self._client_limit = client_limit
+        self._sketch_width = sketch_width
+
+        self._clients: TtlCache[str, _Counts] = TtlCache(max_clients)
+        self._sketch_index = 0
+        self._previous = _Sketch(sketch_width)
+        self._current = _Sketch(sketch_width)
+
+    @property
+    def enabled(self) -> bool:
+        return self._phone_limit.enabled or self._client_limit.enabled
+
+    async def acquire(self, client: str, phones: List[str]) -> List[float]:
+        """
+        Counts a message to each phone from client, in order, as long as it fits both limits.
+
+        Parameters:
+            client (str): The API client sending the messages.
+            phones (List[str]): The recipient phone numbers.
+
+        Returns:
+            List[float]: Zero for each counted message, otherwise the seconds until it would fit.
+        """
+        now = time.time()
+
+        counts = self._client_counts(client, now)
+        self._roll_sketches(now)
+
+        results = []
+        for phone in phones:
+            slots = self._slots(phone)
+
+            retry_after = 0.0
+            if self._client_limit.enabled:
+                retry_after = self._client_limit.retry_after(counts.previous, counts.current, now)
+            if self._phone_limit.enabled:
+                phone_retry_after = self._phone_limit.retry_after(
+                    self._previous.estimate(slots), self._current.estimate(slots), now,
+                )
+                retry_after = max(retry_after, phone_retry_after)
+
+            if not retry_after:
+                counts.current += 1
+                self._current.add(slots)
+
+            results.append(retry_after)
+
+        return results
+
+    def _client_counts(self, client: str, now: float) -> _Counts:
+        index = self._client_limit.index(now) if self._client_limit.enabled else 0
+
+        counts = self._clients.get(client)
+        if counts is None:
+            counts = _Counts(index)
+            if self._client_limit.enabled:
+                self._clients.set(client, counts, 2 * self._client_limit.window)
+        else:
+            counts.roll(index)
+
+        return counts
+
+    def _roll_sketches(self, now: float) -> None:
+        if not self._phone_limit.enabled:
+            return
+
+        index = self._phone_limit.index(now)
+        if index == self._sketch_index:
+            return
+
+        self._previous = self._current if index == self._sketch_index + 1 else _Sketch(self._sketch_width)
+        self._current = _Sketch(self._sketch_width)
+        self._sketch_index = index
+
+    def _slots(self, phone: str) -> Tuple[int, ...]:
+        digest = hashlib.blake2b(phone.encode(), digest_size=4 * SKETCH_DEPTH).digest()
+
+        return tuple(
+            int.from_bytes(digest[4 * row:4 * row + 4], "little") % self._sketch_width for row in range(SKETCH_DEPTH)
+        )
+
+
+class SqliteRateLimiter:
+    """
+    Rate limiter kept in a SQLite database, shared by all processes using the same file.
+
+    Phones and clients are counted exactly, rows of finished windows are deleted every
+    cleanup_interval acquisitions.
+    """
+
+    def __init__(self, path: str, phone_limit: RateLimit, client_limit: RateLimit, cleanup_interval: int = 1000):
+        self._phone_limit = phone_limit
+        self._client_limit = client_limit
+        self._cleanup_interval = cleanup_interval
+        self._acquisitions = 0
+
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, window INTEGER NOT NULL, previous INTEGER NOT NULL, current INTEGER NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._phone_limit.enabled or self._client_limit.enabled
+
+    async def acquire(self, client: str, phones: List[str]) -> List[float]:
+        return await asyncio.to_thread(self._acquire, client, phones)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _acquire(self, client: str, phones: List[str]) -> List[float]:
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+
+            results = [self._acquire_one(client, phone, now) for phone in phones]
+
+            self._acquisitions += 1
+            if self._acquisitions % self._cleanup_interval == 0:
+                self._cleanup(now)
+
+        return results
+
+    def _acquire_one(self, client: str, phone: str, now: float) -> float:
+        limits = [
+            (key, limit)
+            for key, limit in ((f"client:{client}", self._client_limit), (f"phone:{phone}", self._phone_limit))
+            if limit.enabled
+        ]
+
+        retry_after = 0.0
+        for key, limit in limits:
+            retry_after = max(retry_after, limit.retry_after(*self._counts(key, limit, now), now))
+
+        if not retry_after:
+            for key, limit in limits:
+                self._increment(key, limit.index(now))
+
+        return retry_after
+
+    def _counts(self, key: str, limit: RateLimit, now: float) -> Tuple[int, int]:
+        row: Optional[tuple] = self._connection.execute(
+            "SELECT window, previous, current FROM rate_limits WHERE key = ?", (key,),
+        ).fetchone()
+        if row is None:
+            return 0, 0
+
+        counts = _Counts(row[0])
+        counts.previous, counts.current = row[1], row[2]
+        counts.roll(limit.index(now))
+
+        return counts.previous, counts.current
+
+    def _increment(self, key: str, index: int) -> None:
+        self._connection.execute(
+            "INSERT INTO rate_limits (key, window, previous, current) VALUES (?, ?, 0, 1) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "previous = CASE WHEN window = excluded.window THEN previous "
+            "WHEN window = excluded.window - 1 THEN current ELSE 0 END, "
+            "current = CASE WHEN window = excluded.window THEN current + 1 ELSE 1 END, "
+            "window = excluded.window",
+            (key, index),
+        )
+
+    def _cleanup(self, now: float) -> None:
+        for prefix, limit in (("client:", self._client_limit), ("phone:", self._phone_limit)):
+            if limit.enabled:
+                self._connection.execute(
+                    "DELETE FROM rate_limits WHERE key >= ? AND key < ? AND window < ?",
+                    (prefix, prefix[:-1] + ";", limit.index(now) - 1),
+                )
@@ -0,0 +1,109 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from enum import Enum
+from typing import List, NamedTuple
+
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENSION = frozenset("\f^{}\\[~]|€")
+GSM7 = GSM7_BASIC | GSM7_EXTENSION
+
+GSM7_SINGLE_LIMIT = 160
+GSM7_SEGMENT_LIMIT = 153
+UCS2_SINGLE_LIMIT = 70
+UCS2_SEGMENT_LIMIT = 67
+
+
+class SmsEncoding(str, Enum):
+    gsm7 = "gsm7"
+    ucs2 = "ucs2"
+
+
+class SegmentInfo(NamedTuple):
+    encoding: SmsEncoding
+    units: int
+    segments: int
+
+
+def classify(content: str) -> SmsEncoding:
+    if GSM7.issuperset(content):
+        return SmsEncoding.gsm7
+
+    return SmsEncoding.ucs2
+
+
+def unit_length(content: str, encoding: SmsEncoding) -> int:
+    """
+    Returns the length of content in septets for GSM-7 or in UTF-16 code units for UCS-2.
+    """
+    if encoding is SmsEncoding.gsm7:
+        return len(content) + sum(content.count(character) for character in GSM7_EXTENSION)
+
+    return len(content.encode("utf-16-le")) // 2
+
+
+def analyze(content: str) -> SegmentInfo:
+    encoding = classify(content)
+    units = unit_length(content, encoding)
+
+    single_limit = GSM7_SINGLE_LIMIT if encoding is SmsEncoding.gsm7 else UCS2_SINGLE_LIMIT
+    if units <= single_limit:
+        return SegmentInfo(encoding, units, 1)
+
+    return SegmentInfo(encoding, units, len(split_segments(content, encoding)))
+
+
+def count_segments(content: str) -> int:
+    return analyze(content).segments
+
+
+def split_segments(content: str, encoding: SmsEncoding | None = None) -> List[str]:
+    """
+    Splits content into the parts of a concatenated SMS.
+
+    A GSM-7 extension character (escape plus septet) or a UCS-2 surrogate pair
+    is never split across two parts.
+    """
+    encoding = encoding or classify(content)
+
+    if encoding is SmsEncoding.gsm7:
+        single_limit, segment_limit = GSM7_SINGLE_LIMIT, GSM7_SEGMENT_LIMIT
+    else:
+        single_limit, segment_limit = UCS2_SINGLE_LIMIT, UCS2_SEGMENT_LIMIT
+
+    if unit_length(content, encoding) <= single_limit:
+        return [content]
+
+    segments = []
+    start = 0
+    units = 0
+    for position, character in enumerate(content):
+        if encoding is SmsEncoding.gsm7:
+            size = 2 if character in GSM7_EXTENSION else 1
+        else:
+            size = 2 if character > "\uffff" else 1
+
+        if units + size > segment_limit:
+            segments.append(content[start:position])
+            start = position
+            units = 0
+
+        units += size
+
+    segments.append(content[start:])
+
+    return segments
@@ -0,0 +1,83 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from enum import Enum
+from typing import Dict, Tuple
+
+from app.services.sms_encoding import count_segments
+
+
+class TransliterationMode(str, Enum):
+    off = "off"
+    punctuation = "punctuation"
+    cyrillic = "cyrillic"
+
+
+_PUNCTUATION: Dict[str, str] = {
+    "\u00a0": " ", "\u2000": " ", "\u2001": " ", "\u2002": " ", "\u2003": " ", "\u2004": " ",
+    "\u2005": " ", "\u2006": " ", "\u2007": " ", "\u2008": " ", "\u2009": " ", "\u200a": " ",
+    "\u202f": " ", "\u205f": " ", "\u3000": " ",
+    "\u200b": "", "\u200c": "", "\u200d": "", "\u2060": "", "\ufeff": "",
+    "\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u2032": "'", "\u00b4": "'", "`": "'",
+    "\u201c": '"', "\u201d": '"', "\u201e": '"', "\u201f": '"', "\u2033": '"', "\u00ab": '"', "\u00bb": '"',
+    "\u2039": "<", "\u203a": ">",
+    "\u2010": "-", "\u2011": "-", "\u2012": "-", "\u2013": "-", "\u2014": "-", "\u2015": "-", "\u2212": "-",
+    "\u2026": "...", "\u2022": "*", "\u00b7": ".", "\u2116": "No", "\u00a9": "(c)", "\u00ae": "(R)",
+    "\u2122": "TM", "\u00d7": "x", "\u2264": "<=", "\u2265": ">=", "\u2260": "!=", "\u2192": "->",
+    "\u2190": "<-", "\u00b0": "o", "\u00bd": "1/2", "\u00bc": "1/4", "\u00be": "3/4",
+}
+
+_CYRILLIC: Dict[str, str] = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y",
+    "ь": "", "э": "e", "ю": "yu", "я": "ya", "і": "i", "ї": "yi", "є": "ye", "ґ": "g", "ў": "u",
+}
+_CYRILLIC.update({key.upper(): value.capitalize() for key, value in _CYRILLIC.items()})
+
+_TABLES = {
+    TransliterationMode.punctuation: str.maketrans(_PUNCTUATION),
+    TransliterationMode.cyrillic: str.maketrans({**_PUNCTUATION, **_CYRILLIC}),
+}
+
+
+def transliterate(content: str, mode: TransliterationMode) -> str:
+    table = _TABLES.get(mode)
+    if table is None:
+        return content
+
+    return content.translate(table)
+
+
+def shorten(content: str, mode: TransliterationMode, segments: int) -> Tuple[str, int]:
+    """
+    Transliterates content if that lowers its segment count.
+
+    Parameters:
+        content (str): The content of the SMS.
+        mode (TransliterationMode): The characters to replace with GSM-7 equivalents.
+        segments (int): The segment count of the original content.
+
+    Returns:
+        Tuple[str, int]: The content to send and the number of segments saved.
+    """
+    transliterated = transliterate(content, mode)
+    if transliterated == content:
+        return content, 0
+
+    transliterated_segments = count_segments(transliterated)
+    if transliterated_segments >= segments:
+        return content, 0
+
+    return transliterated, segments - transliterated_segments
@@ -0,0 +1,76 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Dict, List, Optional
+
+from app.models.domain.inbox_message import InboxMessage
+from app.worker.modem import Modem
+
+INBOX = 1
+SENT_BOX = 2
+
+
+class BoxReader:
+    """
+    Reads the messages added to a modem message box since the previous read.
+
+    The reader remembers the highest message index it has seen per modem and pages through
+    the box newest first only until it reaches that index, so each read fetches just the new
+    messages. Messages already in the box at the first read are skipped.
+    """
+
+    def __init__(self, box_type: int, page_size: int):
+        self._box_type = box_type
+        self._page_size = page_size
+        self._last_index: Dict[str, int] = {}
+
+    async def read(self, modem: Modem) -> List[InboxMessage]:
+        """
+        Returns the messages added to the box of modem since the previous read, oldest first.
+        """
+        host = str(modem.host)
+        last_index = self._last_index.get(host)
+        if last_index is None:
+            await self._start_watermark(modem)
+            return []
+
+        messages: List[InboxMessage] = []
+        page_index = 1
+        while True:
+            page = await modem.sms.list_sms(page_index, self._page_size, self._box_type)
+            if page is None:
+                # Keep the watermark so the whole range is fetched again on the next read
+                return []
+
+            new = [message for message in page if message.index > last_index]
+            messages += new
+
+            if len(new) < len(page) or len(page) < self._page_size:
+                break
+
+            page_index += 1
+
+        if messages:
+            self._last_index[host] = max(message.index for message in messages)
+
+        messages.sort(key=lambda message: message.index)
+
+        return messages
+
+    async def _start_watermark(self, modem: Modem) -> None:
+        page: Optional[List[InboxMessage]] = await modem.sms.list_sms(1, 1, self._box_type)
+        if page is None:
+            return
+
+        self._last_index[str(modem.host)] = max((message.index for message in page), default=-1)
@@ -0,0 +1,65 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+from enum import Enum
+
+
+class CircuitState(str, Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed while the device works, open after failure_threshold consecutive failures.
+
+    An open circuit turns half-open once reset_timeout has passed, the next success
+    closes it again and the next failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+
+        self._state = CircuitState.closed
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.open and time.monotonic() - self._opened_at >= self._reset_timeout:
+            self._state = CircuitState.half_open
+
+        return self._state
+
+    def record_success(self) -> CircuitState:
+        previous = self._state
+
+        self._failures = 0
+        self._state = CircuitState.closed
+
+        return previous
+
+    def record_failure(self) -> CircuitState:
+        previous = self.state
+
+        self._failures += 1
+        if previous is CircuitState.half_open or self._failures >= self._failure_threshold:
+            self._state = CircuitState.open
+            self._opened_at = time.monotonic()
+
+        return previous
@@ -0,0 +1,61 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, List, Optional
+
+from app.models.domain.sms import SMS
+
+
+class DeadLetterStore:
+    """
+    Keeps the tasks that ran out of send attempts, oldest first, up to max_size entries.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._tasks: OrderedDict[str, SMS] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def add(self, task: SMS) -> Optional[SMS]:
+        """
+        Stores task and returns the oldest task if it had to be evicted to make room.
+        """
+        self._tasks[task.id] = task
+
+        if len(self._tasks) > self._max_size:
+            _, evicted = self._tasks.popitem(last=False)
+            return evicted
+
+        return None
+
+    def count(self, ids: Optional[Iterable[str]] = None) -> int:
+        if ids is None:
+            return len(self._tasks)
+
+        return sum(1 for task_id in set(ids) if task_id in self._tasks)
+
+    def list(self, offset: int = 0, limit: int = 100) -> List[SMS]:
+        return list(islice(self._tasks.values(), offset, offset + limit))
+
+    def pop(self, ids: Optional[Iterable[str]] = None) -> List[SMS]:
+        if ids is None:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            return tasks
+
+        return [task for task in (self._tasks.pop(task_id, None) for task_id in ids) if task is not None]
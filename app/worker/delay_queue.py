@@ -0,0 +1,66 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import heapq
+import itertools
+
+from typing import Callable, List, Tuple
+
+from app.models.domain.sms import SMS
+
+
+class DelayQueue:
+    """
+    Holds tasks until they are due and then hands them to release.
+
+    Pending tasks live in a single heap ordered by due time, driven by one timer,
+    so waiting tasks cost no coroutine or timer handle each.
+    """
+
+    def __init__(self, release: Callable[[SMS], None]):
+        self._release = release
+
+        self._heap: List[Tuple[float, int, SMS]] = []
+        self._counter = itertools.count()
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, due: float, task: SMS) -> None:
+        """
+        Schedules task for release at due, a time on the event loop clock.
+        """
+        heapq.heappush(self._heap, (due, next(self._counter), task))
+
+        if self._heap[0][2] is task:
+            self._changed.set()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, task = heapq.heappop(self._heap)
+                self._release(task)
+
+            self._changed.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
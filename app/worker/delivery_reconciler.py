@@ -0,0 +1,214 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import bisect
+import time
+
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from app.core import metrics
+from app.models.domain.inbox_message import SMS_TYPE_DELIVERED, SMSTAT_SEND_FAILED, InboxMessage
+from app.models.domain.sms import SMS, SmsStatus
+from app.worker.box_reader import SENT_BOX, BoxReader
+from app.worker.modem import Modem
+
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SentRecord(NamedTuple):
+    sent_at: float
+    task_id: str
+    attempts: int
+
+
+class SentIndex:
+    """
+    Sent tasks waiting for their outcome, by phone and send time.
+
+    A lookup only looks at the tasks sent to one phone, so matching stays cheap however many
+    tasks are tracked. Records are dropped retention seconds after the send, or oldest first
+    beyond max_size records.
+    """
+
+    def __init__(self, retention: float, max_size: int):
+        self._retention = retention
+        self._max_size = max_size
+
+        self._by_phone: Dict[str, List[SentRecord]] = {}
+        # Records in send order for expiry, matched records are skipped when they reach the front
+        self._order: Deque[Tuple[str, SentRecord]] = deque()
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._by_phone.values())
+
+    def add(self, phone: str, task_id: str, attempts: int, sent_at: Optional[float] = None) -> None:
+        record = SentRecord(time.time() if sent_at is None else sent_at, task_id, attempts)
+
+        self._by_phone.setdefault(phone, []).append(record)
+        self._order.append((phone, record))
+
+        self._expire(record.sent_at - self._retention)
+
+    def pop_nearest(self, phone: str, at: float, window: float) -> Optional[SentRecord]:
+        """
+        Removes and returns the record of phone sent closest to at, no further than window seconds away.
+        """
+        records = self._by_phone.get(phone)
+        if not records:
+            return None
+
+        # The closest records are the last one sent before at and the first one sent after
+        position = bisect.bisect_left(records, at, key=lambda record: record.sent_at)
+        candidates = [
+            index for index in (position - 1, position)
+            if 0 <= index < len(records) and abs(records[index].sent_at - at) <= window
+        ]
+        if not candidates:
+            return None
+
+        return self._pop(phone, min(candidates, key=lambda index: abs(records[index].sent_at - at)))
+
+    def pop_oldest(self, phone: str, before: float) -> Optional[SentRecord]:
+        """
+        Removes and returns the oldest record of phone sent before the given time.
+        """
+        records = self._by_phone.get(phone)
+        if not records or records[0].sent_at > before:
+            return None
+
+        return self._pop(phone, 0)
+
+    def _pop(self, phone: str, index: int) -> SentRecord:
+        records = self._by_phone[phone]
+        record = records.pop(index)
+        if not records:
+            del self._by_phone[phone]
+
+        return record
+
+    def _expire(self, horizon: float) -> None:
+        while self._order and (self._order[0][1].sent_at <= horizon or len(self._order) > self._max_size):
+            phone, record = self._order.popleft()
+
+            records = self._by_phone.get(phone)
+            if records and records[0] is record:
+                self._pop(phone, 0)
+
+
+class DeliveryReconciler:
+    """
+    Confirms the outcome of sent tasks from the modem sent box and delivery reports.
+
+    An OK from send-sms only means the modem accepted the message. The reconciler reads the
+    sent box of every modem incrementally and takes the delivery reports found by the inbox
+    poller, matches them to the tracked tasks by phone and time, and hands the outcomes to
+    update in bulk. A report can arrive before the send is confirmed and the task tracked, such
+    reports are matched again on the next cycles, up to max_pending of them.
+    """
+
+    def __init__(self, modems: List[Modem], interval: float, page_size: int, match_window: float, index: SentIndex,
+                 update: Callable[[List[SentRecord], SmsStatus], None], max_pending: int = 1000):
+        self._modems = modems
+        self._interval = interval
+        self._match_window = match_window
+        self._index = index
+        self._update = update
+
+        self._sent_box = BoxReader(SENT_BOX, page_size)
+        self._pending: Deque[Tuple[float, InboxMessage]] = deque(maxlen=max_pending)
+
+    def track(self, task: SMS) -> None:
+        self._index.add(task.phone, task.id, task.attempts)
+
+    async def run(self) -> None:
+        while True:
+            for modem in self._modems:
+                if not modem.healthy:
+                    continue
+
+                await self.sync(modem)
+
+            self._match_reports([])
+
+            await asyncio.sleep(self._interval)
+
+    async def sync(self, modem: Modem) -> None:
+        """
+        Marks the tracked tasks the sent box of modem reports as failed.
+        """
+        failed = []
+        for message in await self._sent_box.read(modem):
+            if message.status != SMSTAT_SEND_FAILED:
+                continue
+
+            at = _timestamp(message)
+            record = None if at is None else self._index.pop_nearest(message.phone, at, self._match_window)
+            if record is not None:
+                failed.append(record)
+
+        self._resolve(failed, SmsStatus.failed)
+
+    def reports(self, messages: List[InboxMessage]) -> None:
+        """
+        Marks the tracked tasks matching delivery reports as delivered or failed.
+        """
+        reports = []
+        for message in messages:
+            at = _timestamp(message)
+            if at is not None:
+                reports.append((at, message))
+
+        self._match_reports(reports)
+
+    def _match_reports(self, reports: List[Tuple[float, InboxMessage]]) -> None:
+        pending = list(self._pending) + reports
+        self._pending.clear()
+
+        delivered, failed = [], []
+        for at, message in pending:
+            # A report arrives after the send, the oldest unconfirmed send to the phone is the one it reports
+            record = self._index.pop_oldest(message.phone, at + self._match_window)
+            if record is None:
+                self._pending.append((at, message))
+                continue
+
+            if message.sms_type == SMS_TYPE_DELIVERED:
+                delivered.append(record)
+            else:
+                failed.append(record)
+
+        self._resolve(delivered, SmsStatus.delivered)
+        self._resolve(failed, SmsStatus.failed)
+
+    def _resolve(self, records: List[SentRecord], status: SmsStatus) -> None:
+        if not records:
+            return
+
+        logger.info(f"{len(records)} sent tasks confirmed as {status.value}")
+        metrics.SMS_DELIVERY.labels(status.value).inc(len(records))
+
+        self._update(records, status)
+
+
+def _timestamp(message: InboxMessage) -> Optional[float]:
+    try:
+        # The modem reports local time
+        return time.mktime(time.strptime(message.date, _DATE_FORMAT))
+    except ValueError:
+        logger.warning(f"Invalid date {message.date!r} of message {message.index} on {message.modem}")
+        return None
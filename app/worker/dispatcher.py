@@ -0,0 +1,98 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from typing import List, Optional
+
+from app.worker.circuit_breaker import CircuitState
+from app.worker.modem import Modem
+
+
+class Dispatcher:
+    """
+    Routes tasks to the healthy modem with the least outstanding work.
+
+    A background monitor probes every modem and feeds failed probes into its circuit breaker,
+    so the API can tell whether any modem is usable without touching the devices.
+    """
+
+    def __init__(self, modems: List[Modem], lane_depth: int, health_interval: float):
+        self._modems = modems
+        self._lane_depth = lane_depth
+        self._health_interval = health_interval
+
+        self._changed = asyncio.Condition()
+
+    @property
+    def modems(self) -> List[Modem]:
+        return self._modems
+
+    @property
+    def available(self) -> bool:
+        return any(modem.healthy for modem in self._modems)
+
+    async def acquire(self) -> Modem:
+        async with self._changed:
+            while True:
+                modem = self._select()
+                if modem is not None:
+                    modem.outstanding += 1
+                    modem.dispatched += 1
+                    return modem
+
+                await self._changed.wait()
+
+    async def release(self, modem: Modem, success: Optional[bool]) -> None:
+        """
+        Returns the slot taken by acquire, success is None if nothing was sent through it.
+        """
+        if success:
+            modem.record_success()
+        elif success is not None:
+            modem.record_failure()
+
+        async with self._changed:
+            modem.outstanding -= 1
+            self._changed.notify_all()
+
+    async def monitor(self) -> None:
+        while True:
+            await asyncio.gather(*(modem.probe() for modem in self._modems))
+
+            async with self._changed:
+                self._changed.notify_all()
+
+            await asyncio.sleep(self._health_interval)
+
+    def _select(self) -> Modem | None:
+        candidates = [
+            modem for modem in self._modems
+            if modem.outstanding < self._limit(modem)
+        ]
+        if not candidates:
+            return None
+
+        return min(candidates, key=lambda modem: (modem.outstanding, modem.dispatched))
+
+    def _limit(self, modem: Modem) -> int:
+        state = modem.breaker.state
+        if state is CircuitState.open:
+            return 0
+
+        # A half-open modem gets a single trial send
+        if state is CircuitState.half_open:
+            return 1
+
+        return self._lane_depth
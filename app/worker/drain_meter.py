@@ -0,0 +1,60 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+import time
+
+from typing import Optional
+
+
+class DrainMeter:
+    """
+    Estimates how many tasks per second leave the queue.
+
+    Completions are counted with exponential decay over the given window, so the rate follows
+    changes in modem capacity and falls towards zero while nothing is sent. Until a whole window
+    has passed since the first completion, the count is normalised by the time actually observed.
+    """
+
+    def __init__(self, window: float):
+        self._window = window
+
+        self._count = 0.0
+        self._started_at: Optional[float] = None
+        self._updated_at = 0.0
+
+    def record(self, count: int = 1) -> None:
+        now = time.monotonic()
+        if self._started_at is None:
+            self._started_at = self._updated_at = now
+
+        self._decay(now)
+        self._count += count
+
+    def rate(self) -> float:
+        if self._started_at is None:
+            return 0.0
+
+        now = time.monotonic()
+        self._decay(now)
+
+        observed = self._window * -math.expm1((self._started_at - now) / self._window)
+        if observed <= 0:
+            return 0.0
+
+        return self._count / observed
+
+    def _decay(self, now: float) -> None:
+        self._count *= math.exp((self._updated_at - now) / self._window)
+        self._updated_at = now
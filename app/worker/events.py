@@ -24,7 +24,7 @@ from app.core.settings.app import AppSettings
 async def worker_start(app: FastAPI, settings: AppSettings) -> Worker:
     logger.info("Starting worker")
 
-    worker = Worker(settings.hilink)
+    worker = Worker(settings)
 
     asyncio.create_task(worker.loop())
 
@@ -0,0 +1,117 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Set
+
+from loguru import logger
+
+from app.models.domain.inbox_message import InboxMessage
+from app.worker.box_reader import INBOX, BoxReader
+from app.worker.modem import Modem
+
+
+class InboxPoller:
+    """
+    Reads new messages from every modem inbox and pushes them to the subscribers.
+
+    Each cycle fetches just the messages that arrived since the previous one, messages already
+    on the modem at start are not pushed. Delivery reports go to the reports callback instead of
+    the subscribers. Messages that reached a subscriber or were forwarded to the other processes
+    can be deleted from the modem in batches.
+    """
+
+    def __init__(self, modems: List[Modem], interval: float, page_size: int, delete_processed: bool,
+                 subscriber_buffer: int, forward: Optional[Callable[[List[InboxMessage]], None]] = None,
+                 reports: Optional[Callable[[List[InboxMessage]], None]] = None):
+        self._modems = modems
+        self._forward = forward
+        self._reports = reports
+        self._interval = interval
+        self._delete_processed = delete_processed
+        self._subscriber_buffer = subscriber_buffer
+
+        self._reader = BoxReader(INBOX, page_size)
+        self._subscribers: Set[asyncio.Queue[InboxMessage]] = set()
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue[InboxMessage]]:
+        queue: asyncio.Queue[InboxMessage] = asyncio.Queue(maxsize=self._subscriber_buffer)
+        self._subscribers.add(queue)
+
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    async def run(self) -> None:
+        while True:
+            for modem in self._modems:
+                if not modem.healthy:
+                    continue
+
+                await self._process(modem)
+
+            await asyncio.sleep(self._interval)
+
+    async def _process(self, modem: Modem) -> None:
+        received = await self.poll(modem)
+        if not received:
+            return
+
+        messages = received
+        if self._reports is not None:
+            messages = [message for message in received if not message.is_delivery_report]
+            if len(messages) < len(received):
+                self._reports([message for message in received if message.is_delivery_report])
+
+        delivered = self.publish(messages) or not messages
+        if messages and self._forward is not None:
+            self._forward(messages)
+            delivered = True
+
+        if not delivered:
+            logger.warning(f"No subscribers for {len(messages)} messages on {modem.host}, keeping them on the modem")
+            return
+
+        if self._delete_processed:
+            await modem.sms.delete_sms_many([message.index for message in received])
+
+    async def poll(self, modem: Modem) -> List[InboxMessage]:
+        """
+        Returns the messages that arrived on modem since the previous poll, oldest first.
+        """
+        messages = await self._reader.read(modem)
+        if messages:
+            logger.info(f"Received {len(messages)} messages on {modem.host}")
+
+        return messages
+
+    def publish(self, messages: List[InboxMessage]) -> bool:
+        """
+        Pushes messages to every subscriber, dropping the oldest buffered messages of slow ones.
+
+        Returns:
+            bool: True if there was a subscriber to receive the messages.
+        """
+        for message in messages:
+            for queue in self._subscribers:
+                if queue.full():
+                    queue.get_nowait()
+
+                queue.put_nowait(message)
+
+        return bool(self._subscribers)
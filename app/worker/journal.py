@@ -0,0 +1,455 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from app.models.domain.inbox_message import InboxMessage
+from app.models.domain.sms import SMS, SmsStatus
+from app.worker.status_store import StatusEntry
+
+TASKS = "tasks"
+DEAD_LETTERS = "dead_letters"
+STATUSES = "statuses"
+INBOX = "inbox"
+REPLAYS = "replays"
+META = "meta"
+
+DRAIN_RATE = "drain_rate"
+AVAILABLE = "available"
+
+# Seconds to wait before retrying a failed commit
+RETRY_DELAY = 1.0
+
+
+class JournalStats(NamedTuple):
+    lanes: Dict[str, int]
+    clients: Dict[str, int]
+    drain_rate: float
+    available: bool
+
+
+class SqliteJournal:
+    """
+    Persists queued and dead-lettered tasks in a SQLite database running in WAL mode.
+
+    Writes are buffered in memory and committed together every commit interval,
+    so enqueueing never waits for the disk and a single fsync covers the whole batch.
+    Only the latest write for each task is kept in the buffer. A batch that fails to commit
+    goes back into the buffer and is retried.
+
+    Every row remembers the origin of the journal that inserted it. poll() returns the rows
+    inserted under other origins, which lets several processes share one database: the
+    dispatching process picks up tasks enqueued by the others without reading its own back.
+    Task statuses, received messages and dead letter replay requests are shared the same way.
+    """
+
+    def __init__(self, path: str, commit_interval: float):
+        self._commit_interval = commit_interval
+
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        for table in (TASKS, DEAD_LETTERS):
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "id TEXT NOT NULL UNIQUE, "
+                "payload TEXT NOT NULL, "
+                "origin TEXT NOT NULL DEFAULT '')"
+            )
+
+            columns = [row[1] for row in self._connection.execute(f"PRAGMA table_info({table})")]
+            if "origin" not in columns:
+                self._connection.execute(f"ALTER TABLE {table} ADD COLUMN origin TEXT NOT NULL DEFAULT ''")
+
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATUSES} ("
+            "id TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "expires_at REAL NOT NULL)"
+        )
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS {STATUSES}_updated_at ON {STATUSES} (updated_at)")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {INBOX} (seq INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {REPLAYS} (seq INTEGER PRIMARY KEY AUTOINCREMENT, ids TEXT)"
+        )
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {META} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        # Reads run in worker threads while commits may be in progress, so they use their own connection
+        self._reader = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._reader_lock = threading.Lock()
+
+        self._origin = uuid4().hex
+        self._polled_seq = 0
+        self._inbox_seq = 0
+        self._replay_seq = 0
+        self._replay_handled = False
+
+        self._writes: Dict[Tuple[str, str], Optional[Tuple[str, str]]] = {}
+        self._statuses: Dict[str, StatusEntry] = {}
+        self._inbox: List[str] = []
+        self._replays: List[Optional[str]] = []
+        self._meta: Dict[str, str] = {}
+        self._trim: Optional[Tuple[int, int]] = None
+        self._committing: Optional["_Batch"] = None
+
+        self._pending = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    def record(self, task: SMS) -> None:
+        self._write(TASKS, task.id, task.model_dump_json())
+
+    def ack(self, task: SMS) -> None:
+        self._write(TASKS, task.id, None)
+
+    def bury(self, task: SMS) -> None:
+        self._write(TASKS, task.id, None)
+        self._write(DEAD_LETTERS, task.id, task.model_dump_json())
+
+    def unbury(self, task: SMS) -> None:
+        self._write(DEAD_LETTERS, task.id, None)
+
+    def claim(self) -> None:
+        """
+        Starts a new origin, rows written so far become visible to poll().
+        """
+        self._origin = uuid4().hex
+
+    def set_status(self, task_id: str, status: SmsStatus, attempts: int, ttl: float) -> None:
+        now = time.time()
+
+        self._statuses[task_id] = StatusEntry(status, attempts, now, now + ttl)
+        self._pending.set()
+
+    def forward_inbox(self, messages: List[InboxMessage]) -> None:
+        self._inbox += [message.model_dump_json() for message in messages]
+        self._pending.set()
+
+    def request_replay(self, ids: Optional[List[str]]) -> None:
+        self._replays.append(None if ids is None else json.dumps(ids))
+        self._pending.set()
+
+    def publish(self, stats: Dict[str, float]) -> None:
+        """
+        Stores dispatcher state for processes reading the journal with stats().
+
+        Parameters:
+            stats (Dict[str, float]): The values by key.
+
+        Returns:
+            None.
+        """
+        self._meta.update({key: json.dumps(value) for key, value in stats.items()})
+        self._pending.set()
+
+    def trim(self, max_statuses: int, max_inbox: int) -> None:
+        """
+        Drops expired statuses and keeps the status and inbox tables within the given sizes.
+        """
+        self._trim = (max_statuses, max_inbox)
+        self._pending.set()
+
+    async def poll(self) -> List[SMS]:
+        """
+        Retrieves the tasks inserted under other origins since the previous poll.
+
+        Returns:
+            List[SMS]: The tasks in insertion order, all queued tasks on the first call.
+        """
+        rows = await asyncio.to_thread(
+            self._read,
+            f"SELECT seq, payload FROM {TASKS} WHERE seq > ? AND origin != ? ORDER BY seq",
+            (self._polled_seq, self._origin),
+        )
+        if not rows:
+            return []
+
+        self._polled_seq = rows[-1][0]
+
+        return [SMS.model_validate_json(payload) for _, payload in rows]
+
+    async def poll_inbox(self) -> List[InboxMessage]:
+        """
+        Retrieves the messages forwarded by the dispatching process since the previous call.
+        """
+        rows = await asyncio.to_thread(
+            self._read, f"SELECT seq, payload FROM {INBOX} WHERE seq > ? ORDER BY seq", (self._inbox_seq,),
+        )
+        if not rows:
+            return []
+
+        self._inbox_seq = rows[-1][0]
+
+        return [InboxMessage.model_validate_json(payload) for _, payload in rows]
+
+    async def skip_inbox(self) -> None:
+        """
+        Moves past the messages forwarded so far, so poll_inbox() only returns new ones.
+        """
+        rows = await asyncio.to_thread(self._read, f"SELECT COALESCE(MAX(seq), 0) FROM {INBOX}", ())
+
+        self._inbox_seq = rows[0][0]
+
+    async def poll_replays(self) -> List[Optional[List[str]]]:
+        """
+        Retrieves the dead letter replay requests made since the previous call, None replays all.
+        """
+        rows = await asyncio.to_thread(
+            self._read, f"SELECT seq, ids FROM {REPLAYS} WHERE seq > ? ORDER BY seq", (self._replay_seq,),
+        )
+        if not rows:
+            return []
+
+        self._replay_seq = rows[-1][0]
+        self._replay_handled = True
+        self._pending.set()
+
+        return [None if ids is None else json.loads(ids) for _, ids in rows]
+
+    async def status(self, task_id: str) -> Optional[StatusEntry]:
+        return (await self.statuses([task_id])).get(task_id)
+
+    async def statuses(self, task_ids: List[str]) -> Dict[str, StatusEntry]:
+        """
+        Looks up the latest status of tasks, including statuses not committed yet.
+
+        Returns:
+            Dict[str, StatusEntry]: The statuses by task id, expired and unknown tasks are left out.
+        """
+        entries: Dict[str, StatusEntry] = {}
+        # The pending buffer is newer than the batch being committed
+        for buffer in (self._committing.statuses if self._committing is not None else {}, self._statuses):
+            entries.update((task_id, buffer[task_id]) for task_id in task_ids if task_id in buffer)
+
+        missing = [task_id for task_id in task_ids if task_id not in entries]
+        if missing:
+            rows = await asyncio.to_thread(
+                self._read,
+                f"SELECT id, status, attempts, updated_at, expires_at FROM {STATUSES} "
+                f"WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(missing),),
+            )
+            entries.update((task_id, StatusEntry(SmsStatus(status), *values)) for task_id, status, *values in rows)
+
+        now = time.time()
+
+        return {task_id: entry for task_id, entry in entries.items() if entry.expires_at > now}
+
+    async def replay_dead_letters(self) -> List[SMS]:
+        return await self.dead_letters(0, -1)
+
+    async def dead_letters(self, offset: int, limit: int) -> List[SMS]:
+        rows = await asyncio.to_thread(
+            self._read, f"SELECT payload FROM {DEAD_LETTERS} ORDER BY seq LIMIT ? OFFSET ?", (limit, offset),
+        )
+
+        return [SMS.model_validate_json(payload) for payload, in rows]
+
+    async def dead_letter_count(self, ids: Optional[List[str]] = None) -> int:
+        if ids is None:
+            rows = await asyncio.to_thread(self._read, f"SELECT COUNT(*) FROM {DEAD_LETTERS}", ())
+        else:
+            rows = await asyncio.to_thread(
+                self._read,
+                f"SELECT COUNT(*) FROM {DEAD_LETTERS} WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(ids),),
+            )
+
+        return rows[0][0]
+
+    async def stats(self) -> JournalStats:
+        """
+        Counts the queued tasks and reads the state published by the dispatching process.
+
+        Returns:
+            JournalStats: The queued tasks by priority and by client, the drain rate and availability.
+        """
+        return await asyncio.to_thread(self._select_stats)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        self._closing = True
+        self._pending.set()
+
+        if self._task is not None:
+            await self._task
+        else:
+            await self._flush()
+
+        self._connection.close()
+        self._reader.close()
+
+    def _write(self, table: str, key: str, payload: Optional[str]) -> None:
+        self._writes[(table, key)] = None if payload is None else (payload, self._origin)
+        self._pending.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._pending.wait()
+            if not self._closing:
+                await asyncio.sleep(self._commit_interval)
+
+            committed = await self._flush()
+
+            if self._closing:
+                return
+
+            if not committed:
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def _flush(self) -> bool:
+        self._pending.clear()
+
+        batch = _Batch(
+            writes=self._writes,
+            statuses=self._statuses,
+            inbox=self._inbox,
+            replays=self._replays,
+            replayed_seq=self._replay_seq if self._replay_handled else 0,
+            meta=self._meta,
+            trim=self._trim,
+        )
+        self._writes, self._statuses, self._inbox, self._replays, self._meta, self._trim = {}, {}, [], [], {}, None
+        self._replay_handled = False
+
+        if batch.empty:
+            return True
+
+        # Statuses stay readable while the batch is being written
+        self._committing = batch
+        try:
+            await asyncio.to_thread(self._commit, batch)
+        except sqlite3.Error as err:
+            logger.error(f"Failed to commit journal batch: {err}")
+            self._restore(batch)
+            return False
+        finally:
+            self._committing = None
+
+        return True
+
+    def _restore(self, batch: "_Batch") -> None:
+        # Writes buffered during the failed commit are newer and take precedence
+        batch.writes.update(self._writes)
+        batch.statuses.update(self._statuses)
+        batch.meta.update(self._meta)
+
+        self._writes, self._statuses, self._meta = batch.writes, batch.statuses, batch.meta
+        self._inbox = batch.inbox + self._inbox
+        self._replays = batch.replays + self._replays
+        self._replay_handled = self._replay_handled or bool(batch.replayed_seq)
+        self._trim = self._trim or batch.trim
+
+        self._pending.set()
+
+    def _read(self, query: str, parameters: tuple) -> List[tuple]:
+        with self._reader_lock:
+            return self._reader.execute(query, parameters).fetchall()
+
+    def _select_stats(self) -> JournalStats:
+        lanes: Dict[str, int] = {}
+        clients: Dict[str, int] = {}
+
+        with self._reader_lock, self._reader:
+            self._reader.execute("BEGIN")
+
+            rows = self._reader.execute(
+                f"SELECT json_extract(payload, '$.priority'), json_extract(payload, '$.client'), COUNT(*) "
+                f"FROM {TASKS} GROUP BY 1, 2"
+            ).fetchall()
+            meta = dict(self._reader.execute(f"SELECT key, value FROM {META}").fetchall())
+
+        for priority, client, count in rows:
+            lanes[priority] = lanes.get(priority, 0) + count
+            clients[client or ""] = clients.get(client or "", 0) + count
+
+        return JournalStats(
+            lanes=lanes,
+            clients=clients,
+            drain_rate=json.loads(meta.get(DRAIN_RATE, "0")),
+            available=json.loads(meta.get(AVAILABLE, "true")),
+        )
+
+    def _commit(self, batch: "_Batch") -> None:
+        with self._connection:
+            # Take the write lock up front, other processes may be writing to the same database
+            self._connection.execute("BEGIN IMMEDIATE")
+            for table in (TASKS, DEAD_LETTERS):
+                self._connection.executemany(
+                    f"DELETE FROM {table} WHERE id = ?",
+                    [(key,) for (name, key), row in batch.writes.items() if name == table and row is None],
+                )
+                self._connection.executemany(
+                    f"INSERT INTO {table} (id, payload, origin) VALUES (?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET payload = excluded.payload",
+                    [(key, *row) for (name, key), row in batch.writes.items() if name == table and row is not None],
+                )
+
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {STATUSES} (id, status, attempts, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                [(task_id, entry.status.value, *entry[1:]) for task_id, entry in batch.statuses.items()],
+            )
+            self._connection.executemany(f"INSERT INTO {INBOX} (payload) VALUES (?)", [(row,) for row in batch.inbox])
+            self._connection.executemany(f"INSERT INTO {REPLAYS} (ids) VALUES (?)", [(row,) for row in batch.replays])
+            if batch.replayed_seq:
+                self._connection.execute(f"DELETE FROM {REPLAYS} WHERE seq <= ?", (batch.replayed_seq,))
+            self._connection.executemany(
+                f"INSERT INTO {META} (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                list(batch.meta.items()),
+            )
+
+            if batch.trim is not None:
+                max_statuses, max_inbox = batch.trim
+                self._connection.execute(f"DELETE FROM {STATUSES} WHERE expires_at <= ?", (time.time(),))
+                self._connection.execute(
+                    f"DELETE FROM {STATUSES} WHERE id IN "
+                    f"(SELECT id FROM {STATUSES} ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (max_statuses,),
+                )
+                self._connection.execute(
+                    f"DELETE FROM {INBOX} WHERE seq <= (SELECT MAX(seq) FROM {INBOX}) - ?", (max_inbox,),
+                )
+
+
+class _Batch(NamedTuple):
+    writes: Dict[Tuple[str, str], Optional[Tuple[str, str]]]
+    statuses: Dict[str, StatusEntry]
+    inbox: List[str]
+    replays: List[Optional[str]]
+    replayed_seq: int
+    meta: Dict[str, str]
+    trim: Optional[Tuple[int, int]]
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            self.writes or self.statuses or self.inbox or self.replays or self.replayed_seq or self.meta or self.trim
+        )
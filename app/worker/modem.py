@@ -0,0 +1,70 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from typing import List
+
+from loguru import logger
+from pydantic import HttpUrl
+
+from app.models.domain.sms import SMS
+from app.services.async_sms_service import AsyncSmsService
+from app.worker.circuit_breaker import CircuitBreaker, CircuitState
+from app.worker.segment_budget import SegmentBudget
+
+
+class Modem:
+    """
+    A single HiLink device together with its sender lane, circuit breaker and segment budget.
+    """
+
+    def __init__(self, host: HttpUrl, sms: AsyncSmsService, breaker: CircuitBreaker, budget: SegmentBudget):
+        self.host = host
+        self.sms = sms
+        self.budget = budget
+        self.lane: asyncio.Queue[List[SMS]] = asyncio.Queue()
+
+        self.outstanding = 0
+        self.dispatched = 0
+
+        self.breaker = breaker
+        self.reachable = True
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state is not CircuitState.open
+
+    def record_success(self) -> None:
+        if self.breaker.record_success() is not CircuitState.closed:
+            logger.info(f"Modem {self.host} is back in rotation")
+
+    def record_failure(self) -> None:
+        previous = self.breaker.record_failure()
+        if previous is not CircuitState.open and self.breaker.state is CircuitState.open:
+            logger.warning(f"Modem {self.host} taken out of rotation")
+
+    async def probe(self) -> bool:
+        """
+        Checks that the device answers.
+
+        A failed probe counts against the breaker, a successful one does not close it: an open breaker
+        still waits out its reset timeout and only a successful send brings the modem back.
+        """
+        self.reachable = await self.sms.is_hilink()
+
+        if not self.reachable:
+            self.record_failure()
+
+        return self.reachable
@@ -0,0 +1,50 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import time
+
+
+class SegmentBudget:
+    """
+    Token bucket limiting how many SMS segments a modem sends per minute.
+
+    A send may take the bucket below zero, the next send then waits until the debt is paid,
+    so long messages are paced by the airtime they actually use. A rate of zero disables the limit.
+    """
+
+    def __init__(self, segments_per_minute: int):
+        self._rate = segments_per_minute / 60
+        self._capacity = max(self._rate, 1.0)
+
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+
+    async def acquire(self, segments: int) -> None:
+        if not self._rate:
+            return
+
+        self._refill()
+
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self._rate)
+            self._refill()
+
+        self._tokens -= segments
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+
+        self._tokens = min(self._tokens + (now - self._updated_at) * self._rate, self._capacity)
+        self._updated_at = now
@@ -0,0 +1,48 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+from typing import NamedTuple, Optional
+
+from app.models.domain.sms import SmsStatus
+from app.services.ttl_cache import TtlCache
+
+
+class StatusEntry(NamedTuple):
+    status: SmsStatus
+    attempts: int
+    updated_at: float
+    expires_at: float
+
+
+class StatusStore:
+    """
+    Keeps the latest status of each task for ttl seconds after its last update, at most max_size tasks.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._ttl = ttl
+        self._entries: TtlCache[str, StatusEntry] = TtlCache(max_size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, task_id: str) -> Optional[StatusEntry]:
+        return self._entries.get(task_id)
+
+    def set(self, task_id: str, status: SmsStatus, attempts: int = 0) -> None:
+        now = time.time()
+
+        self._entries.set(task_id, StatusEntry(status, attempts, now, now + self._ttl), self._ttl)
@@ -0,0 +1,41 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+
+async def supervise(name: str, run: Callable[[], Awaitable[None]], restart_delay: float = 1.0) -> None:
+    """
+    Runs a background loop and restarts it whenever it fails.
+
+    The loops of the worker run as tasks nobody awaits, so an unhandled error would stop them silently.
+
+    Parameters:
+        name (str): The name of the loop, for the log.
+        run (Callable[[], Awaitable[None]]): Starts the loop.
+        restart_delay (float): Seconds to wait before restarting a failed loop.
+    """
+    while True:
+        try:
+            await run()
+        except Exception:
+            logger.exception(f"{name} failed, restarting in {restart_delay} s")
+        else:
+            return
+
+        await asyncio.sleep(restart_delay)
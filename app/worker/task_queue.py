@@ -0,0 +1,178 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from collections import deque
+from typing import Deque, Dict, List, Set
+
+from app.models.domain.sms import SMS, SmsPriority
+
+
+class _Entry:
+    __slots__ = ("task", "taken")
+
+    def __init__(self, task: SMS):
+        self.task = task
+        self.taken = False
+
+
+class _Lane:
+    """
+    FIFO queue of tasks with an index by message content.
+    """
+
+    def __init__(self, weight: int):
+        self.weight = weight
+        self.current_weight = 0
+        self.size = 0
+
+        self._entries: Deque[_Entry] = deque()
+        self._by_message: Dict[str, Deque[_Entry]] = {}
+
+    def put(self, task: SMS) -> None:
+        entry = _Entry(task)
+
+        self._entries.append(entry)
+        self._by_message.setdefault(task.message, deque()).append(entry)
+
+        self.size += 1
+
+    def pop(self) -> SMS:
+        entry = self._entries.popleft()
+        while entry.taken:
+            entry = self._entries.popleft()
+
+        self._take(self._by_message[entry.task.message])
+
+        return entry.task
+
+    def take_matching(self, message: str, phones: Set[str], limit: int) -> List[SMS]:
+        """
+        Removes up to limit of the oldest tasks with message, skipping recipients already in phones.
+
+        The recipients of the removed tasks are added to phones. Skipped tasks keep their place in the queue.
+        """
+        entries = self._by_message.get(message)
+        if not entries:
+            return []
+
+        tasks = []
+        skipped = []
+        while entries and len(tasks) < limit:
+            entry = entries.popleft()
+            if entry.task.phone in phones:
+                skipped.append(entry)
+                continue
+
+            entry.taken = True
+            self.size -= 1
+            phones.add(entry.task.phone)
+            tasks.append(entry.task)
+
+        entries.extendleft(reversed(skipped))
+        if not entries:
+            del self._by_message[message]
+
+        return tasks
+
+    def _take(self, entries: Deque[_Entry]) -> _Entry:
+        entry = entries.popleft()
+        entry.taken = True
+
+        if not entries:
+            del self._by_message[entry.task.message]
+
+        self.size -= 1
+
+        return entry
+
+
+class TaskQueue:
+    """
+    Priority queue of tasks split into one FIFO lane per priority.
+
+    Urgent tasks are always served first, the remaining lanes share the modems by weight
+    (smooth weighted round-robin). Each lane indexes its tasks by message content, so the
+    worker can pull every queued task sharing a message into a single multi-recipient send
+    without scanning the queue.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self._urgent = _Lane(weight=0)
+        self._lanes: Dict[SmsPriority, _Lane] = {SmsPriority.urgent: self._urgent}
+        for priority in SmsPriority:
+            if priority is not SmsPriority.urgent:
+                self._lanes[priority] = _Lane(weight=max(weights.get(priority.value, 1), 1))
+
+        self._weighted = [lane for lane in self._lanes.values() if lane is not self._urgent]
+
+        self._size = 0
+        self._ready = asyncio.Event()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def lane_sizes(self) -> Dict[SmsPriority, int]:
+        return {priority: lane.size for priority, lane in self._lanes.items()}
+
+    def put_nowait(self, task: SMS) -> None:
+        self._lanes[task.priority].put(task)
+
+        self._size += 1
+        self._ready.set()
+
+    async def put(self, task: SMS) -> None:
+        self.put_nowait(task)
+
+    async def get(self) -> SMS:
+        while not self._size:
+            self._ready.clear()
+            await self._ready.wait()
+
+        self._size -= 1
+
+        return self._select().pop()
+
+    def take_matching(self, task: SMS, limit: int) -> List[SMS]:
+        """
+        Removes up to limit of the oldest queued tasks with the same priority and message as task.
+
+        Each recipient appears at most once in task and the returned tasks, as the modem reports
+        the send status by phone number.
+        """
+        tasks = self._lanes[task.priority].take_matching(task.message, {task.phone}, limit)
+        self._size -= len(tasks)
+
+        return tasks
+
+    def _select(self) -> _Lane:
+        if self._urgent.size:
+            return self._urgent
+
+        total = 0
+        selected = None
+        for lane in self._weighted:
+            if not lane.size:
+                continue
+
+            lane.current_weight += lane.weight
+            total += lane.weight
+
+            if selected is None or lane.current_weight > selected.current_weight:
+                selected = lane
+
+        selected.current_weight -= total
+
+        return selected
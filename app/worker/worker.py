@@ -1,4 +1,4 @@
-#  Copyright 2023 Pavel Suprunov
+#  Copyright 2022 Pavel Suprunov
 #
 #  Licensed under the Apache License, Version 2.0 (the "License");
 #  you may not use this file except in compliance with the License.
@@ -13,48 +13,591 @@
 #  limitations under the License.
 
 import asyncio
+import random
+import sqlite3
+import time
 
-from pydantic import HttpUrl
+from functools import partial
+from typing import Dict, Iterable, Optional, Tuple
+
+from httpx import Limits
 from loguru import logger
 
-from app.models.domain.sms import SMS
-from app.services.sms_service import SmsService
+from app.core import metrics
+from app.core.settings.app import AppSettings
+from app.models.domain.sms import SMS, SmsPriority, SmsStatus
+from app.services.async_sms_service import AsyncSmsService
+from app.worker.circuit_breaker import CircuitBreaker
+from app.worker.dead_letters import DeadLetterStore
+from app.worker.delay_queue import DelayQueue
+from app.worker.delivery_reconciler import DeliveryReconciler, SentIndex, SentRecord
+from app.worker.dispatcher import Dispatcher
+from app.worker.drain_meter import DrainMeter
+from app.worker.inbox_poller import InboxPoller
+from app.worker.journal import AVAILABLE, DRAIN_RATE, JournalStats, SqliteJournal
+from app.worker.modem import Modem
+from app.worker.queue_lock import QueueLock
+from app.worker.segment_budget import SegmentBudget
+from app.worker.status_store import StatusEntry, StatusStore
+from app.worker.supervisor import supervise
+from app.worker.task_queue import TaskQueue
 
 
 class Worker:
-    def __init__(self, host: HttpUrl):
-        self._queue = asyncio.Queue()
-        self._sms = SmsService(device_host=host)
+    def __init__(self, settings: AppSettings):
+        self._queue = TaskQueue(settings.sms_priority_weights)
+        self._in_flight = 0
+        self._group_size = settings.sms_group_size
+        self._max_depth = settings.queue_max_depth
+        self._max_depth_per_client = settings.queue_max_depth_per_client
+        self._retry_after_max = settings.queue_retry_after_max
+        self._client_depth: Dict[str, int] = {}
+        self._drain = DrainMeter(window=settings.queue_drain_window)
+        self._delayed = DelayQueue(release=self._requeue)
+        self._scheduled = DelayQueue(release=self._release_scheduled)
+        self._dead_letters = DeadLetterStore(max_size=settings.dead_letter_max_size)
+        self._statuses = StatusStore(max_size=settings.status_max_size, ttl=settings.status_ttl)
+        self._journal = None
+        if settings.queue_path:
+            self._journal = SqliteJournal(settings.queue_path, commit_interval=settings.queue_commit_interval)
+
+        # With a shared queue only the process holding the lock dispatches, the others only enqueue.
+        # Statuses and dead letters are then read from the journal, so every process answers the same.
+        self._lock = None
+        if settings.queue_shared:
+            self._lock = QueueLock(f"{settings.queue_path}.lock")
+        self._leader = self._lock is None
+        self._shared = JournalStats(lanes={}, clients={}, drain_rate=0.0, available=True)
+        self._poll_interval = settings.queue_poll_interval
+        self._stats_interval = settings.queue_stats_interval
+        self._status_max_size = settings.status_max_size
+        self._status_ttl = settings.status_ttl
+        self._inbox_buffer = settings.inbox_subscriber_buffer
+
+        limits = Limits(
+            max_connections=settings.hilink_max_connections,
+            max_keepalive_connections=settings.hilink_max_keepalive_connections,
+            keepalive_expiry=settings.hilink_keepalive_expiry,
+        )
+        modems = [
+            Modem(
+                host=host,
+                sms=AsyncSmsService(device_host=host, limits=limits, timeout=settings.hilink_timeout),
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.hilink_failure_threshold,
+                    reset_timeout=settings.hilink_recovery_interval,
+                ),
+                budget=SegmentBudget(settings.hilink_segments_per_minute),
+            )
+            for host in settings.hilink
+        ]
+        # Tasks per second the modems are configured for, used until the drain meter has data.
+        # Without a segment budget a modem manages about one send per second.
+        per_modem = settings.hilink_segments_per_minute / 60 if settings.hilink_segments_per_minute else 1.0
+        self._capacity = per_modem * len(modems)
+        self._drain_window = settings.queue_drain_window
+        self._dispatcher = Dispatcher(
+            modems,
+            lane_depth=settings.hilink_lane_depth,
+            health_interval=settings.hilink_health_interval,
+        )
+        self._lanes: list[asyncio.Task] = []
+
+        self._reconciler = DeliveryReconciler(
+            modems,
+            interval=settings.delivery_sync_interval,
+            page_size=settings.inbox_page_size,
+            match_window=settings.delivery_match_window,
+            index=SentIndex(retention=settings.delivery_retention, max_size=settings.delivery_max_tracked),
+            update=self._reconciled,
+        )
+
+        self._inbox = InboxPoller(
+            modems,
+            interval=settings.inbox_poll_interval,
+            page_size=settings.inbox_page_size,
+            delete_processed=settings.inbox_delete_processed,
+            subscriber_buffer=settings.inbox_subscriber_buffer,
+            forward=self._journal.forward_inbox if self._lock is not None else None,
+            reports=self._reconciler.reports,
+        )
+
+        self._send_status_min_delay = settings.send_status_min_delay
+        self._send_status_max_delay = settings.send_status_max_delay
+        self._send_status_timeout = settings.send_status_timeout
+
+        self._retry_max_attempts = settings.retry_max_attempts
+        self._retry_base_delay = settings.retry_base_delay
+        self._retry_max_delay = settings.retry_max_delay
 
         self._enabled = True
 
+        metrics.REGISTRY.set_collector("worker", self._collect_metrics)
+
     async def add_task(self, task) -> bool:
         if not self._enabled:
             return False
 
-        await self._queue.put(task)
+        self._enqueue(task)
+
         logger.info(f"Task added: {task}")
 
         return True
 
+    async def add_tasks(self, tasks: list[SMS]) -> bool:
+        if not self._enabled:
+            return False
+
+        for task in tasks:
+            self._enqueue(task)
+
+        logger.info(f"Tasks added: {len(tasks)}")
+
+        return True
+
     def task_count(self) -> int:
-        return self._queue.qsize()
+        if not self._leader:
+            return sum(self._shared.lanes.values())
+
+        return self._queue.qsize() + len(self._delayed) + self._in_flight
+
+    def admission_delay(self, client: str, count: int = 1) -> float:
+        """
+        Checks whether more tasks fit into the queue.
+
+        Parameters:
+            client (str): The client adding the tasks.
+            count (int): The number of tasks to add.
+
+        Returns:
+            float: Zero if the tasks fit, otherwise the estimated seconds until the worker drains enough of the queue.
+        """
+        depth = self.task_count()
+        client_depth = self._client_depth.get(client, 0) if self._leader else self._shared.clients.get(client, 0)
+
+        excess = 0.0
+        if self._max_depth:
+            excess = depth + count - self._max_depth
+
+        if self._max_depth_per_client and client_depth + count > self._max_depth_per_client:
+            # The client gets its share of the drain rate, proportional to its share of the queue
+            client_excess = client_depth + count - self._max_depth_per_client
+            excess = max(excess, client_excess * depth / max(client_depth, 1))
+
+        if excess <= 0:
+            return 0.0
+
+        rate = self._drain.rate() if self._leader else self._shared.drain_rate
+        if rate * self._drain_window < 1:
+            # Less than one send in the last window says nothing about how fast the queue drains
+            rate = self._capacity
+
+        return min(max(excess / rate, 1.0), self._retry_after_max)
+
+    @property
+    def inbox(self) -> InboxPoller:
+        return self._inbox
+
+    def available(self) -> bool:
+        if not self._leader:
+            return self._shared.available
+
+        return self._dispatcher.available
+
+    def lane_counts(self) -> dict[SmsPriority, int]:
+        if not self._leader:
+            return {priority: self._shared.lanes.get(priority.value, 0) for priority in SmsPriority}
+
+        return self._queue.lane_sizes()
+
+    async def status(self, task_id: str) -> Optional[StatusEntry]:
+        if self._lock is not None:
+            return await self._journal.status(task_id)
+
+        return self._statuses.get(task_id)
+
+    async def statuses(self, task_ids: list[str]) -> Dict[str, StatusEntry]:
+        if self._lock is not None:
+            return await self._journal.statuses(task_ids)
+
+        entries = ((task_id, self._statuses.get(task_id)) for task_id in task_ids)
+
+        return {task_id: entry for task_id, entry in entries if entry is not None}
+
+    async def dead_letter_count(self, ids: Optional[Iterable[str]] = None) -> int:
+        if self._lock is not None:
+            return await self._journal.dead_letter_count(None if ids is None else list(ids))
+
+        return self._dead_letters.count(ids)
+
+    async def dead_letters(self, offset: int = 0, limit: int = 100) -> list[SMS]:
+        if self._lock is not None:
+            return await self._journal.dead_letters(offset, limit)
+
+        return self._dead_letters.list(offset=offset, limit=limit)
+
+    async def replay_dead_letters(self, ids: Optional[Iterable[str]] = None) -> int:
+        if not self._enabled:
+            return 0
+
+        if not self._leader:
+            # The dispatching process owns the dead letters, it picks the request up from the journal
+            ids = None if ids is None else list(ids)
+            count = await self._journal.dead_letter_count(ids)
+            self._journal.request_replay(ids)
+            return count
+
+        tasks = self._dead_letters.pop(ids)
+
+        for task in tasks:
+            task.attempts = 0
+            task._queued_at = time.monotonic()
+            if self._journal is not None:
+                self._journal.unbury(task)
+
+        await self.add_tasks(tasks)
+
+        return len(tasks)
 
     async def loop(self):
         self._enabled = True
 
+        if self._lock is None:
+            await self._start()
+            return
+
+        self._journal.start()
+        self._lanes.append(asyncio.create_task(supervise("Shared queue follower", self._lead)))
+
+    async def _lead(self) -> None:
+        await self._follow()
+
+        if not self._enabled or self._leader:
+            return
+
+        # Rows written while following now count as enqueued by another process
+        self._journal.claim()
+        self._leader = True
+        logger.info("Took over dispatching the shared queue")
+
+        await self._start()
+
+    async def _start(self) -> None:
+        if self._journal is not None:
+            tasks = await self._journal.poll()
+            self._restore(tasks)
+
+            logger.info(f"Restored {len(tasks)} tasks from journal")
+
+            for task in await self._journal.replay_dead_letters():
+                self._store_dead_letter(task)
+
+            if not self._enabled:
+                # Stopped while restoring, there is nothing left to cancel the loops started below
+                return
+
+            if self._lock is None:
+                self._journal.start()
+            else:
+                self._lanes.append(asyncio.create_task(supervise("Shared queue poller", self._poll_shared)))
+
+        self._lanes += [
+            asyncio.create_task(supervise(f"Lane of {modem.host}", partial(self._lane, modem)))
+            for modem in self._dispatcher.modems
+        ]
+        self._lanes.append(asyncio.create_task(supervise("Delay queue", self._delayed.run)))
+        self._lanes.append(asyncio.create_task(supervise("Scheduler", self._scheduled.run)))
+        self._lanes.append(asyncio.create_task(supervise("Inbox poller", self._inbox.run)))
+        self._lanes.append(asyncio.create_task(supervise("Delivery reconciler", self._reconciler.run)))
+        self._lanes.append(asyncio.create_task(supervise("Modem monitor", self._dispatcher.monitor)))
+        self._lanes.append(asyncio.create_task(supervise("Dispatcher", self._dispatch)))
+
+    async def _dispatch(self):
+        idle = metrics.WORKER_IDLE.labels("dispatcher")
+
         while self._enabled:
+            waiting_since = time.monotonic()
             task: SMS = await self._queue.get()
+            idle.inc(time.monotonic() - waiting_since)
+            self._in_flight += 1
+
+            modem = await self._dispatcher.acquire()
+            self._in_flight -= 1
+
+            # Tasks can expire in the queue or while waiting for a modem
+            group = self._unexpired([task] + self._queue.take_matching(task, self._group_size - 1))
+            if not group:
+                await self._dispatcher.release(modem, None)
+                continue
+
+            self._in_flight += len(group)
+
+            dispatched_at = time.monotonic()
+            for queued in group:
+                metrics.SMS_QUEUE_WAIT.observe(dispatched_at - queued._queued_at)
+                self._set_status(queued, SmsStatus.sending)
 
-            send_sms_task = await asyncio.to_thread(self._sms.send_sms, task.phone, task.message)
-            if send_sms_task:
-                logger.info(f"Task sent to {task.phone}")
-                self._queue.task_done()
+            modem.lane.put_nowait(group)
+
+    async def _lane(self, modem: Modem):
+        idle = metrics.WORKER_IDLE.labels(str(modem.host))
+        sent = metrics.SMS_RESULTS.labels("sent")
+        failed = metrics.SMS_RESULTS.labels("failed")
+
+        while self._enabled:
+            waiting_since = time.monotonic()
+            group: list[SMS] = await modem.lane.get()
+            idle.inc(time.monotonic() - waiting_since)
+
+            accepted = False
+            results = [False] * len(group)
+            try:
+                accepted, results = await self._send_group(modem, group)
+            except Exception:
+                # The tasks are retried, the modem may have sent them already
+                logger.exception(f"Sending to {len(group)} recipients via {modem.host} failed")
+
+            try:
+                for task, result in zip(group, results):
+                    if result:
+                        logger.info(f"Task sent to {task.phone} via {modem.host}")
+                        sent.inc()
+                        self._set_status(task, SmsStatus.sent)
+                        self._reconciler.track(task)
+                        self._untrack(task)
+                        if self._journal is not None:
+                            self._journal.ack(task)
+                    else:
+                        logger.error(f"Task failed to send to {task.phone} via {modem.host}")
+                        failed.inc()
+                        self._retry(task)
+            finally:
+                self._in_flight -= len(group)
+                await self._dispatcher.release(modem, accepted)
+
+    async def _send_group(self, modem: Modem, group: list[SMS]) -> Tuple[bool, list[bool]]:
+        phones = [task.phone for task in group]
+
+        await modem.budget.acquire(sum(task.segments for task in group))
+
+        accepted = await modem.sms.send_sms_group(phones, group[0].message)
+        if not accepted:
+            return False, [False] * len(group)
+
+        sent_phones = await self._wait_sent(modem, phones)
+
+        return True, [sent_phones[phone] for phone in phones]
+
+    def _retry(self, task: SMS) -> None:
+        task.attempts += 1
+
+        if task.attempts >= self._retry_max_attempts:
+            logger.error(f"Task to {task.phone} moved to dead letters after {task.attempts} attempts")
+            metrics.SMS_RESULTS.labels("dead").inc()
+            self._bury(task)
+            return
+
+        self._set_status(task, SmsStatus.failed)
+
+        delay = min(self._retry_base_delay * 2 ** (task.attempts - 1), self._retry_max_delay)
+        delay = random.uniform(delay / 2, delay)
+
+        self._delayed.push(asyncio.get_running_loop().time() + delay, task)
+        if self._journal is not None:
+            self._journal.record(task)
+
+    async def _follow(self) -> None:
+        loop = asyncio.get_running_loop()
+        refreshed_at = 0.0
+
+        await self._journal.skip_inbox()
+
+        while self._enabled and not self._lock.acquire():
+            try:
+                # Messages received by the dispatching process reach the subscribers of this one
+                self._inbox.publish(await self._journal.poll_inbox())
+
+                if loop.time() - refreshed_at >= self._stats_interval:
+                    self._shared = await self._journal.stats()
+                    refreshed_at = loop.time()
+            except sqlite3.Error as err:
+                logger.error(err)
+
+            await asyncio.sleep(self._poll_interval)
+
+    async def _poll_shared(self) -> None:
+        loop = asyncio.get_running_loop()
+        published_at = 0.0
+
+        while self._enabled:
+            try:
+                self._restore(await self._journal.poll())
+
+                for ids in await self._journal.poll_replays():
+                    await self.replay_dead_letters(ids)
+            except sqlite3.Error as err:
+                logger.error(err)
+
+            if loop.time() - published_at >= self._stats_interval:
+                self._journal.publish({DRAIN_RATE: self._drain.rate(), AVAILABLE: self._dispatcher.available})
+                self._journal.trim(self._status_max_size, self._inbox_buffer)
+                published_at = loop.time()
+
+            await asyncio.sleep(self._poll_interval)
+
+    def _set_status(self, task: SMS, status: SmsStatus) -> None:
+        self._set_status_of(task.id, status, task.attempts)
+
+    def _set_status_of(self, task_id: str, status: SmsStatus, attempts: int) -> None:
+        if self._lock is not None:
+            self._journal.set_status(task_id, status, attempts, self._status_ttl)
+        else:
+            self._statuses.set(task_id, status, attempts)
+
+    def _reconciled(self, records: list[SentRecord], status: SmsStatus) -> None:
+        for record in records:
+            self._set_status_of(record.task_id, status, record.attempts)
+
+    def _enqueue(self, task: SMS) -> None:
+        if self._leader:
+            self._admit(task)
+        elif self._due_in(task) > 0:
+            self._set_status(task, SmsStatus.scheduled)
+        else:
+            priority = task.priority.value
+            self._shared.lanes[priority] = self._shared.lanes.get(priority, 0) + 1
+            self._shared.clients[task.client] = self._shared.clients.get(task.client, 0) + 1
+            self._set_status(task, SmsStatus.queued)
+
+        if self._journal is not None:
+            self._journal.record(task)
+
+    def _restore(self, tasks: list[SMS]) -> None:
+        for task in tasks:
+            self._admit(task)
+
+    def _admit(self, task: SMS) -> None:
+        due_in = self._due_in(task)
+        if due_in > 0:
+            # Scheduled tasks do not count against the queue depth until they are due
+            self._scheduled.push(asyncio.get_running_loop().time() + due_in, task)
+            self._set_status(task, SmsStatus.scheduled)
+            return
+
+        self._queue.put_nowait(task)
+        self._track(task)
+        self._set_status(task, SmsStatus.queued)
+
+    @staticmethod
+    def _due_in(task: SMS) -> float:
+        if task.send_at is None:
+            return 0.0
+
+        return task.send_at - time.time()
+
+    def _release_scheduled(self, task: SMS) -> None:
+        self._track(task)
+
+        if task.expired():
+            self._expire(task)
+            return
+
+        self._requeue(task)
+
+    def _unexpired(self, tasks: list[SMS]) -> list[SMS]:
+        now = time.time()
+
+        unexpired = []
+        for task in tasks:
+            if task.expired(now):
+                self._expire(task)
             else:
-                logger.error(f"Task failed to send to {task.phone}")
-                await self._queue.put(task)
+                unexpired.append(task)
+
+        return unexpired
+
+    def _expire(self, task: SMS) -> None:
+        logger.warning(f"Task to {task.phone} expired before it was sent")
+        metrics.SMS_RESULTS.labels("expired").inc()
+
+        self._set_status(task, SmsStatus.expired)
+        self._untrack(task)
+        if self._journal is not None:
+            self._journal.ack(task)
+
+    def _requeue(self, task: SMS) -> None:
+        task._queued_at = time.monotonic()
+        self._queue.put_nowait(task)
+        self._set_status(task, SmsStatus.queued)
+
+    def _track(self, task: SMS) -> None:
+        self._client_depth[task.client] = self._client_depth.get(task.client, 0) + 1
+
+    def _untrack(self, task: SMS) -> None:
+        depth = self._client_depth.get(task.client, 0) - 1
+        if depth > 0:
+            self._client_depth[task.client] = depth
+        else:
+            self._client_depth.pop(task.client, None)
+
+        self._drain.record()
 
-            await asyncio.sleep(15)
+    def _bury(self, task: SMS) -> None:
+        self._untrack(task)
+        if self._journal is not None:
+            self._journal.bury(task)
+
+        self._store_dead_letter(task)
+
+    def _store_dead_letter(self, task: SMS) -> None:
+        self._set_status(task, SmsStatus.dead)
+
+        evicted = self._dead_letters.add(task)
+        if evicted is not None and self._journal is not None:
+            self._journal.unbury(evicted)
+
+    async def _wait_sent(self, modem: Modem, phones: list[str]) -> dict[str, bool]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._send_status_timeout
+        delay = self._send_status_min_delay
+
+        while True:
+            await asyncio.sleep(delay)
+
+            results = await modem.sms.wait_send_sms_group(phones)
+            if all(result is not None for result in results.values()):
+                return results
+
+            if loop.time() >= deadline:
+                # The modem has accepted the message, resending it could deliver a duplicate
+                logger.warning(f"Send status for {', '.join(phones)} via {modem.host} not confirmed in time")
+                return {phone: result is not False for phone, result in results.items()}
+
+            delay = min(delay * 2, self._send_status_max_delay)
+
+    def _collect_metrics(self) -> None:
+        for priority, size in self._queue.lane_sizes().items():
+            metrics.SMS_QUEUE_DEPTH.labels(priority.value).set(size)
+
+        metrics.SMS_TASKS.labels("queued").set(self._queue.qsize())
+        metrics.SMS_TASKS.labels("delayed").set(len(self._delayed))
+        metrics.SMS_TASKS.labels("scheduled").set(len(self._scheduled))
+        metrics.SMS_TASKS.labels("in_flight").set(self._in_flight)
+        metrics.SMS_TASKS.labels("dead").set(len(self._dead_letters))
 
     async def stop(self):
         self._enabled = False
+
+        for lane in self._lanes:
+            lane.cancel()
+
+        await asyncio.gather(*self._lanes, return_exceptions=True)
+
+        for modem in self._dispatcher.modems:
+            await modem.sms.close()
+
+        if self._journal is not None:
+            await self._journal.close()
+
+        if self._lock is not None:
+            self._lock.release()
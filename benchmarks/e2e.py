@@ -0,0 +1,269 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+End-to-end benchmark of the gateway against in-process fake HiLink devices.
+
+Drives Application through POST /api/v1/send and reports enqueue latency
+percentiles, worker throughput and memory per queued task as JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.e2e [--messages 2000] [--modems 2] [--latency 0.005] [--output result.json]
+
+Pass --baseline with an earlier result to print the relative change of every metric.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from loguru import logger
+
+from benchmarks.fake_hilink import FakeHilink, FakeHilinkServer
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+
+    return ordered[rank]
+
+
+def build_request(index: int) -> dict:
+    return {"phone": f"+37529{1000000 + index % 9000000}", "message": f"Benchmark message {index}"}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def enqueue(client: httpx.AsyncClient, start: int, count: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    indexes = iter(range(start, start + count))
+
+    async def client_loop() -> None:
+        for index in indexes:
+            started = time.perf_counter()
+            response = await client.post("/api/v1/send", json=build_request(index))
+            latencies.append(time.perf_counter() - started)
+
+            if response.status_code != 200:
+                raise RuntimeError(f"Enqueue failed with {response.status_code}: {response.text}")
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    return latencies
+
+
+async def drain(worker, timeout: float) -> float:
+    started = time.perf_counter()
+
+    while worker.task_count():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"{worker.task_count()} tasks left after {timeout} seconds")
+
+        await asyncio.sleep(0.01)
+
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    devices = [
+        FakeHilink(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            fail_rate=args.fail_rate,
+            require_session=args.require_session,
+            seed=args.seed + index,
+        )
+        for index in range(args.modems)
+    ]
+    servers = [FakeHilinkServer(device) for device in devices]
+
+    for server in servers:
+        await server.__aenter__()
+
+    try:
+        os.environ.update(
+            HILINK=",".join(server.url for server in servers),
+            SMS_GROUP_SIZE=str(args.group_size),
+            HILINK_LANE_DEPTH=str(args.lane_depth),
+            # The devices hold send requests while the queue fills up, a request timing out
+            # during the pause would be retried and sent twice
+            HILINK_TIMEOUT=str(args.timeout),
+            SEND_STATUS_MIN_DELAY=str(args.status_delay),
+            RETRY_BASE_DELAY=str(args.retry_delay),
+            RETRY_MAX_DELAY=str(args.retry_delay * 8),
+            INBOX_POLL_INTERVAL="3600",
+        )
+
+        # Imported here so that the settings are read after the environment is prepared
+        from app import Application
+        from app.core.config import get_app_settings
+
+        get_app_settings.cache_clear()
+        application = Application().application
+        logger.remove()
+
+        await application.router.startup()
+        worker = application.state.worker
+
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for device in devices:
+                device.pause()
+            paused_at = time.perf_counter()
+
+            # Warm up connections and caches so that one-off allocations are not attributed to tasks
+            warmup = args.concurrency * 4
+            await enqueue(client, 0, warmup, args.concurrency)
+
+            queued_before = worker.task_count()
+            tracemalloc.start()
+            memory_before = tracemalloc.get_traced_memory()[0]
+            await enqueue(client, warmup, args.memory_tasks, args.concurrency)
+            memory_after = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            queued_for_memory = worker.task_count() - queued_before
+
+            started = time.perf_counter()
+            latencies = await enqueue(client, warmup + args.memory_tasks, args.messages, args.concurrency)
+            enqueue_seconds = time.perf_counter() - started
+
+            total = worker.task_count()
+            for device in devices:
+                device.resume()
+
+            if time.perf_counter() - paused_at >= args.timeout:
+                raise TimeoutError(f"Enqueueing took longer than {args.timeout} seconds, HiLink requests timed out")
+
+            drain_seconds = await drain(worker, args.timeout)
+
+            dead_letters = await worker.dead_letter_count()
+
+        await application.router.shutdown()
+    finally:
+        for server in servers:
+            await server.__aexit__(None, None, None)
+
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": vars(args) | {"baseline": None, "output": None},
+        "enqueue": {
+            "requests": len(latencies),
+            "seconds": enqueue_seconds,
+            "requests_per_second": len(latencies) / enqueue_seconds,
+            "latency_ms": {
+                "mean": statistics.fmean(latencies) * 1000,
+                "p50": percentile(latencies, 50) * 1000,
+                "p90": percentile(latencies, 90) * 1000,
+                "p99": percentile(latencies, 99) * 1000,
+                "max": max(latencies) * 1000,
+            },
+        },
+        "throughput": {
+            "tasks": total,
+            "seconds": drain_seconds,
+            "tasks_per_second": total / drain_seconds if drain_seconds else None,
+            "sent": sum(device.sent for device in devices),
+            "failed_recipients": sum(device.failed for device in devices),
+            "rejected_requests": sum(device.rejected for device in devices),
+            "session_requests": sum(device.session_requests for device in devices),
+            "dead_letters": dead_letters,
+        },
+        "memory": {
+            "tasks": queued_for_memory,
+            "bytes_per_task": (memory_after - memory_before) / queued_for_memory if queued_for_memory else None,
+        },
+    }
+
+
+def compare(result: Dict, baseline: Dict, prefix: str = "") -> List[str]:
+    lines = []
+    for key, value in result.items():
+        if key == "config":
+            continue
+
+        previous = baseline.get(key)
+        name = f"{prefix}{key}"
+
+        if isinstance(value, dict) and isinstance(previous, dict):
+            lines.extend(compare(value, previous, f"{name}."))
+        elif isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+            lines.append(f"{name:<44}{previous:>14.3f}{value:>14.3f}{(value - previous) / previous:>+10.1%}")
+
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="messages enqueued for the latency and throughput run")
+    parser.add_argument("--memory-tasks", type=int, default=1000, help="messages enqueued for the memory measurement")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent API clients")
+    parser.add_argument("--modems", type=int, default=2, help="fake HiLink devices")
+    parser.add_argument("--latency", type=float, default=0.005, help="mean fake HiLink latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="fake HiLink latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of send-sms calls rejected by the fake")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of recipients reported as failed")
+    parser.add_argument("--require-session", action="store_true", help="fake writes need a session token")
+    parser.add_argument("--group-size", type=int, default=1, help="SMS_GROUP_SIZE of the gateway")
+    parser.add_argument("--lane-depth", type=int, default=1, help="HILINK_LANE_DEPTH of the gateway")
+    parser.add_argument("--status-delay", type=float, default=0.005, help="SEND_STATUS_MIN_DELAY of the gateway")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="RETRY_BASE_DELAY of the gateway")
+    parser.add_argument("--timeout", type=float, default=600.0, help="maximum seconds to wait for the queue to drain")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the fake devices")
+    parser.add_argument("--output", help="write the JSON result to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare with")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    document = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(document + "\n")
+    else:
+        print(document)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        print(f"{'metric':<44}{'baseline':>14}{'current':>14}{'change':>10}", file=sys.stderr)
+        print("\n".join(compare(result, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
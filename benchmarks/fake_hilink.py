@@ -0,0 +1,339 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+In-process fake of the HiLink API used by the end-to-end benchmark.
+
+The fake serves the endpoints the gateway uses over real HTTP on a local port,
+with configurable latency and failure rates:
+
+    /api/device/information
+    /api/webserver/SesTokInfo
+    /api/sms/send-sms
+    /api/sms/send-status
+    /api/sms/sms-list
+    /api/sms/delete-sms
+"""
+
+import asyncio
+import itertools
+import random
+import re
+import time
+
+from typing import Dict, List, NamedTuple, Optional
+
+import uvicorn
+
+from fastapi import FastAPI, Request, Response
+
+XML_DECLARATION = "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+OK_RESPONSE = f"{XML_DECLARATION}<response>OK</response>"
+ERROR_RESPONSE = f"{XML_DECLARATION}<error><code>113018</code><message></message></error>"
+WRONG_SESSION_RESPONSE = f"{XML_DECLARATION}<error><code>125002</code><message></message></error>"
+WRONG_TOKEN_RESPONSE = f"{XML_DECLARATION}<error><code>125003</code><message></message></error>"
+
+TOKEN_HEADER = "__RequestVerificationToken"
+
+_PHONE_PATTERN = re.compile(r"<Phone>([^<]*)</Phone>")
+_INDEX_PATTERN = re.compile(r"<Index>(\d+)</Index>")
+_PAGE_PATTERN = re.compile(r"<PageIndex>(\d+)</PageIndex>")
+_COUNT_PATTERN = re.compile(r"<ReadCount>(\d+)</ReadCount>")
+_BOX_PATTERN = re.compile(r"<BoxType>(\d+)</BoxType>")
+_CONTENT_PATTERN = re.compile(r"<Content>([^<]*)</Content>")
+
+INBOX_PHONE = "+375291234567"
+INBOX_DATE = "2023-11-21 10:00:00"
+
+SMSTAT_SENT = 3
+SMSTAT_SEND_FAILED = 4
+SMS_TYPE_DELIVERED = 7
+
+
+class _Message(NamedTuple):
+    phone: str
+    content: str
+    date: str
+    status: int = 0
+    sms_type: int = 1
+
+
+class _SessionRejected(Exception):
+    def __init__(self, response: str):
+        super().__init__(response)
+        self.response = response
+
+
+class FakeHilink:
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            fail_rate: float = 0.0,
+            inbox_size: int = 0,
+            require_session: bool = False,
+            delivery_reports: bool = False,
+            seed: Optional[int] = None,
+    ):
+        """
+        Parameters:
+            latency (float): The mean response latency in seconds.
+            jitter (float): The maximum deviation from the mean latency in seconds.
+            error_rate (float): The share of send-sms requests answered with a HiLink error.
+            fail_rate (float): The share of accepted recipients reported as failed by send-status.
+            inbox_size (int): The number of messages in the inbox at start.
+            require_session (bool): Whether writes need the session cookie and token, the token rotates after each write.
+            delivery_reports (bool): Whether a delivery report arrives in the inbox for every sent recipient.
+            seed (Optional[int]): The random seed, for reproducible runs.
+        """
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._fail_rate = fail_rate
+        self._random = random.Random(seed)
+
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+
+        self._success_phones: List[str] = []
+        self._fail_phones: List[str] = []
+        self._inbox: Dict[int, str] = {index: f"Inbox message {index}" for index in range(1, inbox_size + 1)}
+        self._reports: Dict[int, _Message] = {}
+        self._sent_box: Dict[int, _Message] = {}
+        self._delivery_reports = delivery_reports
+        # Sent messages and reports are numbered apart from the inbox messages added by tests
+        self._indexes = itertools.count(100001)
+
+        self._require_session = require_session
+        self._ids = itertools.count(1)
+        self._session = ""
+        self._token = ""
+
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.session_requests = 0
+        self.session_rejections = 0
+
+        self.application = self._build_application()
+
+    def pause(self) -> None:
+        """
+        Holds send-sms requests until resume() is called.
+        """
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        self._resumed.set()
+
+    def expire_session(self) -> None:
+        """
+        Invalidates the current session, as the modem does after its idle timeout.
+        """
+        self._session = ""
+
+    def _check_session(self, request: Request, write: bool = True) -> None:
+        if not self._require_session:
+            return
+
+        if not self._session or request.cookies.get("SessionID") != self._session:
+            self.session_rejections += 1
+            raise _SessionRejected(WRONG_SESSION_RESPONSE)
+
+        if write and request.headers.get(TOKEN_HEADER) != self._token:
+            self.session_rejections += 1
+            raise _SessionRejected(WRONG_TOKEN_RESPONSE)
+
+    def _write_response(self, content: str) -> Response:
+        response = _xml(content)
+        if self._require_session:
+            self._token = f"token{next(self._ids)}"
+            response.headers[TOKEN_HEADER] = self._token
+
+        return response
+
+    def _send(self, phones: List[str], content: str) -> None:
+        date = time.strftime("%Y-%m-%d %H:%M:%S")
+
+        self._success_phones = []
+        self._fail_phones = []
+        for phone in phones:
+            if self._random.random() < self._fail_rate:
+                self._fail_phones.append(phone)
+                self._sent_box[next(self._indexes)] = _Message(phone, content, date, SMSTAT_SEND_FAILED)
+                self.failed += 1
+                continue
+
+            self._success_phones.append(phone)
+            self._sent_box[next(self._indexes)] = _Message(phone, content, date, SMSTAT_SENT)
+            self.sent += 1
+
+            if self._delivery_reports:
+                self._reports[next(self._indexes)] = _Message(phone, "", date, sms_type=SMS_TYPE_DELIVERED)
+
+    def _box(self, box_type: int) -> Dict[int, _Message]:
+        if box_type == 2:
+            return self._sent_box
+
+        inbox = {index: _Message(INBOX_PHONE, content, INBOX_DATE) for index, content in self._inbox.items()}
+
+        return {**inbox, **self._reports}
+
+    async def _delay(self) -> None:
+        delay = self._latency + self._random.uniform(-self._jitter, self._jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _build_application(self) -> FastAPI:
+        application = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+        self._add_session_routes(application)
+
+        @application.get("/api/device/information")
+        async def information() -> Response:
+            await self._delay()
+
+            return _xml(f"{XML_DECLARATION}<response><DeviceName>FakeHilink</DeviceName></response>")
+
+        @application.post("/api/sms/send-sms")
+        async def send_sms(request: Request) -> Response:
+            body = (await request.body()).decode()
+            await self._resumed.wait()
+            await self._delay()
+
+            self._check_session(request)
+
+            if self._random.random() < self._error_rate:
+                self.rejected += 1
+                return _xml(ERROR_RESPONSE)
+
+            self._send(_PHONE_PATTERN.findall(body), _search(_CONTENT_PATTERN, body, ""))
+
+            return self._write_response(OK_RESPONSE)
+
+        @application.get("/api/sms/send-status")
+        async def send_status() -> Response:
+            await self._delay()
+
+            total = len(self._success_phones) + len(self._fail_phones)
+
+            return _xml(
+                f"{XML_DECLARATION}<response><Phone></Phone>"
+                f"<SucPhone>{';'.join(self._success_phones)}</SucPhone>"
+                f"<FailPhone>{';'.join(self._fail_phones)}</FailPhone>"
+                f"<TotalCount>{total}</TotalCount><CurIndex>{total}</CurIndex></response>"
+            )
+
+        @application.post("/api/sms/sms-list")
+        async def sms_list(request: Request) -> Response:
+            body = (await request.body()).decode()
+            await self._delay()
+
+            self._check_session(request, write=False)
+
+            page = int(_search(_PAGE_PATTERN, body, "1"))
+            count = int(_search(_COUNT_PATTERN, body, "20"))
+            box = self._box(int(_search(_BOX_PATTERN, body, "1")))
+            indexes = sorted(box, reverse=True)[(page - 1) * count:page * count]
+
+            messages = "".join(
+                f"<Message><Smstat>{box[index].status}</Smstat>"
+                f"<Index>{index}</Index><Phone>{box[index].phone}</Phone>"
+                f"<Content>{box[index].content}</Content><Date>{box[index].date}</Date>"
+                f"<SmsType>{box[index].sms_type}</SmsType></Message>"
+                for index in indexes
+            )
+
+            return _xml(f"{XML_DECLARATION}<response><Count>{len(indexes)}</Count><Messages>{messages}</Messages></response>")
+
+        @application.post("/api/sms/delete-sms")
+        async def delete_sms(request: Request) -> Response:
+            body = (await request.body()).decode()
+            await self._delay()
+
+            self._check_session(request)
+
+            for index in _INDEX_PATTERN.findall(body):
+                self._inbox.pop(int(index), None)
+                self._reports.pop(int(index), None)
+                self._sent_box.pop(int(index), None)
+
+            return self._write_response(OK_RESPONSE)
+
+        return application
+
+    def _add_session_routes(self, application: FastAPI) -> None:
+        @application.get("/api/webserver/SesTokInfo")
+        async def session_token() -> Response:
+            await self._delay()
+
+            self.session_requests += 1
+            self._session = f"session{next(self._ids)}"
+            self._token = f"token{next(self._ids)}"
+
+            return _xml(
+                f"{XML_DECLARATION}<response><SesInfo>SessionID={self._session}</SesInfo>"
+                f"<TokInfo>{self._token}</TokInfo></response>"
+            )
+
+        @application.exception_handler(_SessionRejected)
+        async def session_rejected(_: Request, error: _SessionRejected) -> Response:
+            # HiLink reports errors in the body of a 200 response
+            return _xml(error.response)
+
+
+class FakeHilinkServer:
+    """
+    Serves a FakeHilink on a free local port for the lifetime of the context.
+    """
+
+    def __init__(self, device: FakeHilink):
+        self.device = device
+        self._server = uvicorn.Server(
+            uvicorn.Config(device.application, host="127.0.0.1", port=0, log_level="warning", lifespan="off"),
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.servers[0].sockets[0].getsockname()[:2]
+
+        return f"http://{host}:{port}/"
+
+    async def __aenter__(self) -> "FakeHilinkServer":
+        # The benchmark owns the process signals, the fake must not replace them
+        self._server.install_signal_handlers = lambda: None
+        self._task = asyncio.create_task(self._server.serve())
+
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+
+            await asyncio.sleep(0.01)
+
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._server.should_exit = True
+        await self._task
+
+
+def _xml(content: str) -> Response:
+    return Response(content=content, media_type="application/xml")
+
+
+def _search(pattern: re.Pattern, text: str, default: str) -> str:
+    match = pattern.search(text)
+
+    return match.group(1) if match else default
@@ -0,0 +1,132 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Microbenchmark of the HiLink codec against the previous xmltodict based parsing.
+
+Run from the repository root:
+
+    python -m benchmarks.hilink_codec [--messages 1000] [--repeat 20]
+"""
+
+import argparse
+import timeit
+
+from datetime import datetime
+
+import xmltodict
+
+from app.services import hilink_codec
+
+
+def build_sms_list_page(messages: int) -> str:
+    items = "".join(
+        "<Message>"
+        "<Smstat>0</Smstat>"
+        f"<Index>{40000 + index}</Index>"
+        f"<Phone>+7916{index:07d}</Phone>"
+        f"<Content>Message number {index} with some ordinary text in it</Content>"
+        "<Date>2023-11-21 10:00:00</Date>"
+        "<Sca></Sca>"
+        "<SaveType>4</SaveType>"
+        "<Priority>0</Priority>"
+        "<SmsType>1</SmsType>"
+        "</Message>"
+        for index in range(messages)
+    )
+
+    return (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+        f"<response><Count>{messages}</Count><Messages>{items}</Messages></response>"
+    )
+
+
+def xmltodict_sms_list(text: str) -> list:
+    response_data = xmltodict.parse(text, xml_attribs=True)
+    messages = response_data["response"]["Messages"]["Message"]
+    if int(response_data["response"]["Count"]) == 1:
+        messages = [messages]
+
+    return [(message["Index"], message["Phone"], message["Date"], message["Content"]) for message in messages]
+
+
+def xmltodict_ok(text: str) -> bool:
+    return xmltodict.parse(text, xml_attribs=False)["response"] == "OK"
+
+
+def f_string_send_sms(phone: str, content: str) -> str:
+    _datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    return f"""
+        <request>
+            <Index>-1</Index>
+            <Phones>
+                <Phone>{phone}</Phone>
+            </Phones>
+            <Sca></Sca>
+            <Content>{content}</Content>
+            <Length>{len(content)}</Length>
+            <Reserved>1</Reserved>
+            <Date>{_datetime}</Date>
+        </request>"""
+
+
+def measure(function, repeat: int, number: int) -> float:
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000, help="messages on the sms-list page")
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions, the best one is reported")
+    args = parser.parse_args()
+
+    page = build_sms_list_page(args.messages)
+    ok = "<?xml version=\"1.0\" encoding=\"UTF-8\"?><response>OK</response>"
+    content = "Your verification code is 123456"
+
+    cases = [
+        (
+            f"sms-list ({args.messages} messages)",
+            lambda: xmltodict_sms_list(page),
+            lambda: hilink_codec.decode_sms_list(page),
+            1,
+        ),
+        (
+            "send-sms response",
+            lambda: xmltodict_ok(ok),
+            lambda: hilink_codec.decode_ok(ok),
+            1000,
+        ),
+        (
+            "send-sms request",
+            lambda: f_string_send_sms("+79161234567", content),
+            lambda: hilink_codec.encode_send_sms(["+79161234567"], content, len(content)),
+            1000,
+        ),
+    ]
+
+    print(f"{'case':<32}{'xmltodict/f-string':>22}{'codec':>14}{'speedup':>10}")
+    for name, baseline, codec, number in cases:
+        baseline_time = measure(baseline, args.repeat, number)
+        codec_time = measure(codec, args.repeat, number)
+
+        print(
+            f"{name:<32}{baseline_time * 1e6:>19.1f} us{codec_time * 1e6:>11.1f} us"
+            f"{baseline_time / codec_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
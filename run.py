@@ -15,7 +15,18 @@
 import uvicorn
 
 from app import Application
+from app.core.config import get_app_settings
+
+
+def create_application():
+    return Application().application
+
 
 if __name__ == '__main__':
-    app = Application()
-    uvicorn.run(app.application)
+    settings = get_app_settings()
+
+    if settings.workers > 1:
+        # Worker processes import the application themselves, they share the queue through QUEUE_PATH
+        uvicorn.run("run:create_application", factory=True, workers=settings.workers)
+    else:
+        uvicorn.run(create_application())
@@ -0,0 +1,67 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import httpx
+import pytest
+
+from benchmarks.fake_hilink import FakeHilink
+from app.core.config import get_app_settings
+
+HILINK_URL = "http://hilink.test/"
+
+
+@pytest.fixture
+def hilink(monkeypatch) -> FakeHilink:
+    """
+    Routes every HiLink call of the gateway to an in-process fake device.
+    """
+    device = FakeHilink(seed=0)
+    transport = httpx.ASGITransport(app=device.application)
+
+    async def handle_async_request(_, request: httpx.Request) -> httpx.Response:
+        return await transport.handle_async_request(request)
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", handle_async_request)
+
+    return device
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """
+    Configures the application through the environment, the way it is deployed.
+
+    Returns a function that overrides further settings by name.
+    """
+    defaults = {
+        "hilink": HILINK_URL,
+        "send_status_min_delay": 0.01,
+        "send_status_max_delay": 0.05,
+        "inbox_poll_interval": 60,
+        "hilink_health_interval": 60,
+        "retry_base_delay": 0.05,
+        "retry_max_delay": 0.1,
+        "logging_level": 40,
+    }
+
+    def configure(**values) -> None:
+        for name, value in values.items():
+            monkeypatch.setenv(name.upper(), str(value))
+
+        get_app_settings.cache_clear()
+
+    configure(**defaults)
+    yield configure
+
+    get_app_settings.cache_clear()
@@ -0,0 +1,49 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from tests.utils import running_app
+
+
+@pytest.mark.asyncio
+async def test_retry_after_uses_configured_capacity_before_any_send(hilink, settings):
+    settings(queue_max_depth=2, hilink_segments_per_minute=120)
+    hilink.pause()
+
+    async with running_app() as (_, client):
+        batch = [{"phone": "+375291234567", "message": f"text {index}"} for index in range(10)]
+        response = await client.post("/api/v1/send_batch", json=batch)
+
+        # Eight tasks over the limit at two per second
+        assert response.headers["Retry-After"] == "4"
+        assert response.json()["payload"]["accepted"] == 0
+
+        hilink.resume()
+
+
+@pytest.mark.asyncio
+async def test_send_is_rejected_with_retry_after_when_queue_is_full(hilink, settings):
+    settings(queue_max_depth=1)
+    hilink.pause()
+
+    async with running_app() as (_, client):
+        first = await client.post("/api/v1/send", json={"phone": "+375291234567", "message": "first"})
+        second = await client.post("/api/v1/send", json={"phone": "+375291234567", "message": "second"})
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert second.headers["Retry-After"] == "1"
+
+        hilink.resume()
@@ -0,0 +1,93 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+import pytest
+
+from app.worker.circuit_breaker import CircuitBreaker, CircuitState
+from app.worker.modem import Modem
+from app.worker.segment_budget import SegmentBudget
+
+
+class _Clock:
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(time, "monotonic", lambda: self.now)
+
+
+class _Device:
+    def __init__(self, reachable: bool):
+        self.reachable = reachable
+
+    async def is_hilink(self) -> bool:
+        return self.reachable
+
+
+def test_opens_after_threshold_failures(monkeypatch):
+    _Clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.state is CircuitState.closed
+
+    breaker.record_failure()
+    assert breaker.state is CircuitState.open
+
+
+def test_success_resets_failure_count(monkeypatch):
+    _Clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state is CircuitState.closed
+
+
+def test_half_open_after_reset_timeout(monkeypatch):
+    clock = _Clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock.now += 29
+    assert breaker.state is CircuitState.open
+
+    clock.now += 1
+    assert breaker.state is CircuitState.half_open
+
+    breaker.record_failure()
+    assert breaker.state is CircuitState.open
+
+
+@pytest.mark.asyncio
+async def test_successful_probe_does_not_close_open_breaker(monkeypatch):
+    clock = _Clock(monkeypatch)
+    device = _Device(reachable=False)
+    modem = Modem("http://hilink.test/", device, CircuitBreaker(1, 30), SegmentBudget(0))
+
+    await modem.probe()
+    assert not modem.healthy
+
+    device.reachable = True
+    await modem.probe()
+    assert modem.breaker.state is CircuitState.open
+
+    clock.now += 30
+    await modem.probe()
+    assert modem.breaker.state is CircuitState.half_open
+
+    modem.record_success()
+    assert modem.breaker.state is CircuitState.closed
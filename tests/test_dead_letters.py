@@ -0,0 +1,62 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.models.domain.sms import SMS
+from app.worker.dead_letters import DeadLetterStore
+from tests.utils import running_app
+
+
+def test_count_ignores_unknown_and_repeated_ids():
+    store = DeadLetterStore(max_size=10)
+    task = SMS(phone="+375291234567", message="text")
+    store.add(task)
+
+    assert store.count() == 1
+    assert store.count([task.id, task.id, "unknown"]) == 1
+
+
+def test_add_evicts_oldest_over_max_size():
+    store = DeadLetterStore(max_size=1)
+    first = SMS(phone="+375291234567", message="first")
+    second = SMS(phone="+375291234567", message="second")
+
+    assert store.add(first) is None
+    assert store.add(second) is first
+    assert store.list() == [second]
+
+
+@pytest.mark.asyncio
+async def test_replay_is_rejected_when_queue_is_full(hilink, settings):
+    settings(queue_max_depth=1)
+    hilink.pause()
+
+    async with running_app() as (application, client):
+        worker = application.state.worker
+        for message in ("first", "second"):
+            worker._store_dead_letter(SMS(phone="+375291234567", message=message))
+
+        response = await client.post("/api/v1/dead_letters/replay", json={})
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert await worker.dead_letter_count() == 2
+
+        response = await client.get("/api/v1/dead_letters")
+
+        assert response.status_code == 200
+        assert response.json()["payload"]["count"] == 2
+
+        hilink.resume()
@@ -0,0 +1,90 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.models.domain.sms import SMS, SmsStatus
+from app.services.async_sms_service import AsyncSmsService
+from app.worker.circuit_breaker import CircuitBreaker
+from app.worker.delivery_reconciler import DeliveryReconciler, SentIndex
+from app.worker.modem import Modem
+from app.worker.segment_budget import SegmentBudget
+from tests.conftest import HILINK_URL
+from tests.utils import running_app, wait_for
+
+PHONE = "+375291234567"
+
+
+def test_index_matches_closest_send_within_window():
+    index = SentIndex(retention=3600, max_size=100)
+    for task_id, sent_at in (("first", 1000.0), ("second", 1010.0), ("third", 1100.0)):
+        index.add(PHONE, task_id, 0, sent_at=sent_at)
+
+    assert index.pop_nearest(PHONE, 1008.0, window=30).task_id == "second"
+    assert index.pop_nearest(PHONE, 1200.0, window=30) is None
+    assert index.pop_nearest("+375290000000", 1000.0, window=30) is None
+    assert index.pop_oldest(PHONE, before=1200.0).task_id == "first"
+    assert len(index) == 1
+
+
+def test_index_drops_expired_and_oldest_records():
+    index = SentIndex(retention=60, max_size=2)
+    index.add(PHONE, "expired", 0, sent_at=1000.0)
+    index.add(PHONE, "first", 0, sent_at=1100.0)
+    index.add(PHONE, "second", 0, sent_at=1101.0)
+    index.add(PHONE, "third", 0, sent_at=1102.0)
+
+    assert len(index) == 2
+    assert index.pop_oldest(PHONE, before=2000.0).task_id == "second"
+
+
+@pytest.mark.asyncio
+async def test_failures_in_sent_box_are_reported(hilink):
+    updates = []
+    service = AsyncSmsService(HILINK_URL)
+    modem = Modem(HILINK_URL, service, CircuitBreaker(3, 30), SegmentBudget(0))
+    reconciler = DeliveryReconciler(
+        [modem], interval=60, page_size=2, match_window=60, index=SentIndex(retention=3600, max_size=100),
+        update=lambda records, status: updates.append(([record.task_id for record in records], status)),
+    )
+    await reconciler.sync(modem)
+
+    hilink._fail_rate = 1.0
+    task = SMS(phone=PHONE, message="text")
+    await service.send_sms(task.phone, task.message)
+    reconciler.track(task)
+
+    await reconciler.sync(modem)
+
+    assert updates == [([task.id], SmsStatus.failed)]
+
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_delivery_report_marks_task_delivered(hilink, settings):
+    settings(inbox_poll_interval=0.02, delivery_sync_interval=0.02, inbox_delete_processed=True)
+    hilink._delivery_reports = True
+
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/send", json={"phone": PHONE, "message": "text"})
+        sms_id = response.json()["payload"]["id"]
+
+        async def delivered() -> bool:
+            response = await client.get(f"/api/v1/sms/{sms_id}")
+            return response.json()["payload"]["status"] == "delivered"
+
+        await wait_for(delivered)
+
+        assert not hilink._reports
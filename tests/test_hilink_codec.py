@@ -0,0 +1,69 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.services import hilink_codec
+from app.services.hilink_codec import HilinkDecodeError
+
+
+def test_decode_send_status():
+    status = hilink_codec.decode_send_status(
+        "<response><Phone></Phone><SucPhone>+375291111111;+375292222222</SucPhone><FailPhone></FailPhone>"
+        "<TotalCount>2</TotalCount><CurIndex>2</CurIndex></response>"
+    )
+
+    assert status.success_phones == ["+375291111111", "+375292222222"]
+    assert status.finished
+
+
+def test_decode_send_status_returns_none_for_error():
+    assert hilink_codec.decode_send_status("<error><code>125002</code></error>") is None
+
+
+def test_decode_send_status_rejects_malformed_counter():
+    with pytest.raises(HilinkDecodeError):
+        hilink_codec.decode_send_status("<response><TotalCount>many</TotalCount></response>")
+
+
+def test_decode_sms_list():
+    messages = hilink_codec.decode_sms_list(
+        "<response><Count>1</Count><Messages><Message><Smstat>0</Smstat><Index>40001</Index>"
+        "<Phone>+375291234567</Phone><Content>Hello</Content><Date>2023-11-21 10:00:00</Date>"
+        "</Message></Messages></response>",
+        modem="http://hilink.test/",
+    )
+
+    assert [(message.index, message.content) for message in messages] == [(40001, "Hello")]
+
+
+def test_decode_session():
+    session = hilink_codec.decode_session(
+        "<response><SesInfo>SessionID=abc</SesInfo><TokInfo>token</TokInfo></response>"
+    )
+
+    assert session == ("SessionID=abc", "token")
+
+
+def test_decode_error_code():
+    assert hilink_codec.decode_error_code("<error><code>125003</code><message></message></error>") == 125003
+    assert hilink_codec.decode_error_code("<response>OK</response>") is None
+
+
+def test_sms_list_decoder_reports_error_code():
+    decoder = hilink_codec.SmsListDecoder()
+    decoder.feed("<error><code>125002</code><message></message></error>")
+
+    assert decoder.close() is None
+    assert decoder.error_code == 125002
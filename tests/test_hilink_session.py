@@ -0,0 +1,73 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+import pytest
+
+from app.services.async_sms_service import AsyncSmsService
+from tests.conftest import HILINK_URL
+
+PHONE = "+375291234567"
+
+
+@pytest.fixture
+def device(hilink):
+    hilink._require_session = True
+
+    return hilink
+
+
+@pytest.mark.asyncio
+async def test_sends_reuse_session_and_rotated_token(device):
+    service = AsyncSmsService(HILINK_URL)
+
+    for _ in range(3):
+        assert await service.send_sms(PHONE, "text")
+
+    assert device.sent == 3
+    assert device.session_requests == 1
+    assert device.session_rejections == 0
+
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_session_is_renewed(device):
+    service = AsyncSmsService(HILINK_URL)
+    assert await service.send_sms(PHONE, "text")
+
+    device.expire_session()
+
+    assert await service.send_sms(PHONE, "text")
+    assert device.sent == 2
+    assert device.session_requests == 2
+    assert device.session_rejections == 1
+
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_rejections_share_one_renewal(device):
+    device._inbox[1] = "Inbox message 1"
+    service = AsyncSmsService(HILINK_URL)
+    assert await service.list_sms(1, 1) is not None
+
+    device.expire_session()
+    pages = await asyncio.gather(*(service.list_sms(1, 1) for _ in range(5)))
+
+    assert [[message.index for message in page] for page in pages] == [[1]] * 5
+    assert device.session_requests == 2
+
+    await service.close()
@@ -0,0 +1,67 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from tests.utils import running_app
+
+PHONE = "+375291234567"
+
+
+async def _send(client, message: str, key: str = "", client_id: str = "a"):
+    headers = {"X-Client-Id": client_id}
+    if key:
+        headers["Idempotency-Key"] = key
+
+    return await client.post("/api/v1/send", json={"phone": PHONE, "message": message}, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_retry_with_same_key_returns_original_id(hilink, settings):
+    async with running_app() as (_, client):
+        first = await _send(client, "text", key="k")
+        retry = await _send(client, "text", key="k")
+
+        assert retry.status_code == 200
+        assert retry.json()["payload"]["id"] == first.json()["payload"]["id"]
+
+
+@pytest.mark.asyncio
+async def test_key_reused_for_different_message_is_rejected(hilink, settings):
+    async with running_app() as (_, client):
+        await _send(client, "text", key="k")
+        response = await _send(client, "other text", key="k")
+
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped_to_client(hilink, settings):
+    async with running_app() as (_, client):
+        first = await _send(client, "text", key="k", client_id="a")
+        second = await _send(client, "text", key="k", client_id="b")
+        repeated = await _send(client, "text", client_id="b")
+
+        assert second.status_code == 200
+        assert second.json()["payload"]["id"] != first.json()["payload"]["id"]
+        assert repeated.json()["payload"]["id"] != second.json()["payload"]["id"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_content_without_key_is_suppressed(hilink, settings):
+    async with running_app() as (_, client):
+        first = await _send(client, "text")
+        repeated = await _send(client, "text")
+
+        assert repeated.json()["payload"]["id"] == first.json()["payload"]["id"]
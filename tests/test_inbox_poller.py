@@ -0,0 +1,66 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.services.async_sms_service import AsyncSmsService
+from app.worker.circuit_breaker import CircuitBreaker
+from app.worker.inbox_poller import InboxPoller
+from app.worker.modem import Modem
+from app.worker.segment_budget import SegmentBudget
+from tests.conftest import HILINK_URL
+
+
+def _poller(delete_processed: bool = True) -> InboxPoller:
+    modem = Modem(HILINK_URL, AsyncSmsService(HILINK_URL), CircuitBreaker(3, 30), SegmentBudget(0))
+
+    return InboxPoller([modem], interval=60, page_size=2, delete_processed=delete_processed, subscriber_buffer=10)
+
+
+def _receive(hilink, *indexes: int) -> None:
+    for index in indexes:
+        hilink._inbox[index] = f"Inbox message {index}"
+
+
+@pytest.mark.asyncio
+async def test_messages_present_at_start_are_skipped(hilink):
+    _receive(hilink, 1, 2, 3)
+    poller = _poller()
+    modem = poller._modems[0]
+
+    assert await poller.poll(modem) == []
+
+    _receive(hilink, 4, 5, 6)
+
+    assert [message.index for message in await poller.poll(modem)] == [4, 5, 6]
+    assert await poller.poll(modem) == []
+
+
+@pytest.mark.asyncio
+async def test_messages_are_deleted_only_after_a_subscriber_received_them(hilink):
+    poller = _poller()
+    modem = poller._modems[0]
+    await poller._process(modem)
+
+    _receive(hilink, 1)
+    await poller._process(modem)
+
+    assert 1 in hilink._inbox
+
+    with poller.subscribe() as queue:
+        _receive(hilink, 2)
+        await poller._process(modem)
+
+        assert queue.get_nowait().index == 2
+        assert 2 not in hilink._inbox
@@ -0,0 +1,81 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import sqlite3
+
+import pytest
+
+from app.models.domain.sms import SMS
+from app.worker import journal as journal_module
+from app.worker.journal import SqliteJournal
+from tests.utils import wait_for
+
+
+def _task(message: str) -> SMS:
+    return SMS(phone="+375291234567", message=message)
+
+
+@pytest.mark.asyncio
+async def test_replay_returns_unacknowledged_tasks(tmp_path):
+    path = str(tmp_path / "queue.db")
+    sent, queued, dead = _task("sent"), _task("queued"), _task("dead")
+
+    journal = SqliteJournal(path, commit_interval=0)
+    journal.start()
+    for task in (sent, queued, dead):
+        journal.record(task)
+    journal.ack(sent)
+    journal.bury(dead)
+    await journal.close()
+
+    journal = SqliteJournal(path, commit_interval=0)
+
+    assert [task.id for task in await journal.poll()] == [queued.id]
+    assert [task.id for task in await journal.replay_dead_letters()] == [dead.id]
+
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_commit_is_retried_without_losing_newer_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_module, "RETRY_DELAY", 0.01)
+    path = str(tmp_path / "queue.db")
+    first, second = _task("first"), _task("second")
+
+    journal = SqliteJournal(path, commit_interval=0)
+    commit = journal._commit
+    failures = []
+
+    def failing_once(writes):
+        if not failures:
+            failures.append(writes)
+            # A write arriving while the failed commit runs must survive the retry
+            journal.record(second)
+            raise sqlite3.OperationalError("disk I/O error")
+
+        commit(writes)
+
+    monkeypatch.setattr(journal, "_commit", failing_once)
+
+    journal.start()
+    journal.record(first)
+
+    await wait_for(lambda: not journal._writes and failures)
+    await journal.close()
+
+    journal = SqliteJournal(path, commit_interval=0)
+
+    assert {task.id for task in await journal.poll()} == {first.id, second.id}
+
+    await journal.close()
@@ -0,0 +1,102 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.api.parsers.json_stream import JsonStreamError, iter_json_array, iter_ndjson
+
+
+async def _chunks(body: bytes, size: int = 3):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def _collect(iterator):
+    return [value async for value in iterator]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 3, 1024])
+async def test_json_array_yields_elements_across_chunks(size):
+    body = ' [ {"phone": "+375291234567", "message": "привет"}, 12345 , "a,]b" ] '.encode()
+
+    values = await _collect(iter_json_array(_chunks(body, size)))
+
+    assert values == [{"phone": "+375291234567", "message": "привет"}, 12345, "a,]b"]
+
+
+@pytest.mark.asyncio
+async def test_json_array_accepts_empty_array():
+    assert await _collect(iter_json_array(_chunks(b"[ ]"))) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [
+    b'{"phone": "1"}',
+    b"[1 2]",
+    b"[1,,2]",
+    b"[,1]",
+    b"[1,]",
+    b"[1] 2",
+    b"[1, 2",
+    b'[{"phone": }]',
+    b"[1, \xff]",
+])
+async def test_json_array_rejects_malformed_body(body):
+    with pytest.raises(JsonStreamError):
+        await _collect(iter_json_array(_chunks(body)))
+
+
+@pytest.mark.asyncio
+async def test_json_array_fails_before_reading_rest_of_body():
+    read = []
+
+    async def chunks():
+        for chunk in (b"[1 ", b"2]", b"[3]"):
+            read.append(chunk)
+            yield chunk
+
+    values = iter_json_array(chunks())
+
+    assert await values.__anext__() == 1
+    with pytest.raises(JsonStreamError):
+        await values.__anext__()
+    assert read == [b"[1 ", b"2]"]
+
+
+@pytest.mark.asyncio
+async def test_json_array_rejects_oversized_element():
+    body = b'["' + b"x" * 100 + b'"]'
+
+    with pytest.raises(JsonStreamError):
+        await _collect(iter_json_array(_chunks(body, 10), max_item_size=50))
+
+
+@pytest.mark.asyncio
+async def test_ndjson_yields_lines():
+    body = b'{"a": 1}\n\n{"a": 2}\r\n{"a": 3}'
+
+    assert await _collect(iter_ndjson(_chunks(body))) == [{"a": 1}, {"a": 2}, {"a": 3}]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_rejects_invalid_line():
+    with pytest.raises(JsonStreamError):
+        await _collect(iter_ndjson(_chunks(b'{"a": 1}\n{"a": \n')))
+
+
+@pytest.mark.asyncio
+async def test_ndjson_rejects_oversized_line():
+    with pytest.raises(JsonStreamError):
+        await _collect(iter_ndjson(_chunks(b"1" * 100, 10), max_item_size=50))
@@ -0,0 +1,54 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.core.metrics import Counter, Gauge, Histogram, Registry
+from tests.utils import running_app, wait_for
+
+
+def test_render_uses_prometheus_text_format():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests.", ("route",)))
+    gauge = registry.register(Gauge("depth", "Depth."))
+    histogram = registry.register(Histogram("wait_seconds", "Wait.", buckets=(0.1, 1.0)))
+
+    counter.labels("send").inc(2)
+    gauge.labels().set(5)
+    histogram.labels().observe(0.5)
+
+    text = registry.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="send"} 2' in text
+    assert "depth 5" in text
+    assert 'wait_seconds_bucket{le="0.1"} 0' in text
+    assert 'wait_seconds_bucket{le="1"} 1' in text
+    assert 'wait_seconds_bucket{le="+Inf"} 1' in text
+    assert "wait_seconds_count 1" in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_count_sent_messages(hilink, settings):
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/send", json={"phone": "+375291234567", "message": "text"})
+        assert response.status_code == 200
+
+        await wait_for(lambda: hilink.sent == 1)
+
+        response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'sms_enqueued_total{route="send"}' in response.text
@@ -0,0 +1,118 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import re
+
+import pytest
+
+from app.services.otp_store import OtpCheck, OtpStore, SqliteOtpStore
+from tests.utils import running_app, wait_for
+
+PHONE = "+375291234567"
+
+
+def _store(**values) -> OtpStore:
+    options = {"max_size": 10, "ttl": 60, "max_attempts": 2, "cooldown": 30, "code_length": 6, **values}
+
+    return OtpStore(**options)
+
+
+@pytest.mark.asyncio
+async def test_code_is_verified_once():
+    store = _store()
+    code, _ = await store.issue(PHONE)
+
+    assert re.fullmatch(r"\d{6}", code)
+    assert await store.verify(PHONE, code) is OtpCheck.verified
+    assert await store.verify(PHONE, code) is OtpCheck.expired
+
+
+@pytest.mark.asyncio
+async def test_attempts_are_limited():
+    store = _store()
+    code, _ = await store.issue(PHONE)
+    wrong = "x" * 6
+
+    assert await store.verify(PHONE, wrong) is OtpCheck.invalid
+    assert await store.verify(PHONE, wrong) is OtpCheck.exhausted
+    assert await store.verify(PHONE, code) is OtpCheck.expired
+
+
+@pytest.mark.asyncio
+async def test_new_code_waits_for_cooldown():
+    store = _store(cooldown=30)
+    await store.issue(PHONE)
+
+    code, retry_after = await store.issue(PHONE)
+
+    assert code is None
+    assert 29 < retry_after <= 30
+
+    store = _store(cooldown=0)
+    await store.issue(PHONE)
+    second, _ = await store.issue(PHONE)
+
+    assert await store.verify(PHONE, second) is OtpCheck.verified
+
+
+@pytest.mark.asyncio
+async def test_expired_codes_are_evicted_on_issue():
+    store = _store(ttl=0.05, cooldown=0)
+    for index in range(5):
+        await store.issue(f"+37529123456{index}")
+
+    await asyncio.sleep(0.06)
+    await store.issue(PHONE)
+
+    assert len(store) == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_code_is_verified_by_other_store(tmp_path):
+    path = str(tmp_path / "queue.db")
+    issuing = SqliteOtpStore(path, ttl=60, max_attempts=2, cooldown=30, code_length=6)
+    verifying = SqliteOtpStore(path, ttl=60, max_attempts=2, cooldown=30, code_length=6)
+
+    try:
+        code, _ = await issuing.issue(PHONE)
+
+        assert (await verifying.issue(PHONE))[0] is None
+        assert await verifying.verify(PHONE, code) is OtpCheck.verified
+        assert await issuing.verify(PHONE, code) is OtpCheck.expired
+    finally:
+        issuing.close()
+        verifying.close()
+
+
+@pytest.mark.asyncio
+async def test_issued_code_is_sent_and_verified(hilink, settings):
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/otp/issue", json={"phone": PHONE})
+
+        assert response.status_code == 200
+
+        await wait_for(lambda: hilink._sent_box)
+        code = re.search(r"\d{6}", next(iter(hilink._sent_box.values())).content).group()
+
+        repeated = await client.post("/api/v1/otp/issue", json={"phone": PHONE})
+
+        assert repeated.status_code == 429
+        assert int(repeated.headers["Retry-After"]) >= 1
+
+        wrong = await client.post("/api/v1/otp/verify", json={"phone": PHONE, "code": "wrong"})
+        verified = await client.post("/api/v1/otp/verify", json={"phone": PHONE, "code": code})
+
+        assert wrong.status_code == 400
+        assert verified.json()["payload"] == {"verified": True}
@@ -0,0 +1,101 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.services.rate_limiter import RateLimit, RateLimiter, SqliteRateLimiter
+from tests.utils import running_app
+
+PHONE = "+375291234567"
+OTHER_PHONE = "+375297654321"
+
+
+def _limiter(phone: int = 0, client: int = 0) -> RateLimiter:
+    return RateLimiter(RateLimit(phone, 3600), RateLimit(client, 60), sketch_width=1024, max_clients=10)
+
+
+def test_retry_after_follows_sliding_window():
+    limit = RateLimit(10, 100)
+
+    # 25 seconds into the window, three quarters of the previous one still count
+    assert limit.retry_after(4, 6, 225) == 0.0
+    # 6 * 0.75 + 5 = 9.5 and one more would exceed 10 until 6 * x + 5 + 1 <= 10, x = 2 / 3
+    assert limit.retry_after(6, 5, 225) == pytest.approx(100 * (1 - 4 / 6) - 25)
+    # The current window is full, it has to slide out after the window ends
+    assert limit.retry_after(0, 10, 225) == pytest.approx(75 + 100 * (1 - 9 / 10))
+
+
+@pytest.mark.asyncio
+async def test_phone_limit_counts_each_recipient():
+    limiter = _limiter(phone=2)
+
+    assert await limiter.acquire("client", [PHONE, PHONE, OTHER_PHONE]) == [0.0, 0.0, 0.0]
+
+    retry_after = await limiter.acquire("other", [PHONE, OTHER_PHONE])
+
+    assert retry_after[0] > 0
+    assert retry_after[1] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_client_limit_counts_all_recipients():
+    limiter = _limiter(client=2)
+
+    retry_after = await limiter.acquire("client", [PHONE, OTHER_PHONE, "+375290000000"])
+
+    assert retry_after[:2] == [0.0, 0.0]
+    assert 0 < retry_after[2] <= 120
+    assert await limiter.acquire("other", [PHONE]) == [0.0]
+
+
+@pytest.mark.asyncio
+async def test_disabled_limiter_counts_nothing():
+    limiter = _limiter()
+
+    assert not limiter.enabled
+    assert await limiter.acquire("client", [PHONE] * 100) == [0.0] * 100
+
+
+@pytest.mark.asyncio
+async def test_sqlite_limit_is_shared(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first = SqliteRateLimiter(path, RateLimit(1, 3600), RateLimit(0, 60))
+    second = SqliteRateLimiter(path, RateLimit(1, 3600), RateLimit(0, 60))
+
+    try:
+        assert await first.acquire("client", [PHONE]) == [0.0]
+        assert (await second.acquire("client", [PHONE]))[0] > 0
+        assert await second.acquire("client", [OTHER_PHONE]) == [0.0]
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.mark.asyncio
+async def test_send_is_limited_per_recipient(hilink, settings):
+    settings(rate_limit_phone=1)
+
+    async with running_app() as (_, client):
+        first = await client.post("/api/v1/send", json={"phone": PHONE, "message": "first"})
+        second = await client.post("/api/v1/send", json={"phone": PHONE, "message": "second"})
+        batch = await client.post(
+            "/api/v1/send_batch",
+            json=[{"phone": PHONE, "message": "third"}, {"phone": OTHER_PHONE, "message": "third"}],
+        )
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) >= 1
+    assert [result["success"] for result in batch.json()["payload"]["results"]] == [False, True]
+    assert int(batch.headers["Retry-After"]) >= 1
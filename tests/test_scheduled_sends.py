@@ -0,0 +1,93 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.utils import running_app, wait_for
+
+PHONE = "+375291234567"
+
+
+def _at(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+async def _status(client, sms_id: str) -> str:
+    response = await client.get(f"/api/v1/sms/{sms_id}")
+
+    return response.json()["payload"]["status"]
+
+
+@pytest.mark.asyncio
+async def test_scheduled_task_is_sent_when_due(hilink, settings):
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/send", json={"phone": PHONE, "message": "text", "send_at": _at(0.3)})
+        sms_id = response.json()["payload"]["id"]
+
+        assert await _status(client, sms_id) == "scheduled"
+        assert (await client.get("/api/v1/task_count")).json()["payload"]["count"] == 0
+
+        async def sent() -> bool:
+            return await _status(client, sms_id) == "sent"
+
+        await wait_for(sent)
+
+        assert hilink.sent == 1
+
+
+@pytest.mark.asyncio
+async def test_task_expiring_in_queue_is_not_sent(hilink, settings):
+    hilink.pause()
+
+    async with running_app() as (_, client):
+        await client.post("/api/v1/send", json={"phone": PHONE, "message": "first"})
+        response = await client.post("/api/v1/send", json={"phone": PHONE, "message": "second", "expires_at": _at(0.1)})
+        sms_id = response.json()["payload"]["id"]
+
+        await asyncio.sleep(0.2)
+        hilink.resume()
+
+        async def expired() -> bool:
+            return await _status(client, sms_id) == "expired"
+
+        await wait_for(expired)
+
+        assert hilink.sent == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("schedule", [{"expires_at": _at(-1)}, {"send_at": _at(60), "expires_at": _at(30)}])
+async def test_task_expiring_before_it_can_be_sent_is_rejected(hilink, settings, schedule):
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/send", json={"phone": PHONE, "message": "text", **schedule})
+
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_scheduled_task_survives_restart(hilink, settings, tmp_path):
+    settings(queue_path=str(tmp_path / "queue.db"))
+
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/send", json={"phone": PHONE, "message": "text", "send_at": _at(60)})
+        sms_id = response.json()["payload"]["id"]
+
+    async with running_app() as (application, client):
+        await wait_for(lambda: len(application.state.worker._scheduled) == 1)
+
+        assert await _status(client, sms_id) == "scheduled"
@@ -0,0 +1,62 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.core import metrics
+from tests.utils import running_app
+
+
+def _rejected(reason: str) -> float:
+    return metrics.SMS_REJECTED.labels("send_batch", reason).value
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_each_item(hilink, settings):
+    settings(sms_max_segments=1)
+    batch = [
+        {"phone": "+375291234567", "message": "text"},
+        {"phone": "not a phone", "message": "text"},
+        {"phone": "+375291234567", "message": "x" * 200},
+        {"message": "no phone"},
+    ]
+    before = {reason: _rejected(reason) for reason in ("invalid_phone", "too_long", "invalid_item")}
+
+    async with running_app() as (_, client):
+        response = await client.post("/api/v1/send_batch", json=batch)
+
+    payload = response.json()["payload"]
+    assert [result["success"] for result in payload["results"]] == [True, False, False, False]
+    assert payload["accepted"] == 1
+    assert payload["rejected"] == 3
+    assert {reason: _rejected(reason) - count for reason, count in before.items()} == {
+        "invalid_phone": 1,
+        "too_long": 1,
+        "invalid_item": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_keeps_items_before_malformed_body(hilink, settings):
+    body = b'{"phone": "+375291234567", "message": "text"}\n{"phone": \n'
+
+    async with running_app() as (_, client):
+        response = await client.post(
+            "/api/v1/send_batch",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    assert response.json()["success"] is False
+    assert response.json()["payload"]["accepted"] == 1
@@ -0,0 +1,41 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from app.models.domain.send_status import SendStatus
+
+
+def test_idle_modem_is_not_finished():
+    status = SendStatus(total_count=0, current_index=0)
+
+    assert not status.finished
+    assert not status.is_sent("+375291234567")
+    assert status.results(["+375291234567"]) == {"+375291234567": None}
+
+
+def test_success_phone_is_sent_before_job_finishes():
+    status = SendStatus(success_phones=["+375291234567"], total_count=2, current_index=1)
+
+    assert status.results(["+375291234567", "+375297654321"]) == {
+        "+375291234567": True,
+        "+375297654321": None,
+    }
+
+
+def test_finished_job_reports_failures():
+    status = SendStatus(fail_phones=["+375297654321"], total_count=2, current_index=2)
+
+    assert status.results(["+375291234567", "+375297654321"]) == {
+        "+375291234567": True,
+        "+375297654321": False,
+    }
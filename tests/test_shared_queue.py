@@ -0,0 +1,93 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from pydantic import ValidationError
+
+from app.core.settings.app import AppSettings
+from app.services.idempotency_index import IdempotencyRecord, SqliteIdempotencyIndex
+from app.worker.queue_lock import QueueLock
+from tests.utils import running_app, wait_for
+
+PHONE = "+375291234567"
+
+
+def test_workers_require_shared_queue(settings, tmp_path):
+    with pytest.raises(ValidationError):
+        AppSettings(workers=2)
+
+    with pytest.raises(ValidationError):
+        AppSettings(queue_shared=True)
+
+    assert AppSettings(workers=2, queue_shared=True, queue_path=str(tmp_path / "queue.db")).workers == 2
+
+
+def test_queue_lock_is_held_by_one_holder(tmp_path):
+    path = str(tmp_path / "queue.lock")
+    first, second = QueueLock(path), QueueLock(path)
+
+    assert first.acquire()
+    assert not second.acquire()
+
+    first.release()
+
+    assert second.acquire()
+
+    second.release()
+
+
+@pytest.mark.asyncio
+async def test_idempotency_claim_is_seen_by_other_index(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first, second = SqliteIdempotencyIndex(path), SqliteIdempotencyIndex(path)
+    key = SqliteIdempotencyIndex.digest("key", "a", "k")
+    record = IdempotencyRecord("task", SqliteIdempotencyIndex.digest(PHONE, "text"))
+
+    try:
+        assert await first.claim(key, record, ttl=60) is None
+        assert await second.claim(key, IdempotencyRecord("other", record.fingerprint), ttl=60) == record
+
+        await first.release(key)
+
+        assert await second.claim(key, record, ttl=60) is None
+        assert await first.claim(key, record, ttl=0) == record
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.mark.asyncio
+async def test_follower_serves_tasks_dispatched_by_leader(hilink, settings, tmp_path):
+    settings(queue_shared=True, queue_path=str(tmp_path / "queue.db"), queue_poll_interval=0.01)
+
+    async with running_app() as (leader, _), running_app() as (follower, client):
+        await wait_for(lambda: leader.state.worker._leader)
+        assert not follower.state.worker._leader
+
+        headers = {"X-Client-Id": "a", "Idempotency-Key": "k"}
+        response = await client.post("/api/v1/send", json={"phone": PHONE, "message": "text"}, headers=headers)
+        sms_id = response.json()["payload"]["id"]
+
+        async def sent() -> bool:
+            response = await client.post("/api/v1/sms/status", json={"ids": [sms_id]})
+            return [entry["status"] for entry in response.json()["payload"]["statuses"]] == ["sent"]
+
+        await wait_for(sent)
+
+        assert hilink.sent == 1
+
+        retry = await client.post("/api/v1/send", json={"phone": PHONE, "message": "text"}, headers=headers)
+
+        assert retry.json()["payload"]["id"] == sms_id
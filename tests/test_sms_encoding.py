@@ -0,0 +1,70 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.services.sms_encoding import SegmentInfo, SmsEncoding, analyze, split_segments
+from app.services.sms_transliteration import TransliterationMode, shorten
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("", SegmentInfo(SmsEncoding.gsm7, 0, 1)),
+    ("a" * 160, SegmentInfo(SmsEncoding.gsm7, 160, 1)),
+    ("a" * 161, SegmentInfo(SmsEncoding.gsm7, 161, 2)),
+    ("a" * 306, SegmentInfo(SmsEncoding.gsm7, 306, 2)),
+    ("a" * 307, SegmentInfo(SmsEncoding.gsm7, 307, 3)),
+    ("€" * 80, SegmentInfo(SmsEncoding.gsm7, 160, 1)),
+    ("я" * 70, SegmentInfo(SmsEncoding.ucs2, 70, 1)),
+    ("я" * 71, SegmentInfo(SmsEncoding.ucs2, 71, 2)),
+    ("😀" * 35, SegmentInfo(SmsEncoding.ucs2, 70, 1)),
+])
+def test_analyze(content, expected):
+    assert analyze(content) == expected
+
+
+def test_split_keeps_gsm7_extension_in_one_segment():
+    content = "a" * 152 + "€" + "b" * 7
+
+    segments = split_segments(content)
+
+    assert segments == ["a" * 152, "€" + "b" * 7]
+
+
+def test_split_keeps_surrogate_pair_in_one_segment():
+    content = "я" * 66 + "😀" + "я" * 10
+
+    segments = split_segments(content)
+
+    assert segments == ["я" * 66, "😀" + "я" * 10]
+    assert "".join(segments) == content
+
+
+@pytest.mark.parametrize("content", ["a" * 1000, "я" * 500, "€a" * 200])
+def test_split_segments_match_analyze(content):
+    segments = split_segments(content)
+
+    assert "".join(segments) == content
+    assert len(segments) == analyze(content).segments
+
+
+def test_shorten_transliterates_only_when_it_saves_segments():
+    cyrillic = "Ваш код 1234"
+
+    assert shorten(cyrillic, TransliterationMode.cyrillic, analyze(cyrillic).segments) == (cyrillic, 0)
+
+    long_cyrillic = "Ваш код подтверждения 1234, никому его не сообщайте. Код действует 5 минут."
+    message, saved = shorten(long_cyrillic, TransliterationMode.cyrillic, analyze(long_cyrillic).segments)
+
+    assert saved == 1
+    assert analyze(message).encoding is SmsEncoding.gsm7
@@ -0,0 +1,31 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.worker.supervisor import supervise
+
+
+@pytest.mark.asyncio
+async def test_restarts_failed_loop_until_it_returns():
+    runs = []
+
+    async def run() -> None:
+        runs.append(None)
+        if len(runs) < 3:
+            raise RuntimeError("loop failed")
+
+    await supervise("Test loop", run, restart_delay=0)
+
+    assert len(runs) == 3
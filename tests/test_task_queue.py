@@ -0,0 +1,69 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.models.domain.sms import SMS, SmsPriority
+from app.worker.task_queue import TaskQueue
+
+WEIGHTS = {"high": 4, "normal": 2, "low": 1}
+
+
+def _task(phone: str = "+375291234567", message: str = "text", priority: SmsPriority = SmsPriority.normal) -> SMS:
+    return SMS(phone=phone, message=message, priority=priority)
+
+
+@pytest.mark.asyncio
+async def test_urgent_tasks_are_served_first():
+    queue = TaskQueue(WEIGHTS)
+    low = _task(priority=SmsPriority.low)
+    urgent = _task(priority=SmsPriority.urgent)
+    queue.put_nowait(low)
+    queue.put_nowait(urgent)
+
+    assert await queue.get() is urgent
+    assert await queue.get() is low
+    assert queue.qsize() == 0
+
+
+@pytest.mark.asyncio
+async def test_lanes_share_by_weight():
+    queue = TaskQueue(WEIGHTS)
+    for _ in range(7):
+        queue.put_nowait(_task(priority=SmsPriority.high))
+        queue.put_nowait(_task(priority=SmsPriority.low))
+
+    served = [(await queue.get()).priority for _ in range(5)]
+
+    assert served.count(SmsPriority.high) == 4
+    assert served.count(SmsPriority.low) == 1
+
+
+@pytest.mark.asyncio
+async def test_take_matching_skips_recipients_already_in_group():
+    queue = TaskQueue(WEIGHTS)
+    first = _task(phone="+375291111111")
+    repeated = _task(phone="+375291111111")
+    other = _task(phone="+375292222222")
+    unrelated = _task(phone="+375293333333", message="other")
+    for task in (first, repeated, unrelated, other):
+        queue.put_nowait(task)
+
+    task = await queue.get()
+    group = [task] + queue.take_matching(task, 5)
+
+    assert group == [first, other]
+    assert queue.qsize() == 2
+    assert await queue.get() is repeated
+    assert await queue.get() is unrelated
@@ -0,0 +1,74 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+from app.models.domain.sms import SmsStatus
+from app.services.ttl_cache import TtlCache
+from app.worker.status_store import StatusStore
+
+
+def test_get_returns_value_until_expired(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    cache = TtlCache(max_size=10)
+    cache.set("a", 1, ttl=5)
+
+    assert cache.get("a") == 1
+
+    now[0] = 105.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_set_drops_oldest_over_max_size():
+    cache = TtlCache(max_size=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") == 3
+
+
+def test_rewrite_moves_key_to_back():
+    cache = TtlCache(max_size=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.set("a", 3, ttl=60)
+    cache.set("c", 4, ttl=60)
+
+    assert cache.get("a") == 3
+    assert cache.get("b") is None
+
+
+def test_discard_missing_key_is_noop():
+    cache = TtlCache(max_size=2)
+    cache.discard("a")
+
+    assert len(cache) == 0
+
+
+def test_status_store_keeps_latest_status():
+    store = StatusStore(max_size=10, ttl=60)
+    store.set("id", SmsStatus.queued)
+    store.set("id", SmsStatus.sent, attempts=2)
+
+    entry = store.get("id")
+
+    assert entry.status == SmsStatus.sent
+    assert entry.attempts == 2
+    assert entry.expires_at - entry.updated_at == 60
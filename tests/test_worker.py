@@ -0,0 +1,76 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+
+from app.services.async_sms_service import AsyncSmsService
+from tests.utils import running_app, wait_for
+
+
+async def _statuses(client, ids):
+    response = await client.post("/api/v1/sms/status", json={"ids": ids})
+
+    return [status["status"] for status in response.json()["payload"]["statuses"]]
+
+
+def _all_sent(client, ids):
+    async def condition() -> bool:
+        return await _statuses(client, ids) == ["sent"] * len(ids)
+
+    return condition
+
+
+@pytest.mark.asyncio
+async def test_group_sends_each_recipient_once(hilink, settings):
+    settings(sms_group_size=5)
+    hilink.pause()
+
+    async with running_app() as (_, client):
+        ids = []
+        for key, phone in (("a", "+375291111111"), ("b", "+375291111111"), ("c", "+375292222222")):
+            response = await client.post(
+                "/api/v1/send",
+                json={"phone": phone, "message": "text"},
+                headers={"Idempotency-Key": key},
+            )
+            ids.append(response.json()["payload"]["id"])
+
+        hilink.resume()
+
+        await wait_for(_all_sent(client, ids))
+        assert hilink.sent == 3
+
+
+@pytest.mark.asyncio
+async def test_lane_survives_send_error(hilink, settings, monkeypatch):
+    send_sms_group = AsyncSmsService.send_sms_group
+    calls = []
+
+    async def failing_once(self, phones, content):
+        calls.append(phones)
+        if len(calls) == 1:
+            raise RuntimeError("device error")
+
+        return await send_sms_group(self, phones, content)
+
+    monkeypatch.setattr(AsyncSmsService, "send_sms_group", failing_once)
+
+    async with running_app() as (application, client):
+        response = await client.post("/api/v1/send", json={"phone": "+375291234567", "message": "text"})
+        sms_id = response.json()["payload"]["id"]
+
+        await wait_for(_all_sent(client, [sms_id]))
+
+        assert len(calls) == 2
+        assert all(modem.outstanding == 0 for modem in application.state.worker._dispatcher.modems)
@@ -0,0 +1,62 @@
+#  Copyright 2023 Pavel Suprunov
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import inspect
+import time
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Tuple, Union
+
+import httpx
+
+from fastapi import FastAPI
+
+from app import Application
+
+
+@asynccontextmanager
+async def running_app() -> AsyncIterator[Tuple[FastAPI, httpx.AsyncClient]]:
+    """
+    Starts the application with its worker and yields it with a client bound to it.
+    """
+    application = Application().application
+    await application.router.startup()
+
+    try:
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway.test") as client:
+            yield application, client
+    finally:
+        await application.router.shutdown()
+
+
+async def wait_for(condition: Callable[[], Union[bool, Awaitable[bool]]], timeout: float = 5.0) -> None:
+    """
+    Waits until condition, a plain or a coroutine function, returns True.
+    """
+    deadline = time.monotonic() + timeout
+    while not await _evaluate(condition):
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+
+        await asyncio.sleep(0.01)
+
+
+async def _evaluate(condition: Callable[[], Union[bool, Awaitable[bool]]]) -> bool:
+    result = condition()
+    if inspect.isawaitable(result):
+        result = await result
+
+    return result